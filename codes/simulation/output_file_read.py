@@ -1,13 +1,14 @@
 import pandas as pd
 
 
-def read_output_fd(output_path, output_name):
+def read_output_fd(output_path, output_name, year=2049):
     """
     Reads the output Excel file from a simulation and extracts capacity, activity, and emissions data.
 
     Parameters:
     - output_path: The directory path where the output file is located.
     - output_name: The name of the output Excel file.
+    - year: The model period to read, or None for every period, read as Series indexed by period.
 
     Returns:
     - A tuple containing dictionaries for Capacity and Activity data, and a total emissions value.
@@ -18,10 +19,13 @@ def read_output_fd(output_path, output_name):
     # Use context manager for better resource management
     with pd.ExcelFile(file_path) as xls:
         # Define a function to read and process a sheet
-        def read_sheet(sheet_name, index_col='Technology', year=2049):
+        def read_sheet(sheet_name, index_col='Technology', year=year):
             df = pd.read_excel(xls, sheet_name)
             df.set_index(index_col, drop=True, inplace=True)
             df.fillna(0, inplace=True)
+            if year is None:
+                # Periods as the index, so that .get(tech) returns the values of a technology in every period
+                return df.select_dtypes('number').T
             return df.loc[:, year] if year in df.columns else df
 
         # Read and process each sheet
@@ -46,13 +50,14 @@ def read_output_fd(output_path, output_name):
     return capacity, activity#, total_emissions
 
 
-def read_output_bau(output_path, output_name):
+def read_output_bau(output_path, output_name, year=2049):
     """
     Reads the output Excel file from a 'business as usual' simulation and extracts capacity, activity, and emissions data.
 
     Parameters:
     - output_path (str): The directory path where the output file is located.
     - output_name (str): The name of the output Excel file.
+    - year (int): The model period to read, or None for every period, read as Series indexed by period.
 
     Returns:
     - tuple: A tuple containing dictionaries for Capacity and Activity data, and total emissions.
@@ -61,10 +66,13 @@ def read_output_bau(output_path, output_name):
 
     with pd.ExcelFile(file_path) as xls:
         # Function to read and process each sheet
-        def read_sheet(sheet_name, index_col='Technology', year=2049):
+        def read_sheet(sheet_name, index_col='Technology', year=year):
             df = pd.read_excel(xls, sheet_name)
             df.set_index(index_col, drop=True, inplace=True)
             df.fillna(0, inplace=True)
+            if year is None:
+                # Periods as the index, so that .get(tech) returns the values of a technology in every period
+                return df.select_dtypes('number').T
             return df.loc[:, year] if year in df.columns else df
 
         # Reading and processing each required sheet
@@ -89,13 +97,14 @@ def read_output_bau(output_path, output_name):
     return capacity, activity#, total_emissions
 
 
-def read_output_fr(output_path, output_name):
+def read_output_fr(output_path, output_name, year=2049):
     """
     Reads the output Excel file from a 'future scenario' simulation and extracts capacity, activity, and emissions data.
 
     Parameters:
     - output_path (str): The directory path where the output file is located.
     - output_name (str): The name of the output Excel file.
+    - year (int): The model period to read, or None for every period, read as Series indexed by period.
 
     Returns:
     - tuple: A tuple containing dictionaries for Capacity and Activity data, and total emissions.
@@ -104,10 +113,13 @@ def read_output_fr(output_path, output_name):
 
     with pd.ExcelFile(file_path) as xls:
         # Function to read and process each sheet
-        def read_sheet(sheet_name, index_col='Technology', year=2049):
+        def read_sheet(sheet_name, index_col='Technology', year=year):
             df = pd.read_excel(xls, sheet_name)
             df.set_index(index_col, drop=True, inplace=True)
             df.fillna(0, inplace=True)
+            if year is None:
+                # Periods as the index, so that .get(tech) returns the values of a technology in every period
+                return df.select_dtypes('number').T
             return df.loc[:, year] if year in df.columns else df
 
         # Reading and processing each required sheet
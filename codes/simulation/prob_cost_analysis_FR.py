@@ -26,100 +26,95 @@ speed_data = hurricanes['PR Wind Speed'].values
 mu, sigma = fit_lognormal_distribution(speed_data)
 
 # Plot the original wind speed distribution
-plot_histogram(speed_data, bins=12, title="Occurrence Max Wind Speed Distribution", xlabel='Max Wind Speed (m/s)', ylabel='Frequency')
+if __name__ == '__main__':
+    plot_histogram(speed_data, bins=12, title="Occurrence Max Wind Speed Distribution", xlabel='Max Wind Speed (m/s)', ylabel='Frequency')
 
 # Generate sample data from the fitted log-normal distribution and plot
 test_data = np.random.lognormal(mean=mu, sigma=sigma, size=10000)
-plot_histogram(test_data, bins=100, title="Histogram of Fitted Distribution to Max Wind Speed", xlabel='Max Wind Speed (m/s)', ylabel='Frequency')
+if __name__ == '__main__':
+    plot_histogram(test_data, bins=100, title="Histogram of Fitted Distribution to Max Wind Speed", xlabel='Max Wind Speed (m/s)', ylabel='Frequency')
 
 # Calculate and plot the annual occurrences of hurricanes
 annual_occurrences = calculate_annual_occurrences(hurricanes, 1851, 2022)
 freq = annual_occurrences.value_counts()
 number_occurrence_prob = freq / freq.sum()
-plot_histogram(number_occurrence_prob.index, bins=4, title="Number of Occurrence per Year PMF", xlabel='Number of Occurrence', ylabel='Probability')
+if __name__ == '__main__':
+    plot_histogram(number_occurrence_prob.index, bins=4, title="Number of Occurrence per Year PMF", xlabel='Number of Occurrence', ylabel='Probability')
 
 # Generate and plot data for the interval between occurrences
 test_intervals = np.random.exponential(1 / 0.8, 10000)
-plot_histogram(test_intervals, bins=100, title="Histogram of Fitted Distribution to Interval Between Two Occurrences", xlabel='Occurrence Interval', ylabel='Probability')
+if __name__ == '__main__':
+    plot_histogram(test_intervals, bins=100, title="Histogram of Fitted Distribution to Interval Between Two Occurrences", xlabel='Occurrence Interval', ylabel='Probability')
 
 components = pd.read_csv('powerNetwork.csv')
 
 
+# Skewed normal distribution parameters of the projections, refitted (in parallel) only when a projection CSV
+# changes; worker processes just load the saved .npy files
+skewnorm_params = load_skewnorm_params({
+    'populationParams': ('populationProj.csv', 'population'),
+    'perCapitaParams': ('consumptionChangeProj.csv', 'perCapita'),
+    'gasPriceParams': ('ngPriceProj.csv', 'ngPrice'),
+    'urnPriceParams': ('urnPriceProjNorm.csv', 'urnPrice'),
+    'battFixParams': ('battFixProj.csv', 'battFix'),
+    'battInvParams': ('battInvProj.csv', 'battInv'),
+    'hydFixParams': ('hydFixProj.csv', 'hydFix'),
+    'hydInvParams': ('hydInvProj.csv', 'hydInv'),
+    'solCfParams': ('solCfProj.csv', 'solCF'),
+    'solFixParams': ('solFixProj.csv', 'solFix'),
+    'solInvParams': ('solInvProj.csv', 'solInv'),
+    'windCfChangeParams': ('windCfChangeProj.csv', 'windCF'),
+    'windInvParams': ('windInvProj.csv', 'windInv'),
+    'windFixParams': ('windFixProj.csv', 'windFix'),
+    'priceChangeParams': ('changeInElectrcitiyPriceProj.csv', 'priceChange'),
+}, refresh=__name__ == '__main__', n_workers=os.cpu_count())
+
 # Load population projection data and set the year as the index
 population_data = pd.read_csv('populationProj.csv')
 population_data.set_index('Year', inplace=True)
-# Fit a skewed normal distribution to the population data and save the parameters (commented out for potential future use)
-# population_params = fit_skewed_norm_dist(population_data, 'population')
-# np.save('populationParams', population_params)
-# Load previously saved population distribution parameters
-population_params = np.load('populationParams.npy')
+# Fitted skewed normal distribution parameters for the population
+population_params = skewnorm_params['populationParams']
 
 # Repeat the process for other datasets
 consumption_change_data = pd.read_csv('consumptionChangeProj.csv', index_col=0)
-# Fit distribution and save parameters for per capita consumption change (commented out for future use)
-# per_capita_params = fit_skewed_norm_dist(consumption_change_data, 'perCapita')
-# np.save('perCapitaParams', per_capita_params)
-per_capita_params = np.load('perCapitaParams.npy')
+# Fitted distribution parameters for per capita consumption change
+per_capita_params = skewnorm_params['perCapitaParams']
 
 gas_price_data = pd.read_csv('ngPriceProj.csv', index_col=0)
-# Fit distribution and save parameters for gas price (commented out for future use)
-# gas_price_params = fit_skewed_norm_dist(gas_price_data, 'ngPrice')
-# np.save('gasPriceParams', gas_price_params)
-gas_price_params = np.load('gasPriceParams.npy')
+# Fitted distribution parameters for gas price
+gas_price_params = skewnorm_params['gasPriceParams']
 
 urn_price_data = pd.read_csv('urnPriceProjNorm.csv', index_col=0)
-# Fit distribution and save parameters for uranium price (commented out for future use)
-# urn_price_params = fit_skewed_norm_dist(urn_price_data, 'urnPrice')
-# np.save('urnPriceParams', urn_price_params)
-urn_price_params = np.load('urnPriceParams.npy')
+# Fitted distribution parameters for uranium price
+urn_price_params = skewnorm_params['urnPriceParams']
 
-# Load data for battery and hydro projects without fitting distributions (as the commented-out fitting process is omitted)
+# Load data for battery and hydro projects
 batt_cf_data = pd.read_csv('battCfProj.csv', index_col=0)
 batt_fix_data = pd.read_csv('battFixProj.csv', index_col=0)
 batt_inv_data = pd.read_csv('battInvProj.csv', index_col=0)
-#batt_fix_params = fitSkewedNormDist(batt_fix_data, 'battFix')
-#batt_inv_params = fitSkewedNormDist(batt_inv_data, 'battInv')
-# np.save('battFixParams', batt_fix_params)
-# np.save('urnPriceParams', batt_inv_params)
-batt_fix_params = np.load('battFixParams.npy')
-batt_inv_params = np.load('battInvParams.npy')
+batt_fix_params = skewnorm_params['battFixParams']
+batt_inv_params = skewnorm_params['battInvParams']
 
 hyd_cf_data = pd.read_csv('hydCfProj.csv', index_col=0)
 hyd_fix_data = pd.read_csv('hydFixProj.csv', index_col=0)
 hyd_inv_data = pd.read_csv('hydInvProj.csv', index_col=0)
-#hyd_fix_params = fitSkewedNormDist(hyd_fix_data, 'hydFix')
-#hyd_inv_params = fitSkewedNormDist(hyd_inv_data, 'hydInv')
-#np.save('hydFixParams', hyd_fix_params)
-#np.save('hydInvParams', hyd_inv_params)
-hyd_fix_params = np.load('hydFixParams.npy')
-hyd_inv_params = np.load('hydInvParams.npy')
+hyd_fix_params = skewnorm_params['hydFixParams']
+hyd_inv_params = skewnorm_params['hydInvParams']
 
 
 sol_cf_data = pd.read_csv('solCfProj.csv', index_col=0)
 sol_fix_data = pd.read_csv('solFixProj.csv', index_col=0)
 sol_inv_data = pd.read_csv('solInvProj.csv', index_col=0)
-#sol_cf_params = fitSkewedNormDist(sol_cf_data, 'solCF')
-#sol_fix_params = fitSkewedNormDist(sol_fix_data, 'solFix')
-#sol_inv_params = fitSkewedNormDist(sol_inv_data, 'solInv')
-#np.save('solCfParams', sol_cf_params)
-#np.save('solFixParams', sol_fix_params)
-#np.save('solInvParams', sol_inv_params)
-sol_cf_params = np.load('solCfParams.npy')
-sol_fix_params = np.load('solFixParams.npy')
-sol_inv_params = np.load('solInvParams.npy')
+sol_cf_params = skewnorm_params['solCfParams']
+sol_fix_params = skewnorm_params['solFixParams']
+sol_inv_params = skewnorm_params['solInvParams']
 
 wind_cf_change_data = pd.read_csv('windCfChangeProj.csv', index_col=0)
 wind_fix_data = pd.read_csv('windFixProj.csv', index_col=0)
 wind_inv_data = pd.read_csv('windInvProj.csv', index_col=0)
-#wind_cf_change_params = fitSkewedNormDist(wind_cf_change_data, 'windCF')
-#wind_fix_params = fitSkewedNormDist(wind_fix_data, 'windFix')
-#wind_inv_params = fitSkewedNormDist(wind_inv_data, 'windInv')
-#np.save('windCfChangeParams', wind_cf_change_params)
-#np.save('windInvParams', wind_inv_params)
-#np.save('windFixParams', wind_fix_params)
-wind_cf_change_params = np.load('windCfChangeParams.npy')
-wind_inv_params = np.load('windInvParams.npy')
-wind_fix_params = np.load('windFixParams.npy')
+wind_cf_change_params = skewnorm_params['windCfChangeParams']
+wind_inv_params = skewnorm_params['windInvParams']
+wind_fix_params = skewnorm_params['windFixParams']
 
 # Load data for natural gas and nuclear energy projects without fitting distributions
 ng_var_data = pd.read_csv('ngVarProj.csv', index_col=0)
@@ -138,10 +133,8 @@ bio_var_data = pd.read_csv('bioVarProj.csv', index_col=0)
 
 # Load data for electricity price change projections
 price_change_data = pd.read_csv('changeInElectrcitiyPriceProj.csv', index_col=0)
-# Fit distribution and save parameters for electricity price change (commented out for future use)
-# price_change_params = fit_skewed_norm_dist(price_change_data, 'priceChange')
-# np.save('priceChangeParams', price_change_params)
-price_change_params = np.load('priceChangeParams.npy')
+# Fitted distribution parameters for electricity price change
+price_change_params = skewnorm_params['priceChangeParams']
 
 
 template_path = 'C:\\Users\\bmb2tn\\OneDrive - University of Virginia\\Ph.D. Projects\\Energy PR\\codes\\TEMOA\\Temoa\\data_files\\PuertoRico\\PuertoRicoTempFR.txt'
@@ -165,8 +158,79 @@ max_year = 2050
 
 external_loops = 200
 internal_loops = 1000
-inputs = []
-outputs = []
+n_workers = os.cpu_count()
+seed = 1234  # Root seed of the external sample random streams
+save_every = 10  # Number of external samples between writes of the result files and checkpoint to disk
+resume_run = False  # Continue an interrupted run from its last checkpoint
+store_internal = False  # Keep the results of every internal iteration in a memory-mapped float32 array of internal_loops rows per sample
+sampling_design = 'random'  # Design of the external samples: 'random', 'sobol', 'halton' or 'lhs'
+
+# Uncertain inputs covered by the sampling design, in the order of the input file columns after the first one, the
+# fixed biofuel cost percentile. 'elc_price' is the independent part of the electricity price percentile, which is
+# correlated with the per capita consumption one; its column holds the resulting dependent percentile that the price
+# projection is evaluated at, so it is not a design column (the design value is outer_design[k, design_inputs.index('elc_price')])
+design_inputs = ['batt_inv', 'batt_fix', 'hyd_inv', 'hyd_fix', 'sol_inv', 'sol_fix', 'wind_inv', 'wind_fix',
+                 'population', 'per_capita', 'intensity_change', 'frequency_change', 'elc_price',
+                 'corruption_factor']
+outer_design = outer_sample_design(external_loops, len(design_inputs), sampling_design, seed)
+
+# Adaptive mode for the internal loop: stop once the standard error of the chosen outputs is within
+# convergence_tol of their mean, running between min_internal_loops and internal_loops iterations
+adaptive_internal = False
+min_internal_loops = 100
+convergence_tol = 0.01
+convergence_metrics = [0]  # Normalized total cost
+
+# Importance sampling of the hurricane intensities: wind speeds are drawn from the lognormal shifted by
+# wind_proposal_shift standard deviations and reweighted by their likelihood ratio (0 samples the nominal model)
+wind_proposal_shift = 0.0
+
+# Stratify the internal iterations on their number of hurricanes instead of drawing it at random: the iterations
+# without hurricanes are 16 fixed weather nodes, and the others are allocated across the event counts by their share
+# of the variance (see stratified_event_counts); in adaptive mode, every chunk of min_internal_loops is stratified
+stratified_internal = False
+
+# Pre-simulated hurricane catalog shared by the external samples, runs and scenarios (None to simulate the hurricanes
+# of every sample): catalog_histories histories of the nominal process, adapted to the frequency and intensity changes
+# of each sample by their likelihood ratio ('likelihood_ratio') or through the wind speed quantiles ('quantile'). Every
+# external sample takes its own internal_loops histories, so the catalog needs external_loops * internal_loops of them.
+# Importance sampling and stratification of the internal iterations do not apply to the catalog
+event_catalog_path = None
+catalog_histories = external_loops * internal_loops
+catalog_method = 'likelihood_ratio'
+
+# Network damage mode: the sampled grid is distributed over the components of powerNetwork.csv (see build_network_arrays),
+# whose damage and repair are simulated one by one and whose feeders give the share of the load that is lost; the repair
+# costs are summed back by component type in the outputs
+network_damage = False
+
+# Control variate for the cost outputs: the expected damage given the sampled wind speeds, whose exact mean is
+# integrated for each external sample; the variance reduction of each chosen output is printed
+control_variate = False
+control_variate_metrics = [0, 1, 3]  # Normalized total, damage and power outage costs
+
+# Expectation over the hurricanes in the internal loop: 'mc' for internal_loops Monte Carlo iterations, or 'quadrature'
+# for one iteration per node of a deterministic quadrature rule over the event count, wind speeds, event year and
+# weather, with the damage, repair and cost scatter at their expectations (see poisson_quadrature_events for its error);
+# with store_internal, internal_loops then has to be at least the number of nodes, recorded in the last output column
+internal_method = 'mc'
+validate_quadrature = False  # Compare both methods on the first validation_samples external samples before the run
+validation_samples = 5
+
+# Directory to save the damage ledger and economic inputs of every external sample to (None to not save them); the
+# economic inputs of a saved sample can be swept with load_ledger and recost_ledger without rerunning its hazards
+ledger_dir = None
+
+# Timeline mode: the internal iterations simulate every year from timeline_start to max_year instead of the 2049 period
+# alone, from a matrix of yearly hurricane counts, and cost each year with the capacities and activities of the Temoa
+# period covering it, brought to present value in timeline_base_year by the yearly inflation_rate and discount_rate
+# factors (e.g. 1.03); the cost outputs are then levelized over the discounted demand of the horizon. The quadrature,
+# catalog, importance sampling and stratification of the internal iterations do not apply to the timeline
+timeline = False
+timeline_start = 2020
+timeline_base_year = 2020
+inflation_rate = 1.0
+discount_rate = 1.0
 
 time_in = time.time()
 
@@ -223,13 +287,17 @@ wind_cf1, wind_cf2, wind_cf3, wind_cf4 = compute_wind_cf_func(cut_in, rated, md_
 bio_cost_percentile = 0.5 #median
 biofuel_price = bio_cost_percentile * (1.389 * 0.4) + 1.389 * 0.8
 
-demand_mean = write_temoa_input_file_fr(template_path, new_file_path, new_file_name,
-                                     md_sunny_ratios, md_windy_ratios, md_population, md_per_capita, gas_md_price, urn_md_price,
-                                     ng_var_costs, ng_fix_costs, ng_inv_costs, nuc_var_costs, nuc_fix_costs, nuc_inv_costs,
-                                     bio_var_costs, bio_fix_costs, bio_inv_costs, bio_max_cap, biofuel_price,
-                                     sol_md_inv_costs, wind_md_inv_costs, hyd_md_inv_costs, batt_md_inv_costs,
-                                     sol_md_fix_costs, wind_md_fix_costs, hyd_md_fix_costs, batt_md_fix_costs,
-                                     hyd_cf, sol_cf, wind_cf1, wind_cf2, wind_cf3, wind_cf4)
+if __name__ == '__main__':
+    demand_mean = write_temoa_input_file_fr(template_path, new_file_path, new_file_name,
+                                         md_sunny_ratios, md_windy_ratios, md_population, md_per_capita, gas_md_price, urn_md_price,
+                                         ng_var_costs, ng_fix_costs, ng_inv_costs, nuc_var_costs, nuc_fix_costs, nuc_inv_costs,
+                                         bio_var_costs, bio_fix_costs, bio_inv_costs, bio_max_cap, biofuel_price,
+                                         sol_md_inv_costs, wind_md_inv_costs, hyd_md_inv_costs, batt_md_inv_costs,
+                                         sol_md_fix_costs, wind_md_fix_costs, hyd_md_fix_costs, batt_md_fix_costs,
+                                         hyd_cf, sol_cf, wind_cf1, wind_cf2, wind_cf3, wind_cf4)
+else:
+    # Worker processes only need the 2050 demand written to the Temoa input file
+    demand_mean = md_population['2050'] * md_per_capita['2050'] / (277.78 * 10**6)
 
 # Uncomment the next line to run the Temoa model with the specified configurations
 # run_temoa(temoa_path, sql_path, sql_name, config_path, config_name)
@@ -239,38 +307,69 @@ caps, acts = read_output_fr(output_path, output_name)
 caps = {key: value * 1.2 for key, value in caps.items()}
 bio_max_act = caps['E_BIO'] * 365 * 24 / 277.78 * 0.85
 
-# External loop
-for k in range(external_loops):
+# Capacities and activities of every Temoa period, and the years of the timeline
+if timeline:
+    period_caps, period_acts = read_output_fr(output_path, output_name, year=None)
+    model_periods, period_caps = period_arrays(period_caps)
+    _, period_acts = period_arrays(period_acts, model_periods)
+    period_caps = {key: value * 1.2 for key, value in period_caps.items()}  # Adjusting capacities by 20%
+    timeline_years = np.arange(timeline_start, max_year)
+
+# Unit costs for transmission, distribution, substation, and towers
+trans_unit_cost, cond_unit_cost, sub_unit_cost, twr_unit_cost = 2251.804e6, 1057.159e6, 500.163e6, 634.296e6
+
+# Storage for the batched damage kernels, reused across external iterations
+event_storage = {}
+
+# Technology-indexed operational cost kernel of the scenario
+op_cost_kernel = build_op_cost_kernel('fr')
+
+# Memory-mapped hurricane catalog, built on first use
+event_catalog = load_event_catalog(event_catalog_path, min_year, max_year, global_rate, mu, sigma, catalog_histories, seed=seed) \
+    if event_catalog_path is not None else None
+
+# Components of the network damage mode
+network = read_power_network(components) if network_damage else None
+
+# External loop body, run for every sample by run_external_loops
+def run_external_sample(k, method=None, projections=None):
+    method = method or internal_method
     st_out = time.time()
     
     print(f'Sample no.: {k + 1}')
 
+    # Percentiles of the uncertain inputs from the sampling design; inputs without one are drawn at random
+    design_row = dict(zip(design_inputs, outer_design[k])) if outer_design is not None else {}
+    # Projection values of the design inputs, precomputed for all samples in the main block; evaluated here if missing
+    projections = {} if projections is None else projections
+
     # Projected costs and capacities for gas and uranium
     gas_price, gas_md_price, gas_price_percentile = compute_gas_proj(2020, 2050, 5, gas_price_data, gas_price_params)
     urn_price, urn_md_price, urn_price_percentile = compute_uranium_proj(2020, 2050, 5, urn_price_data, urn_price_params)
     
     
-    batt_inv_costs, batt_md_inv_costs, batt_fix_costs, batt_md_fix_costs, _, batt_percentile_inv, batt_percentile_fix = compute_battery_proj(2020, 2050, 5, batt_inv_data, batt_fix_data, batt_cf_data, batt_inv_params, batt_fix_params)
-    hyd_inv_costs, hyd_md_inv_costs, hyd_fix_costs, hyd_md_fix_costs, _, hyd_percentile_inv, hyd_percentile_fix = compute_hydro_proj(2020, 2050, 5, hyd_inv_data, hyd_fix_data, hyd_cf_data, hyd_inv_params, hyd_fix_params)
+    batt_inv_costs, batt_md_inv_costs, batt_fix_costs, batt_md_fix_costs, _, batt_percentile_inv, batt_percentile_fix = compute_battery_proj(2020, 2050, 5, batt_inv_data, batt_fix_data, batt_cf_data, batt_inv_params, batt_fix_params, percentile_inv=design_row.get('batt_inv'), percentile_fix=design_row.get('batt_fix'), inv_quantiles=projections.get('batt_inv'), fix_quantiles=projections.get('batt_fix'))
+    hyd_inv_costs, hyd_md_inv_costs, hyd_fix_costs, hyd_md_fix_costs, _, hyd_percentile_inv, hyd_percentile_fix = compute_hydro_proj(2020, 2050, 5, hyd_inv_data, hyd_fix_data, hyd_cf_data, hyd_inv_params, hyd_fix_params, percentile_inv=design_row.get('hyd_inv'), percentile_fix=design_row.get('hyd_fix'), inv_quantiles=projections.get('hyd_inv'), fix_quantiles=projections.get('hyd_fix'))
     bio_inv_costs, bio_fix_costs, bio_var_costs = compute_bio_proj(2020, 2050, 5, bio_inv_data, bio_fix_data, bio_var_data)
-    sol_inv_costs, sol_md_inv_costs, sol_fix_costs, sol_md_fix_costs, sol_cfs, sol_md_cfs, sol_percentile_inv, sol_percentile_fix, sol_percentile_cf = compute_solar_proj(2020, 2050, 5, sol_inv_data, sol_fix_data, sol_cf_data, sol_inv_params, sol_fix_params, sol_cf_params)
-    wind_inv_costs, wind_md_inv_costs, wind_fix_costs, wind_md_fix_costs, wind_cf_changes, wind_md_cf_changes, wind_percentile_inv, wind_percentile_fix, wind_percentile_cf_change = compute_wind_proj(2020, 2050, 5, wind_inv_data, wind_fix_data, wind_cf_change_data, wind_inv_params, wind_fix_params, wind_cf_change_params)
+    sol_inv_costs, sol_md_inv_costs, sol_fix_costs, sol_md_fix_costs, sol_cfs, sol_md_cfs, sol_percentile_inv, sol_percentile_fix, sol_percentile_cf = compute_solar_proj(2020, 2050, 5, sol_inv_data, sol_fix_data, sol_cf_data, sol_inv_params, sol_fix_params, sol_cf_params, percentile_inv=design_row.get('sol_inv'), percentile_fix=design_row.get('sol_fix'), inv_quantiles=projections.get('sol_inv'), fix_quantiles=projections.get('sol_fix'))
+    wind_inv_costs, wind_md_inv_costs, wind_fix_costs, wind_md_fix_costs, wind_cf_changes, wind_md_cf_changes, wind_percentile_inv, wind_percentile_fix, wind_percentile_cf_change = compute_wind_proj(2020, 2050, 5, wind_inv_data, wind_fix_data, wind_cf_change_data, wind_inv_params, wind_fix_params, wind_cf_change_params, percentile_inv=design_row.get('wind_inv'), percentile_fix=design_row.get('wind_fix'), inv_quantiles=projections.get('wind_inv'), fix_quantiles=projections.get('wind_fix'))
     ng_inv_costs, ng_fix_costs, ng_var_costs = compute_ngcc_proj(2020, 2050, 5, ng_inv_data, ng_fix_data, ng_var_data)
     nuc_inv_costs, nuc_fix_costs, nuc_var_costs = compute_nuclear_proj(2020, 2050, 5, nuc_inv_data, nuc_fix_data, nuc_var_data)
     
     # Population and Per Capita Consumption projections
-    population, md_population, pop_percentile = predict_population(2020, 2050, 5, population_data, population_params)
-    per_capita, md_per_capita, per_capita_percentile = predict_per_capita_consumption(2020, 2050, 5, consumption_change_data, per_capita_params)
+    population, md_population, pop_percentile = predict_population(2020, 2050, 5, population_data, population_params, percentile=design_row.get('population'), quantiles=projections.get('population'))
+    per_capita, md_per_capita, per_capita_percentile = predict_per_capita_consumption(2020, 2050, 5, consumption_change_data, per_capita_params, percentile=design_row.get('per_capita'), quantiles=projections.get('per_capita'))
 
     # Demand projection for 2050
     demand_2050 = population['2050'] * per_capita['2050'] / (277.78 * 10**6)
     
     # Intensity and frequency changes for weather events
-    intensity_change = (np.random.lognormal(1.6564, 0.5396) - 2.5) / 100 + 1
-    frequency_change = (np.random.lognormal(3.9344, 0.4347) - 65) / 100 + 1
+    intensity_change = (sample_lognormal(1.6564, 0.5396, design_row.get('intensity_change')) - 2.5) / 100 + 1
+    frequency_change = (sample_lognormal(3.9344, 0.4347, design_row.get('frequency_change')) - 65) / 100 + 1
     
-    # Electricity price change projections
-    elc_price_change, elc_md_price_change, elc_price_change_percentile = compute_elc_price_proj(2025, 2050, 5, price_change_data, price_change_params, per_capita_percentile)
+    # Electricity price change projections; the design sets the independent part of the percentile, and the input file
+    # records the dependent percentile the projection uses
+    elc_price_change, elc_md_price_change, elc_price_change_percentile = compute_elc_price_proj(2025, 2050, 5, price_change_data, price_change_params, per_capita_percentile, independent_percentile=design_row.get('elc_price'), quantiles=projections.get('elc_price'))
     
     # Mean weather conditions
     weather = weather_condition_mean(2020, 2050)
@@ -283,15 +382,15 @@ for k in range(external_loops):
     #emission_cost_rate = np.random.lognormal(-3.5, 1.21)
 
     # Corruption factor for adjustments
-    corruption_factor = np.random.uniform(1, 4)
+    corruption_factor = sample_uniform(1, 4, design_row.get('corruption_factor'))
     
     bio_cost_percentile = 0.5
     biofuel_price = bio_cost_percentile * (1.389 * 0.4) + 1.389 * 0.8
     
-    inputs.append([bio_cost_percentile, batt_percentile_inv, batt_percentile_fix,
+    sample_inputs = [bio_cost_percentile, batt_percentile_inv, batt_percentile_fix,
                hyd_percentile_inv, hyd_percentile_fix,
                sol_percentile_inv, sol_percentile_fix, wind_percentile_inv, wind_percentile_fix, pop_percentile, per_capita_percentile,
-               intensity_change, frequency_change, elc_price_change_percentile, corruption_factor])
+               intensity_change, frequency_change, elc_price_change_percentile, corruption_factor]
 
     # Fixed and variable costs for 2050
     sol_fix_50 = sol_fix_costs['2050']
@@ -313,207 +412,269 @@ for k in range(external_loops):
     trans_var_50 = 0.86  # Assumed value for transmission variable costs
     cond_var_50 = 1.15  # Assumed value for distribution variable costs
     
-    wind_farm_no = max(np.floor(caps['E_WIND'] / (np.random.uniform(40, 150) / 1000)), 1) #Assuming each wind farm can have 40-150 MW
-    solar_farm_no = max(np.floor(caps['E_SOLPV'] / (np.random.uniform(20, 100) / 1000)), 1) #Assuming each solar farm can have 20-100 MW
     # Since the initial number of substation in data file is 340
     substation_no = np.floor(340 * caps['E_SUB'] / 3.08 / 23.67)
-    twr_no = np.floor(4284511 / np.random.uniform(150, 600)) #Considering the transmission line length and the distance between two towers in considered U(150, 600m)
     
  
-    # Store internal results for further analysis
-    internal_results = []
-    total_costs = []
-    mean_of_total_costs = []
-
-    for j in range(internal_loops):
-       #Modifying Acts based on Weather
-        added_cost_ratio = 1
-        weather_in = weather_condition(min_year, max_year)
-       
-        sunny_ratios_in = np.array([weather_in[0][0], weather_in[1][0], 1 - (weather_in[0][0] + weather_in[1][0])])
-        windy_ratios_in = np.array([weather_in[2][0], weather_in[3][0], weather_in[4][0], weather_in[5][0], weather_in[6][0], 1 - (weather_in[2][0] + weather_in[3][0] + weather_in[4][0] + weather_in[5][0] + weather_in[6][0])])
-                
-        
-        const_acts = acts['E_WIND'] + acts['E_SOLPV'] + acts['E_BIO']
-
-        change_in_sol_act = (sunny_ratios_in[0] + 0.5 * sunny_ratios_in[1]) / (sunny_ratios[0] + 0.5 * sunny_ratios[1])
-        
-        in_avg_wind = (windy_ratios_in[0] * 9.5 + windy_ratios_in[1] * 14.5 + windy_ratios_in[2] * 20.5 + windy_ratios_in[3] * 27.5 + windy_ratios_in[4] * 34.5)
+    # Hazard, damage and weather draws come from a separate stream, shared by the scenarios run with the same seed. It
+    # starts with the farm sizes and tower spacing, which feed the restoration periods and so have to be common to the
+    # scenarios as well; the quadrature path draws nothing else, and takes the expectations of the damage, repair and
+    # cost scatter at its nodes
+    seed_hazard_stream(k, seed)
+    wind_farm_no = max(np.floor(caps['E_WIND'] / (np.random.uniform(40, 150) / 1000)), 1) #Assuming each wind farm can have 40-150 MW
+    solar_farm_no = max(np.floor(caps['E_SOLPV'] / (np.random.uniform(20, 100) / 1000)), 1) #Assuming each solar farm can have 20-100 MW
+    twr_no = np.floor(4284511 / np.random.uniform(150, 600)) #Considering the transmission line length and the distance between two towers in considered U(150, 600m)
+    expected = method == 'quadrature' and not timeline
+
+    # Simulate hurricane occurrences for all internal iterations at once, based on a Poisson process with adjusted intensity and frequency,
+    # take one iteration per node of the quadrature rule over the same process, or take them from the catalog; the timeline
+    # simulates them year by year over its horizon
+    if timeline:
+        events = poisson_timeline_events(timeline_start, max_year, global_rate, mu, sigma, frequency_change, intensity_change, internal_loops)
+    elif method == 'quadrature':
+        events = poisson_quadrature_events(min_year, max_year, global_rate, mu, sigma, frequency_change, intensity_change)
+    elif event_catalog is not None:
+        events = catalog_events(event_catalog, frequency_change, intensity_change, internal_loops, k, method=catalog_method)
+    else:
+        events = poisson_process_batch(min_year, max_year, global_rate, mu, sigma, frequency_change, intensity_change, internal_loops,
+                                       proposal_shift=wind_proposal_shift, stratified=stratified_internal,
+                                       chunk_size=min_internal_loops if adaptive_internal else None)
+    n_iterations = len(events['count'])
+
+    # Grid component arrays based on current capacities and unit costs
+    grid = build_grid_arrays(caps, sol_inv_costs, wind_inv_costs, trans_unit_cost, cond_unit_cost, sub_unit_cost, twr_unit_cost)
+    if network_damage:
+        grid = build_network_arrays(grid, network)
+
+    # Expected damage of every internal iteration given its wind speeds, and its exact mean, for the control variate
+    if control_variate:
+        dmg_control = damage_control(events['windSpeed'], grid['type'], grid['replacement_cost'])
+        dmg_control_mean = expected_damage_control(timeline_start if timeline else min_year, max_year, global_rate, mu, sigma, frequency_change, intensity_change,
+                                                   grid['type'], grid['replacement_cost'])
+
+    def simulate_internal(events, chunk_no=None):
+        """
+        Simulates and costs the internal iterations of a batch of occurrences, or of one chunk of it.
+
+        Parameters:
+        - events: Batch of occurrences, in the format of poisson_process_batch.
+        - chunk_no: Number of the chunk in adaptive mode, used to name its ledger file.
+
+        Returns:
+        - An array with one row of results per internal iteration.
+        """
+        n_iterations = len(events['count'])
+
+        # Preallocated arrays sized to the sampled number of occurrences
+        buffers = get_event_buffers(event_storage, len(grid['type']), events['windSpeed'].shape[0], n_iterations)
+
+        # Failure probabilities of all components for every occurrence of every internal iteration, by component type for catalog events
+        if 'fail_probs' in events and not network_damage:
+            fail_probs = np.take(events['fail_probs'], grid['type'], axis=0, out=buffers['fail_probs'])
+        else:
+            fail_probs, damage_states = compute_damage_batch(events['windSpeed'], grid['type'], out=(buffers['fail_probs'], buffers['damage_states']),
+                                                             wind_scale=grid.get('wind_scale'), valid_only=network_damage, expected=expected)
+
+        # Repair periods of all components and actual restoration periods for every occurrence of every internal iteration
+        all_repair_periods, all_actual_repair_periods = compute_restoration_period_batch(
+            grid['type'], grid['line_length'], fail_probs, events['windSpeed'], wind_farm_no, solar_farm_no, substation_no, twr_no,
+            out=(buffers['repair_periods'], buffers['actual_repair_periods']), pole_distances=grid.get('pole_distance'), unit_shares=grid.get('unit_share'),
+            valid_only=network_damage, expected=expected)
+
+        # Replacement cost noise of all components for every occurrence of every internal iteration (its mean, 0, at the quadrature nodes)
+        if expected:
+            cost_noise = np.zeros(fail_probs.shape)
+        else:
+            cost_noise = draw_event_values(np.random.standard_normal, fail_probs.shape, event_mask(events['count'], fail_probs.shape[1]) if network_damage else None)
+
+        # Probability that an occurrence takes down the transmission or distribution lines, or the share of the feeders it takes down
+        # in network mode, and the resulting outage days per iteration
+        if network_damage:
+            unop_occ = feeder_outage_share(fail_probs, grid['feeders'], out=buffers['unop_occ'])
+        else:
+            unop_occ = np.multiply(1 - fail_probs[0], 1 - fail_probs[1], out=buffers['unop_occ'])
+            np.subtract(1, unop_occ, out=unop_occ)
+        outage_days = unop_occ * all_actual_repair_periods
+        unop_days = np.sum(outage_days, axis=0)
+        total_repair_periods = np.sum(all_actual_repair_periods, axis=0)
+
+        # Weather conditions of all internal iterations; only the first simulated year is used for the 2050 activities
+        weather_samples = weather_condition_batch(min_year, max_year, n_iterations, deviates=events.get('weather_deviates'))
+
+        # Modifying Acts based on Weather, for all internal iterations at once
+        weather_in = weather_samples[:, 0].T
+        change_in_sol_act = (weather_in[0] + 0.5 * weather_in[1]) / (sunny_ratios[0] + 0.5 * sunny_ratios[1])
+
+        in_avg_wind = (weather_in[2] * 9.5 + weather_in[3] * 14.5 + weather_in[4] * 20.5 + weather_in[5] * 27.5 + weather_in[6] * 34.5)
         out_avg_wind = (windy_ratios[0] * 9.5 + windy_ratios[1] * 14.5 + windy_ratios[2] * 20.5 + windy_ratios[3] * 27.5 + windy_ratios[4] * 34.5)
-        
+
         change_in_wind_act = (wind_cf1 * (in_avg_wind * 1.609)**3 + wind_cf2 * (in_avg_wind * 1.609)**2 + wind_cf3 * (in_avg_wind * 1.609) + wind_cf4) / \
                              (wind_cf1 * (out_avg_wind * 1.609)**3 + wind_cf2 * (out_avg_wind * 1.609)**2 + wind_cf3 * (out_avg_wind * 1.609) + wind_cf4)
-        change_in_wind_act = min(change_in_wind_act, 1.5)
-        
-        change_in_sol_act = min(change_in_sol_act, 1.5)
-        
-        
+        change_in_wind_act = np.minimum(change_in_wind_act, 1.5)
+
+        change_in_sol_act = np.minimum(change_in_sol_act, 1.5)
+
         acts_in = acts.copy()
-        caps_in = caps.copy()
-        #emissions_in = emissions
-
-        acts_in['E_SOLPV'] *= change_in_sol_act
-        acts_in['E_WIND'] *= change_in_wind_act
-        
-        change_in_bio_act = max(demand_2050 - acts_in['E_SOLPV'] - acts_in['E_WIND'], 0) / acts_in['E_BIO']
-        acts_in['E_BIO'] *= change_in_bio_act
-        
-        if acts_in['E_BIO'] > bio_max_act:
-            added_cost_ratio = ((acts_in['E_BIO'] - bio_max_act) / acts_in['E_BIO']) * 1.2 + (bio_max_act / acts_in['E_BIO']) * 1
-            
-        acts_in['S_IMPBIO'] *= change_in_bio_act
-                               
-        #emissionsInBio *= changeInBioAct
-          
-        
+
+        acts_in['E_SOLPV'] = acts['E_SOLPV'] * change_in_sol_act
+        acts_in['E_WIND'] = acts['E_WIND'] * change_in_wind_act
+
+        change_in_bio_act = np.maximum(demand_2050 - acts_in['E_SOLPV'] - acts_in['E_WIND'], 0) / acts_in['E_BIO']
+
+        acts_in['E_BIO'] = acts['E_BIO'] * change_in_bio_act
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            added_cost_ratio = np.where(acts_in['E_BIO'] > bio_max_act, ((acts_in['E_BIO'] - bio_max_act) / acts_in['E_BIO']) * 1.2 + (bio_max_act / acts_in['E_BIO']) * 1, 1)
+
+        acts_in['S_IMPBIO'] = acts['S_IMPBIO'] * change_in_bio_act
+
         acts_in['E_TRANS'] *= demand_2050 / demand_mean
         acts_in['E_SUB'] *= demand_2050 / demand_mean
         acts_in['E_COND'] *= demand_2050 / demand_mean
         acts_in['E_TWR'] *= demand_2050 / demand_mean
-        
-        
-
-        op_cost_undamaged, sol_cost, wind_cost, batt_cost, hyd_cost, bio_cost, ngcc_cost, nuc_cost, trans_cost, cond_cost = compute_normal_op_costs_fr(
-            caps, acts_in, sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, nuc_fix_50, hyd_fix_50, bio_fix_50,
-            ngcc_var_50, nuc_var_50, bio_var_50, biofuel_price, trans_var_50, cond_var_50, ng_var_50, urn_var_50, added_cost_ratio)
-
-        
-        sol_op_ratio = sol_cost * 10**6 / op_cost_undamaged
-        wind_op_ratio = wind_cost * 10**6 / op_cost_undamaged
-        batt_op_ratio = batt_cost * 10**6 / op_cost_undamaged
-        hyd_op_ratio = hyd_cost * 10**6 / op_cost_undamaged
-        bio_op_ratio = bio_cost * 10**6 / op_cost_undamaged
-        ngcc_op_ratio = ngcc_cost * 10**6 / op_cost_undamaged
-        nuc_op_ratio = nuc_cost * 10**6 / op_cost_undamaged
-        trans_op_ratio = trans_cost * 10**6 / op_cost_undamaged
-        cond_op_ratio = cond_cost * 10**6 / op_cost_undamaged
-        
-        #emissionCost = emissionCostRate * emissionsIn * 10**6
-
-        # Unit costs for transmission, distribution, substation, and towers
-        trans_unit_cost, cond_unit_cost, sub_unit_cost, twr_unit_cost = 2251.804e6, 1057.159e6, 500.163e6, 634.296e6
-        
-        # Write grid data based on current capacities and unit costs
-        components = write_grid_data(caps, sol_inv_costs, wind_inv_costs, trans_unit_cost, cond_unit_cost, sub_unit_cost, twr_unit_cost)
-       
-       
-        # Generate occurrences based on a Poisson process with adjusted intensity and frequency
-        occurrences = poisson_process_interval(min_year, max_year, global_rate, mu, sigma, frequency_change, intensity_change)
-         
-        # Initialize data structures for failure probabilities, repair periods, and occurrence costs
-        failure_probs = pd.DataFrame()
-        all_repair_periods = pd.DataFrame()
-        actual_repair_periods = []
-        all_occurrence_costs = np.zeros((len(components), len(occurrences)))
-                  
-        # Process each occurrence to compute damage and restoration
-        for i in range(len(occurrences)):
-            occ_no = i + 1
-            failure_probs, comp_fail_prob, damage_states = compute_damage(occurrences.iloc[i]['windSpeed'], components, occ_no, failure_probs)
-            all_repair_periods, actual_repair_periods = compute_restoration_period(components, comp_fail_prob, occ_no, all_repair_periods, actual_repair_periods, occurrences.iloc[i]['windSpeed'], wind_farm_no, solar_farm_no, substation_no, twr_no)
-
-        # Initialize power outage cost and operational ratios
-        power_outage_cost, op_ratio, unop_ratio = 0, 1.0, 0
-        lost_load_res, lost_load_com, lost_load_ind = 0, 0, 0
-
-        # Compute power outage impacts and costs if failures are present
-        if not failure_probs.empty:
-            unop_occ = 1 - np.prod(1 - failure_probs.loc[[0, 1]], axis=0)
-            unop_ratio = min(np.sum(unop_occ * np.array(actual_repair_periods)) * corruption_factor, (2050 - occurrences.iloc[0]['year']) * 365) / 365
-            op_ratio = 1 - unop_ratio
-            
-            lost_load = unop_ratio * population['2050'] * per_capita['2050'] / 2 # /2 is because we assumed a linear recovery of system, and the lost load is the area under the triangular recovery function, which is half the rectangular one
-            
-            lost_load_res = 0.43 * lost_load #ratios from https://www.eia.gov/state/print.php?sid=RQ#:~:text=The%20commercial%20sector%20consumes%20about,of%20the%2050%20U.S.%20states.
-            lost_load_com = 0.45 * lost_load
-            lost_load_ind = 0.11 * lost_load
-            
-            lost_load_res = 0.735 * lost_load # Adjusting for solar rooftop
-
-            price_res = elc_price_change['2050'] * 15.64 #cents from https://www.eia.gov/state/print.php?sid=RQ
-            price_ind = elc_price_change['2050'] * 12.5
-            price_com = elc_price_change['2050'] * 8.5
-            
-            # Power outage cost based on PREDICTION OF DOMESTIC, INDUSTRIAL AND COMMERCIAL, INTERRUPTION COSTS BY RELATIONAL APPROACH (1997), changing the units from HK$ to $ since the conversion rate has not changed. Also, the values obtained match the 5000$/MWh estimated value of Ercot
-            # Compute Value of Lost Load (VoLL) for each sector
-            voll_res = (-1.0058 + 0.58 * price_res) * lost_load_res #USD
-            voll_com = (-4.585 + 0.991 * price_com) * lost_load_com
-            voll_ind = (-1.859 + 0.49 * price_ind) * lost_load_ind
-            power_outage_cost = (voll_res + voll_com + voll_ind) / 1.81
-            
-        # Calculate operational cost taking into account undamaged operational cost and unoperational ratios
-        op_cost = op_cost_undamaged * (op_ratio + unop_ratio / 2)   
-        
-        # Compute undiscounted damage costs
-        undisc_dmg_costs = compute_dmg_costs(components, failure_probs, occurrences, min_year)
-
-        total_dmg_cost = sum(sum(undisc_dmg_costs))
-        if total_dmg_cost != 0:
-            # Calculating the repair ratios for each type of component
-            rep_trans_ratio = np.sum(undisc_dmg_costs, axis=1)[0]
-            rep_dist_ratio = np.sum(undisc_dmg_costs, axis=1)[1]
-            rep_twr_ratio = np.sum(undisc_dmg_costs, axis=1)[2]
-            rep_sub_ratio = np.sum(undisc_dmg_costs, axis=1)[3]
-            rep_sol_ratio = np.sum(undisc_dmg_costs, axis=1)[4]
-            rep_wind_ratio = np.sum(undisc_dmg_costs, axis=1)[5]
+
+        # Economic inputs of the sample, applied to the ledger as vector arithmetic over the internal iterations
+        economics = {
+            'corruption_factor': corruption_factor,
+            'elc_price_change': elc_price_change['2050'],
+            'replacement_costs': grid['replacement_cost'],
+            'op_cost_args': (sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, nuc_fix_50, hyd_fix_50, bio_fix_50,
+                         ngcc_var_50, nuc_var_50, bio_var_50, biofuel_price, trans_var_50, cond_var_50, ng_var_50, urn_var_50),
+        }
+
+        if timeline:
+            # Physical outcomes of every year of the horizon, costed with the Temoa period covering each year at present value
+            timeline_population = timeline_values(population, timeline_years)
+            timeline_per_capita = timeline_values(per_capita, timeline_years)
+            ledger = build_timeline_ledger(events, fail_probs, cost_noise, outage_days, period_caps, period_acts, model_periods, timeline_years,
+                                           timeline_population * timeline_per_capita / (277.78 * 10**6), timeline_population, timeline_per_capita)
+            period_grid = build_period_grid_arrays(period_caps, model_periods, sol_inv_costs, wind_inv_costs, trans_unit_cost, cond_unit_cost, sub_unit_cost, twr_unit_cost)
+            if network_damage:
+                period_grid = build_network_arrays(period_grid, network)
+            economics.update({
+                'elc_price_change': timeline_values(elc_price_change, timeline_years),
+                # Unit costs of every year, from the projections they are taken from in 2050 above
+                'op_cost_args': tuple(timeline_values(unit_cost, timeline_years) for unit_cost in (
+                    sol_fix_costs, wind_fix_costs, batt_fix_costs, ng_fix_costs, nuc_fix_costs, hyd_fix_costs, bio_fix_costs,
+                    ng_var_costs, nuc_var_costs, bio_var_costs, biofuel_price, trans_var_50, cond_var_50, gas_price, urn_price)),
+                'replacement_costs': period_grid['replacement_cost'],
+                'coefficients': timeline_coefficients(timeline_years, timeline_base_year, inflation_rate, discount_rate),
+            })
+            costs = recost_timeline(ledger, economics, op_cost_kernel, out=buffers['dmg_costs'])
+            demand = costs['demand']
         else:
-            # Setting repair ratios to 0 if there are no damage costs
-            rep_trans_ratio = 0
-            rep_dist_ratio = 0
-            rep_twr_ratio = 0
-            rep_sub_ratio = 0
-            rep_sol_ratio = 0
-            rep_wind_ratio = 0
-        
-        # Applying corruption factor to the total damage cost
-        total_dmg_cost *= corruption_factor
-        
-        # Calculating the total cost including operational, damage, and power outage costs
-        total_cost = total_dmg_cost + op_cost + power_outage_cost
-        
+            # Physical outcomes of the internal iterations, which do not depend on the economic inputs of the sample
+            ledger = build_damage_ledger(events, fail_probs, cost_noise, unop_days, total_repair_periods, acts_in, added_cost_ratio, caps,
+                                         demand_2050, population['2050'], per_capita['2050'], min_year, max_year)
+            costs = recost_ledger(ledger, economics, op_cost_kernel, out=buffers['dmg_costs'])
+            demand = demand_2050
+        if ledger_dir is not None:
+            ledger_name = f'ledgerFR_{k}.npz' if chunk_no is None else f'ledgerFR_{k}_{chunk_no}.npz'
+            save_ledger(os.path.join(ledger_dir, ledger_name), ledger, economics)
+
+        # Repair costs of each component type
+        repair_costs = grid['type_sums'] @ costs['repair_costs'] if network_damage else costs['repair_costs']
+
         # Normalization coefficient for total cost to convert PJ to MWh
         coef = 277777.778
-        
-        internal_results.append([
-            float(total_cost) / demand_2050 / coef, 
-            float(total_dmg_cost) / demand_2050 / coef, 
-            op_cost / demand_2050 / coef, 
-            power_outage_cost / demand_2050 / coef, 
-            demand_2050, 
-            lost_load_res, 
-            lost_load_com, 
-            lost_load_ind, 
-            np.sum(np.array(actual_repair_periods)),
-            rep_trans_ratio / demand_2050, 
-            rep_dist_ratio / demand_2050, 
-            rep_twr_ratio / demand_2050, 
-            rep_sub_ratio / demand_2050, 
-            rep_sol_ratio / demand_2050, 
-            rep_wind_ratio / demand_2050,
-            sol_op_ratio, 
-            wind_op_ratio, 
-            batt_op_ratio, 
-            hyd_op_ratio, 
-            bio_op_ratio, 
-            ngcc_op_ratio, 
-            nuc_op_ratio, 
-            trans_op_ratio, 
-            cond_op_ratio, 
-            ])    
-            
-        # Appending the total cost for this iteration to the total costs list
-        total_costs.append(float(total_cost))
-        
-        # Calculating and appending the mean of total costs so far to the list
-        mean_of_total_costs.append(np.mean(np.array(total_costs)))
-
-    outputs.append(np.mean(np.array(internal_results), axis=0))
-
-    np.savetxt(os.path.join(input_output_dir, 'outputFR.txt'), np.array(outputs))
-    np.savetxt(os.path.join(input_output_dir,'inputFR.txt'), np.array(inputs))
-    
+
+        # Normalized costs, demand, lost loads, total repair period, repair costs of each component normalized by demand and
+        # operational cost ratios of each technology, for every internal iteration (levelized over the horizon in the timeline)
+        internal_results = np.column_stack([
+            costs['total_cost'] / demand / coef, costs['dmg_cost'] / demand / coef, costs['op_cost'] / demand / coef,
+            costs['outage_cost'] / demand / coef, np.full(n_iterations, demand),
+            costs['lost_load_res'], costs['lost_load_com'], costs['lost_load_ind'], total_repair_periods,
+            *(repair_costs / demand),
+            *costs['op_ratios']])
+        return internal_results
+
+    # Internal iterations, simulated in chunks of min_internal_loops in adaptive mode so that no new histories are
+    # simulated once the chosen metrics have converged
+    if adaptive_internal and method == 'mc':
+        internal_results = run_internal_chunks(simulate_internal, events, min_internal_loops, convergence_metrics,
+                                               convergence_tol, min_internal_loops)
+    else:
+        internal_results = simulate_internal(events)
+
+    # Likelihood ratio and stratum weighted means of the outputs (plain means by default), followed by their standard
+    # errors (NaN at the deterministic quadrature nodes) and the number of internal iterations used; the weights are
+    # stored as the last column of the internal results
+    weights = events['weight'][:len(internal_results)]
+    output_means, output_errors = internal_means(internal_results, weights)
+    if control_variate:
+        output_means[control_variate_metrics], variance_ratios = control_variate_means(
+            np.array(internal_results)[:, control_variate_metrics], dmg_control[:len(internal_results)], dmg_control_mean, weights)
+        output_errors[control_variate_metrics] *= np.sqrt(variance_ratios)
+        print('control variate variance ratios = ', variance_ratios)
+    if expected:
+        output_errors[:] = np.nan
+    sample_outputs = np.concatenate([output_means, output_errors, [len(internal_results)]])
+    sample_internal = np.column_stack((internal_results, weights)).astype(np.float32) if store_internal else None
+
     et_out = time.time()
     t_out = et_out - st_out
     print('external loop time = ', t_out)
-    
-print('Time Elapsed: ', time.time() - time_in)   
+
+    return sample_inputs, sample_outputs, sample_internal
+
+
+if __name__ == '__main__':
+    # Quadrature path checked against the Monte Carlo one on the same external samples
+    if validate_quadrature:
+        _, _, rel_diff = compare_internal_methods(run_external_sample, range(min(validation_samples, external_loops)), seed=seed)
+        print('quadrature vs Monte Carlo relative differences (normalized total, damage, operational and outage costs) = ')
+        print(rel_diff[:, :4])
+
+    # Binary result files are appended to and checkpointed every save_every samples, so that an interrupted run
+    # can be resumed from its last checkpoint without recomputing the saved samples
+    checkpoint_path = os.path.join(input_output_dir, 'checkpointFR.json')
+    checkpoint = load_checkpoint(checkpoint_path) if resume_run else None
+    start = checkpoint['next_sample'] if checkpoint is not None and checkpoint['seed'] == seed else 0
+
+    input_sink = open_result_sink(os.path.join(input_output_dir, 'inputFR.bin'), start)
+    output_sink = open_result_sink(os.path.join(input_output_dir, 'outputFR.bin'), start)
+    internal_store = None
+
+    # Projections of the design inputs for all samples, from one interpolated skew normal call instead of exact calls in
+    # every sample, with the parameter rows of the projection years as sliced by the projection functions; the
+    # electricity price is projected at its percentile dependent on the per capita consumption one
+    sample_kwargs = None
+    if outer_design is not None:
+        percentiles = dict(zip(design_inputs, outer_design.T))
+        percentiles['elc_price'] = generate_dependant_uniform(percentiles['per_capita'], 0.573, percentiles['elc_price'])
+        projection_params = {
+            'batt_inv': batt_inv_params[:7], 'batt_fix': batt_fix_params[:7], 'hyd_inv': hyd_inv_params[:7], 'hyd_fix': hyd_fix_params[:7],
+            'sol_inv': sol_inv_params[:7], 'sol_fix': sol_fix_params[:7], 'wind_inv': wind_inv_params[:7], 'wind_fix': wind_fix_params[:7],
+            'population': population_params[:35:5], 'per_capita': per_capita_params[:35:5],
+            'elc_price': price_change_params[4:34:5],
+        }
+        sample_kwargs = [{'projections': projections} for projections in batch_projection_quantiles(percentiles, projection_params)]
+
+    # Run the external samples on n_workers processes and save the input-output pairs in sample order
+    results = run_external_loops(run_external_sample, external_loops, seed=seed, n_workers=n_workers, start=start,
+                                 sample_kwargs=sample_kwargs)
+    for k, (sample_inputs, sample_outputs, sample_internal) in enumerate(results, start):
+        append_result_row(input_sink, sample_inputs)
+        append_result_row(output_sink, sample_outputs)
+
+        if sample_internal is not None:
+            if internal_store is None:
+                internal_store = open_internal_store(os.path.join(input_output_dir, 'internalFR.npy'), external_loops, internal_loops,
+                                                     sample_internal.shape[1], resume=start > 0)
+            write_internal_results(internal_store, k, sample_internal)
+
+        if (k + 1) % save_every == 0 or k + 1 == external_loops:
+            flush_result_sink(input_sink)
+            flush_result_sink(output_sink)
+            if internal_store is not None:
+                internal_store.flush()
+            save_checkpoint(checkpoint_path, {'next_sample': k + 1, 'seed': seed})
+
+    input_sink['file'].close()
+    output_sink['file'].close()
+
+    # Text copies of the input-output pairs for the surrogate models
+    np.savetxt(os.path.join(input_output_dir, 'outputFR.txt'), read_result_rows(os.path.join(input_output_dir, 'outputFR.bin')))
+    np.savetxt(os.path.join(input_output_dir,'inputFR.txt'), read_result_rows(os.path.join(input_output_dir, 'inputFR.bin')))
+
+    print('Time Elapsed: ', time.time() - time_in)
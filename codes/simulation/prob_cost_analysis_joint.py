@@ -0,0 +1,98 @@
+import numpy as np
+import os
+import time
+from utils import *
+import warnings
+warnings.filterwarnings('ignore')
+
+# Importing the scenario scripts loads their data and Temoa results without running their external loops
+import prob_cost_analysis_BAU
+import prob_cost_analysis_FD
+import prob_cost_analysis_FR
+
+
+# Scenarios evaluated on common random numbers
+scenarios = {'BAU': prob_cost_analysis_BAU, 'FD': prob_cost_analysis_FD, 'FR': prob_cost_analysis_FR}
+
+input_output_dir = "C:\\Users\\bmb2tn\\OneDrive - University of Virginia\\Ph.D. Projects\\Energy PR\\codes\\simulation\\input_output_pairs"
+
+external_loops = 200
+internal_loops = 1000
+n_workers = os.cpu_count()
+seed = 1234  # Root seed of the shared sample and hazard random streams
+save_every = 10  # Number of external samples between writes of the result files and checkpoints to disk
+resume_run = False  # Continue an interrupted run from its last checkpoints
+sampling_design = 'uniform'  # Design of the shared external samples: 'uniform', 'sobol', 'halton' or 'lhs'
+
+# Union of the uncertain inputs of all scenarios; inputs shared by several scenarios get the same percentiles
+joint_inputs = []
+for scenario in scenarios.values():
+    joint_inputs += [name for name in scenario.design_inputs if name not in joint_inputs]
+joint_design = outer_sample_design(external_loops, len(joint_inputs), sampling_design, seed)
+
+# Every scenario takes its own columns of the shared design, and uses the same loop sizes and seed
+for scenario in scenarios.values():
+    scenario.outer_design = joint_design[:, [joint_inputs.index(name) for name in scenario.design_inputs]]
+    scenario.internal_loops = internal_loops
+    scenario.seed = seed
+
+
+def run_joint_sample(k):
+    """
+    Runs external sample k of every scenario. Each scenario starts from the same sample stream and draws its
+    hurricanes, damages, repairs and weather from the same hazard stream.
+
+    Parameters:
+    - k: Index of the external sample.
+
+    Returns:
+    - A dictionary with the (inputs, outputs, internal results) of the sample for each scenario.
+    """
+    results = {}
+    for name, scenario in scenarios.items():
+        seed_sample_stream(k, seed)
+        results[name] = scenario.run_external_sample(k)
+
+    return results
+
+
+if __name__ == '__main__':
+    time_in = time.time()
+
+    # Binary result files of every scenario are appended to and checkpointed every save_every samples, as in the
+    # scenario scripts; the run resumes from the earliest checkpoint of the scenarios, so that they stay paired
+    checkpoint_paths = {name: os.path.join(input_output_dir, f'checkpoint{name}Joint.json') for name in scenarios}
+    checkpoints = [load_checkpoint(path) if resume_run else None for path in checkpoint_paths.values()]
+    start = min(checkpoint['next_sample'] if checkpoint is not None and checkpoint['seed'] == seed else 0 for checkpoint in checkpoints)
+
+    result_paths = {name: {kind: os.path.join(input_output_dir, f'{kind}{name}Joint.bin') for kind in ('input', 'output')} for name in scenarios}
+    sinks = {name: {kind: open_result_sink(path, start) for kind, path in paths.items()} for name, paths in result_paths.items()}
+
+    for k, results in enumerate(run_external_loops(run_joint_sample, external_loops, seed=seed, n_workers=n_workers, start=start), start):
+        for name, (sample_inputs, sample_outputs, _) in results.items():
+            append_result_row(sinks[name]['input'], sample_inputs)
+            append_result_row(sinks[name]['output'], sample_outputs)
+
+        if (k + 1) % save_every == 0 or k + 1 == external_loops:
+            for name in scenarios:
+                flush_result_sink(sinks[name]['input'])
+                flush_result_sink(sinks[name]['output'])
+                save_checkpoint(checkpoint_paths[name], {'next_sample': k + 1, 'seed': seed})
+
+    outputs = {}
+    for name in scenarios:
+        sinks[name]['input']['file'].close()
+        sinks[name]['output']['file'].close()
+
+        # Text copies of the input-output pairs for the surrogate models
+        outputs[name] = read_result_rows(result_paths[name]['output'])
+        np.savetxt(os.path.join(input_output_dir, f'output{name}Joint.txt'), outputs[name])
+        np.savetxt(os.path.join(input_output_dir, f'input{name}Joint.txt'), read_result_rows(result_paths[name]['input']))
+    np.savetxt(os.path.join(input_output_dir, 'designJoint.txt'), joint_design, header=' '.join(joint_inputs))
+
+    # Mean difference in normalized total cost between scenarios, with its standard error
+    for first, second in [('FD', 'BAU'), ('FR', 'BAU'), ('FR', 'FD')]:
+        diff = outputs[first][:, 0] - outputs[second][:, 0]
+        print(f'{first} - {second} total cost: {diff.mean():.3f} +/- {diff.std(ddof=1) / np.sqrt(len(diff)):.3f}')
+
+    print('Time Elapsed: ', time.time() - time_in)
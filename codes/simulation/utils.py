@@ -3,9 +3,19 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 from scipy.stats import skewnorm
-from scipy.optimize import differential_evolution
+from scipy.optimize import differential_evolution, minimize
 import scipy
 from scipy import stats
+from scipy.special import ndtr, ndtri, digamma
+from scipy.stats import qmc
+from scipy.integrate import trapezoid
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping, MutableMapping
+import json
+import hashlib
+import re
+from scipy import sparse
 
 
 
@@ -81,6 +91,24 @@ def calculate_annual_occurrences(hurricanes_df, start_year, end_year):
     return pd.Series(occur, index=years)
 
 
+def adjust_lognormal_params(mu, sigma, mu_change_ratio):
+    """
+    Scale the mean of a log-normal distribution while keeping its standard deviation, and return the new parameters.
+
+    Parameters:
+    - mu, sigma: Parameters of the original log-normal distribution.
+    - mu_change_ratio: Multiplier applied to the mean of the distribution.
+
+    Returns:
+    - mu, sigma: Parameters of the adjusted log-normal distribution.
+    """
+    mean, std = np.exp(mu + sigma**2 / 2), np.sqrt((np.exp(sigma**2) - 1) * np.exp(2*mu + sigma**2))
+    mean *= mu_change_ratio
+    mu = np.log(mean**2 / np.sqrt(std**2 + mean**2))
+    sigma = np.sqrt(np.log(std**2 / mean**2 + 1))
+    return mu, sigma
+
+
 def poisson_process_interval(min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio):
     """
     Simulate occurrences of events based on a Poisson process with log-normally distributed intervals.
@@ -95,17 +123,9 @@ def poisson_process_interval(min_year, max_year, rate, mu, sigma, mu_change_rati
     Returns:
     - DataFrame with columns 'year' and 'windSpeed' for each simulated event.
     """
-    def adjust_mu_sigma(mean, std, mu_change_ratio):
-        """Adjust mu and sigma based on the change ratio."""
-        mean *= mu_change_ratio
-        mu = np.log(mean**2 / np.sqrt(std**2 + mean**2))
-        sigma = np.sqrt(np.log(std**2 / mean**2 + 1))
-        return mu, sigma
-    
     events = []  # List to store event data
     rate *= rate_change_ratio  # Adjust initial rate based on rate change ratio
-    mean, std = np.exp(mu + sigma**2 / 2), np.sqrt((np.exp(sigma**2) - 1) * np.exp(2*mu + sigma**2))
-    mu, sigma = adjust_mu_sigma(mean, std, mu_change_ratio)  # Adjust mu and sigma based on change ratio
+    mu, sigma = adjust_lognormal_params(mu, sigma, mu_change_ratio)  # Adjust mu and sigma based on change ratio
 
     current_year = min_year
     while current_year < max_year:
@@ -122,6 +142,345 @@ def poisson_process_interval(min_year, max_year, rate, mu, sigma, mu_change_rati
     return occurrences
 
 
+def event_mask(counts, max_events=None):
+    """
+    Build a boolean mask marking the valid slots of a padded event batch.
+
+    Parameters:
+    - counts: Array with the number of events in each sample.
+    - max_events: Number of padded event slots; defaults to the largest count.
+
+    Returns:
+    - A (max_events, n_samples) boolean array, True where the slot holds a simulated event.
+    """
+    counts = np.asarray(counts)
+    if max_events is None:
+        max_events = int(counts.max()) if counts.size > 0 else 0
+    return np.arange(max_events)[:, None] < counts[None, :]
+
+
+def slice_events(events, start, stop):
+    """
+    Takes the samples start:stop of a padded event batch, trimmed to the event slots they use.
+
+    Parameters:
+    - events: Batch in the format of poisson_process_batch, optionally with the 'fail_probs' of catalog_events, the
+              'year_counts' and 'year_index' of poisson_timeline_events or the 'weather_deviates' of
+              poisson_quadrature_events.
+    - start, stop: Range of the samples to take.
+
+    Returns:
+    - A dictionary with the same keys, holding views of the given samples.
+    """
+    counts = events['count'][start:stop]
+    n_slots = int(counts.max()) if counts.size > 0 else 0
+    sliced = {}
+    for key, values in events.items():
+        if key == 'fail_probs':
+            sliced[key] = values[:, :n_slots, start:stop]
+        elif np.ndim(values) == 2 and key not in ('year_counts', 'weather_deviates'):
+            sliced[key] = values[:n_slots, start:stop]
+        else:
+            sliced[key] = values[start:stop]
+    return sliced
+
+
+def weather_node_deviates(n_nodes):
+    """
+    Builds a fixed rule over the normal deviates of the weather ratios: an unscrambled Sobol point set shifted by half a
+    cell, so that no point lies on the boundary of the unit cube, mapped to standard normal deviates.
+
+    Parameters:
+    - n_nodes: Number of weather nodes, a power of 2.
+
+    Returns:
+    - An array of shape (n_nodes, 7) with the deviates of each node, for the deviates of weather_condition_batch.
+    """
+    return ndtri(qmc.Sobol(len(WEATHER_DAY_MEANS), scramble=False).random(n_nodes) + 0.5 / n_nodes)
+
+
+def stratified_event_counts(expected_count, n_samples, min_per_stratum=2, tail_tol=1e-4, n_weather_nodes=16, chunk_size=None):
+    """
+    Allocate a batch of samples across the strata of a Poisson event count.
+
+    The zero-event stratum has no damage or outage at all, so it is not sampled: its only cost, the weather driven
+    operational cost, is integrated over n_weather_nodes fixed weather nodes (see weather_node_deviates) with no hazard
+    draws. The remaining samples go to the counts 1, ..., K-1 and the tail N >= K, with K the smallest count whose
+    survival probability is below tail_tol. The event impacts are treated as independent with equal variance, so the
+    standard deviation of the damages given k events grows as sqrt(k), and these samples are allocated in proportion
+    to p_k * sqrt(k) (Neyman allocation).
+
+    With chunk_size, every chunk of chunk_size consecutive samples is allocated on its own, so that any number of
+    whole chunks, as simulated by run_internal_chunks, is a stratified sample of every stratum.
+
+    Parameters:
+    - expected_count: Mean of the Poisson event count.
+    - n_samples: Number of samples to allocate, including the weather nodes of the zero-event stratum.
+    - min_per_stratum: Minimum number of samples in each stratum with events.
+    - tail_tol: Probability mass beyond the last individual count.
+    - n_weather_nodes: Number of weather nodes of the zero-event stratum, a power of 2.
+    - chunk_size: Optional number of samples allocated at a time; defaults to the whole batch.
+
+    Returns:
+    - counts: Array with the number of events of each sample, the weather nodes first (in every chunk).
+    - weights: Array with the weight of each sample, p_k * n_samples / n_k for a sample in stratum k, so that the mean
+      of the weighted samples is the stratified estimator and the weights average to 1.
+    - deviates: Array of shape (n_samples, 7) with the weather deviates of each sample for weather_condition_batch,
+      the nodes for the zero-event stratum and standard normal draws for the others, or None when no events can occur.
+    """
+    if expected_count <= 0:
+        return np.zeros(n_samples, dtype=int), np.ones(n_samples), None
+    if chunk_size is not None and chunk_size < n_samples:
+        chunks = [stratified_event_counts(expected_count, min(chunk_size, n_samples - start), min_per_stratum, tail_tol, n_weather_nodes)
+                  for start in range(0, n_samples, chunk_size)]
+        return tuple(np.concatenate(arrays) for arrays in zip(*chunks))
+    if n_samples <= n_weather_nodes:
+        raise ValueError(f'A stratified batch of {n_samples} samples leaves none for the event counts after the {n_weather_nodes} '
+                         'weather nodes of the zero-event stratum; use more internal iterations, or a multiple of the chunk size in adaptive mode')
+    n_event_samples = n_samples - n_weather_nodes
+    
+    tail_start = max(int(stats.poisson.isf(tail_tol, expected_count)) + 1, 1)
+    strata = np.arange(1, tail_start + 1)
+    probs = stats.poisson.pmf(strata, expected_count)
+    probs[-1] = stats.poisson.sf(tail_start - 1, expected_count)  # The last stratum is the tail N >= tail_start
+    zero_prob = stats.poisson.pmf(0, expected_count)
+
+    # Mean count of the tail stratum, sum(k * p_k) over k >= tail_start
+    mean_counts = strata.astype(float)
+    if probs[-1] > 0:
+        mean_counts[-1] = expected_count * stats.poisson.sf(tail_start - 2, expected_count) / probs[-1]
+
+    # Neyman allocation with a floor per stratum, rounded by largest remainder
+    min_per_stratum = min(min_per_stratum, n_event_samples // len(strata))
+    shares = probs * np.sqrt(mean_counts)
+    shares = shares / shares.sum() * (n_event_samples - min_per_stratum * len(strata))
+    n_per_stratum = min_per_stratum + np.floor(shares).astype(int)
+    remainder = n_event_samples - n_per_stratum.sum()
+    n_per_stratum[np.argsort(np.floor(shares) - shares)[:remainder]] += 1
+
+    # Tail counts drawn from the Poisson distribution conditioned on N >= tail_start
+    counts = np.concatenate([np.zeros(n_weather_nodes, dtype=int), np.repeat(strata, n_per_stratum)])
+    n_tail = n_per_stratum[-1]
+    if n_tail > 0:
+        tail_cdf = stats.poisson.cdf(tail_start - 1, expected_count)
+        counts[-n_tail:] = np.maximum(stats.poisson.ppf(np.random.uniform(tail_cdf, 1, n_tail), expected_count), tail_start)
+
+    strata_weights = np.divide(probs * n_samples, n_per_stratum, out=np.zeros(len(strata)), where=n_per_stratum > 0)
+    weights = np.concatenate([np.full(n_weather_nodes, zero_prob * n_samples / n_weather_nodes), np.repeat(strata_weights, n_per_stratum)])
+
+    deviates = np.random.standard_normal((n_samples, len(WEATHER_DAY_MEANS)))
+    deviates[:n_weather_nodes] = weather_node_deviates(n_weather_nodes)
+
+    return counts, weights, deviates
+
+
+def poisson_process_batch(min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio, n_samples, proposal_shift=0.0,
+                          stratified=False, chunk_size=None):
+    """
+    Simulate hurricane occurrences for a batch of independent samples at once.
+
+    The process is the same as in poisson_process_interval: exponential intervals at the adjusted rate and log-normal
+    wind speeds with the adjusted mean. It is drawn as a Poisson event count per sample followed by sorted uniform
+    event years, which has the same distribution and needs no Python loop.
+
+    Parameters:
+    - min_year: Start year for the simulation.
+    - max_year: End year for the simulation.
+    - rate: Initial rate of occurrence per year.
+    - mu, sigma: Parameters of the log-normal distribution for event magnitudes.
+    - mu_change_ratio, rate_change_ratio: Multipliers to adjust mu and sigma over time.
+    - n_samples: Number of independent samples (inner iterations) to simulate.
+    - proposal_shift: Importance sampling shift of the log wind speeds, in standard deviations. Wind speeds are drawn
+      from the log-normal distribution with mu + proposal_shift * sigma, so positive values oversample severe events.
+    - stratified: Whether to stratify the samples on their event count (see stratified_event_counts) instead of
+      drawing the counts at random; the batch then starts with the weather nodes of the zero-event stratum.
+    - chunk_size: Number of samples stratified at a time, the chunk size of run_internal_chunks in adaptive mode.
+
+    Returns:
+    - Dictionary with 'year' and 'windSpeed' arrays of shape (max_events, n_samples), padded with NaN after the last
+      event of each sample, 'count', the number of events in each sample, and 'weight', the likelihood ratio of each
+      sample's wind speeds under the original and the proposal distributions (1 when proposal_shift is 0), multiplied
+      by the stratum weight when stratified. Stratified batches also hold the 'weather_deviates' of every sample, of
+      shape (n_samples, 7), for weather_condition_batch.
+    """
+    rate *= rate_change_ratio  # Adjust initial rate based on rate change ratio
+    mu, sigma = adjust_lognormal_params(mu, sigma, mu_change_ratio)  # Adjust mu and sigma based on change ratio
+    span = max(max_year - min_year, 0)
+
+    weather_deviates = None
+    if stratified:
+        counts, strata_weights, weather_deviates = stratified_event_counts(rate * span, n_samples, chunk_size=chunk_size)
+    else:
+        counts, strata_weights = np.random.poisson(rate * span, size=n_samples), 1.0
+    mask = event_mask(counts)
+
+    # Padded slots are pushed to the end before sorting so that each sample keeps the order statistics of its own events
+    years = np.random.uniform(0, span, size=mask.shape)
+    years[~mask] = np.inf
+    years.sort(axis=0)
+    years += min_year
+    years[~mask] = np.nan
+
+    wind_speeds = np.random.lognormal(mu + proposal_shift * sigma, sigma, size=mask.shape)  # Generate event magnitudes
+    wind_speeds[~mask] = np.nan
+
+    # Likelihood ratio of the normal log wind speeds, multiplied over the events of each sample
+    log_ratios = -proposal_shift * (np.log(wind_speeds) - mu) / sigma + proposal_shift**2 / 2
+    weights = np.exp(np.sum(np.where(mask, log_ratios, 0), axis=0)) * strata_weights
+
+    events = {'year': years, 'windSpeed': wind_speeds, 'count': counts, 'weight': weights}
+    if weather_deviates is not None:
+        events['weather_deviates'] = weather_deviates
+    return events
+
+
+def poisson_timeline_events(min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio, n_samples):
+    """
+    Simulate hurricane occurrences over a multi-year horizon for a batch of samples, year by year.
+
+    The event counts of all samples are drawn at once as a (n_samples, n_years) matrix of Poisson counts, and the
+    events are laid out in the padded format of poisson_process_batch, in year order, with uniform times within their
+    year. The rate and intensity changes may vary over the years, e.g. as a ramp towards the changes expected by the
+    end of the horizon.
+
+    Parameters:
+    - min_year: First simulated year.
+    - max_year: End year for the simulation (excluded).
+    - rate: Initial rate of occurrence per year.
+    - mu, sigma: Parameters of the log-normal distribution for event magnitudes.
+    - mu_change_ratio, rate_change_ratio: Multipliers to adjust mu and the rate, scalars or arrays over the years.
+    - n_samples: Number of independent samples (inner iterations) to simulate.
+
+    Returns:
+    - Dictionary in the format of poisson_process_batch, with unit weights, plus 'year_counts', the event count matrix
+      of shape (n_samples, n_years), and 'year_index', the index of the year of each event (-1 in padded slots).
+    """
+    years = np.arange(min_year, max_year)
+    n_years = len(years)
+    rates = rate * np.broadcast_to(rate_change_ratio, n_years)
+    mus, sigmas = adjust_lognormal_params(mu, sigma, np.broadcast_to(mu_change_ratio, n_years))
+
+    year_counts = np.random.poisson(rates, size=(n_samples, n_years))
+    counts = year_counts.sum(axis=1)
+    mask = event_mask(counts)
+
+    # Year of every event; assigning through the transposed mask fills the slots sample by sample, as np.repeat lists them
+    year_index = np.full(mask.shape, -1)
+    year_index.T[mask.T] = np.repeat(np.tile(np.arange(n_years), n_samples), year_counts.ravel())
+
+    # Sorting the times within each sample keeps the events in year order, so the year indices still apply
+    event_years = years[year_index] + np.random.uniform(0, 1, size=mask.shape)
+    event_years[~mask] = np.inf
+    event_years.sort(axis=0)
+    event_years[~mask] = np.nan
+
+    wind_speeds = np.exp(mus[year_index] + sigmas[year_index] * np.random.standard_normal(mask.shape))
+    wind_speeds[~mask] = np.nan
+
+    return {'year': event_years, 'windSpeed': wind_speeds, 'count': counts, 'weight': np.ones(n_samples),
+            'year_counts': year_counts, 'year_index': year_index}
+
+
+def poisson_quadrature_events(min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio, n_wind_nodes=32,
+                              n_year_nodes=2, n_cubature_points=256, tail_tol=1e-4, n_weather_nodes=16):
+    """
+    Build a quadrature rule over the hurricane process of poisson_process_batch, as a weighted batch of event histories.
+
+    The event count is summed over 0, 1, ..., K, with K the smallest count whose survival probability is below tail_tol
+    and the remaining tail mass added to K. Histories without events form a single node. With one event, the wind
+    speed is integrated with Gauss-Legendre nodes on its probability scale, which resolves the severe tail better than
+    Gauss-Hermite nodes on the log wind speed, and the event year with Gauss-Legendre nodes. With k >= 2 events the
+    tensor product of such rules grows too fast for the steep fragility curves, so the k wind speeds and the year of
+    the first event are integrated with an unscrambled Sobol point set instead, shifted by half a cell so that no
+    point lies on the boundary of the unit cube, sharing n_cubature_points among the counts in proportion to p_k * k
+    (in powers of 2, at least 8 per count). The year of the first event, the only one that enters the costs, follows
+    its Beta(1, k) distribution. The activities depend nonlinearly on the weather, which is independent of the
+    hurricanes, so every node is crossed with n_weather_nodes weather nodes, an unscrambled Sobol rule over the normal
+    deviates of weather_condition_batch shifted in the same way.
+
+    The rule is fixed, so the nodes are the same on every call. The damage and restoration kernels are evaluated at
+    their expectations over the fragility, repair time and cost scatter on these nodes (expected=True), which makes
+    the quadrature path deterministic. Its error against the Monte Carlo expectation comes from the tail mass beyond
+    K, the Sobol rules of the counts k >= 2 and of the weather, and the repair table bands and the 365 day caps, which
+    are looked up at the expected failure probabilities and total repair periods; compare_internal_methods measures it
+    on given external samples.
+
+    Parameters:
+    - min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio: Parameters of the hurricane process, as
+      passed to poisson_process_batch.
+    - n_wind_nodes: Number of Gauss-Legendre nodes for the wind speed of a single event.
+    - n_year_nodes: Number of Gauss-Legendre nodes for the year of a single event.
+    - n_cubature_points: Number of Sobol points shared by the counts with several events.
+    - tail_tol: Probability mass beyond the largest event count.
+    - n_weather_nodes: Number of weather nodes crossed with every hurricane node, a power of 2.
+
+    Returns:
+    - Dictionary in the format of poisson_process_batch, with one sample per node and the node weights, scaled to
+      average 1, as 'weight', plus the 'weather_deviates' of every node for weather_condition_batch, of shape
+      (n_samples, 7). The later events of a node share the year of its first event.
+    """
+    rate *= rate_change_ratio
+    mu, sigma = adjust_lognormal_params(mu, sigma, mu_change_ratio)
+    span = max(max_year - min_year, 0)
+    expected_count = rate * span
+
+    max_count = int(stats.poisson.isf(tail_tol, expected_count)) + 1 if expected_count > 0 else 0
+    count_probs = stats.poisson.pmf(np.arange(max_count + 1), expected_count)
+    count_probs[-1] += stats.poisson.sf(max_count, expected_count)
+
+    # Each count contributes uniform (wind speed, ..., first year) points on the unit cube with their probabilities
+    counts, points, probs = [0], [np.zeros((1, 1))], [np.array([count_probs[0]])]
+    if max_count >= 1:
+        wind_nodes, wind_weights = np.polynomial.legendre.leggauss(n_wind_nodes)
+        year_nodes, year_weights = np.polynomial.legendre.leggauss(n_year_nodes)
+        counts.append(1)
+        points.append(np.column_stack([np.repeat((wind_nodes + 1) / 2, n_year_nodes), np.tile((year_nodes + 1) / 2, n_wind_nodes)]))
+        probs.append(count_probs[1] * np.outer(wind_weights / 2, year_weights / 2).ravel())
+
+    shares = count_probs[2:] * np.arange(2, max_count + 1)
+    for count, share in enumerate(shares / max(shares.sum(), 1e-300), start=2):
+        n_points = max(2**int(np.round(np.log2(max(share * n_cubature_points, 1)))), 8)
+        counts.append(count)
+        points.append(qmc.Sobol(count + 1, scramble=False).random(n_points) + 0.5 / n_points)
+        probs.append(np.full(n_points, count_probs[count] / n_points))
+
+    counts = np.repeat(counts, [len(p) for p in points])
+    mask = event_mask(counts, max_count)
+    events = {'year': np.full(mask.shape, np.nan), 'windSpeed': np.full(mask.shape, np.nan), 'count': counts}
+    j = 0
+    for count, count_points in zip(np.unique(counts), points):
+        n_points = len(count_points)
+        if count > 0:
+            # First of count uniform event times, from the inverse of its Beta(1, count) distribution
+            first_years = min_year + span * (1 - (1 - count_points[:, -1])**(1 / count))
+            events['year'][:count, j:j + n_points] = first_years
+            events['windSpeed'][:count, j:j + n_points] = np.exp(mu + sigma * stats.norm.ppf(count_points[:, :count])).T
+        j += n_points
+    events['weight'] = np.concatenate(probs) * len(counts)
+
+    # Cross every node with the weather nodes, which keeps the weights at an average of 1
+    weather_deviates = weather_node_deviates(n_weather_nodes)
+    events = {key: np.repeat(values, n_weather_nodes, axis=-1) for key, values in events.items()}
+    events['weather_deviates'] = np.tile(weather_deviates, (len(counts), 1))
+
+    return events
+
+
+def get_sample_events(events, sample_no):
+    """
+    Extract the occurrences of one sample from a batch produced by poisson_process_batch.
+
+    Parameters:
+    - events: Dictionary returned by poisson_process_batch.
+    - sample_no: Index of the sample.
+
+    Returns:
+    - Dictionary with 'year' and 'windSpeed' arrays holding only the events of that sample.
+    """
+    count = events['count'][sample_no]
+    return {'year': events['year'][:count, sample_no], 'windSpeed': events['windSpeed'][:count, sample_no]}
+
+
 def compute_damage(max_wind_speed, components, occ_no, failure_probs):
     """
     Compute the damage to components based on max wind speed.
@@ -194,6 +553,380 @@ def compute_damage(max_wind_speed, components, occ_no, failure_probs):
     return failure_probs, comp_fail_prob, damage_states
 
 
+# Component types in the order used by write_grid_data; a component's type code is its index in this list
+COMPONENT_TYPES = ['Transmission Line', 'Distribution Line', 'Tower', 'Substation', 'Solar Generator', 'Wind Generator']
+
+
+def get_type_codes(component_types):
+    """
+    Convert component type names into integer type codes.
+
+    Parameters:
+    - component_types: Iterable of component type names (e.g. the 'Type' column of the components DataFrame).
+
+    Returns:
+    - A NumPy array of type codes indexing COMPONENT_TYPES.
+    """
+    return np.array([COMPONENT_TYPES.index(component_type) for component_type in component_types], dtype=np.int8)
+
+
+def fragility_means(wind_speeds):
+    """
+    Evaluate the mean failure probability of every component type for an array of wind speeds.
+
+    The fragility curves and their sources are the same as in compute_damage.
+
+    Parameters:
+    - wind_speeds: Array of maximum wind speeds (m/s) of any shape.
+
+    Returns:
+    - An array of shape (len(COMPONENT_TYPES),) + wind_speeds.shape with the mean failure probabilities.
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=float)
+    wind_mph = wind_speeds * 2.237
+    means = np.empty((len(COMPONENT_TYPES),) + wind_speeds.shape)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        log_wind_mph = np.log(wind_mph)
+
+        # Transmission Line
+        means[0] = 2 * 10**-7 * np.exp(wind_mph * 0.0834)
+        # Distribution Line
+        means[1] = 8 * 10**-12 * wind_mph**5.1731
+        # Tower
+        means[2] = ndtr(np.log(wind_speeds / 82.88) / 0.224)
+        # Substation
+        moderate_prob = ndtr((log_wind_mph - 5.068) / 0.136)
+        severe_prob = ndtr((log_wind_mph - 5.204) / 0.147)
+        comp_prob = ndtr((log_wind_mph - 5.523) / 0.132)
+        means[3] = moderate_prob * 0.05 + severe_prob * 0.4 + comp_prob * 0.7
+        # Solar Generator
+        means[4] = ndtr((log_wind_mph - np.log(129.346)) / 0.14)
+        # Wind Generator
+        wind_ratio = (wind_speeds * 1.944 / 139.6)**18.6
+        means[5] = wind_ratio / (1 + wind_ratio)
+
+    return means
+
+
+def draw_event_values(draw, shape, mask=None, fill=0.0):
+    """
+    Draw random values for every component, event and sample of a batch.
+
+    Parameters:
+    - draw: NumPy random function taking a size argument, e.g. np.random.standard_normal.
+    - shape: Shape of the values, ending with (max_events, n_samples).
+    - mask: Optional boolean array of valid events of shape (max_events, n_samples). Values are then drawn for the
+      valid events only, which saves most of the draws when the batch is mostly padding, but changes the random
+      stream.
+    - fill: Value of the padded slots when mask is given.
+
+    Returns:
+    - An array of the given shape.
+    """
+    if mask is None:
+        return draw(size=shape)
+
+    values = np.full(shape, fill)
+    values[..., mask] = draw(size=tuple(shape[:-2]) + (np.count_nonzero(mask),))
+    return values
+
+
+def normal_positive_part(mean, std):
+    """
+    Computes the mean of the positive part, max(Y, 0), of a normal variable Y.
+
+    Parameters:
+    - mean, std: Mean and standard deviation of Y, as arrays that broadcast together; a mean of -inf gives 0.
+
+    Returns:
+    - An array with the means.
+    """
+    mean, std = np.broadcast_arrays(np.asarray(mean, dtype=float), np.asarray(std, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = mean / std
+        positive_part = np.where(std > 0, mean * ndtr(z) + std * np.exp(-0.5 * z**2) / np.sqrt(2 * np.pi), np.maximum(mean, 0))
+    return np.where(np.isneginf(mean), 0, positive_part)
+
+
+def expected_clipped_normal(mean, std, low=-np.inf, high=np.inf):
+    """
+    Computes the exact mean of np.clip(mean + std * Z, low, high) for a standard normal Z.
+
+    Parameters:
+    - mean, std: Mean and standard deviation of the normal variable.
+    - low, high: Clipping bounds, possibly infinite.
+
+    Returns:
+    - An array with the means, broadcast over the parameters.
+    """
+    mean = np.asarray(mean, dtype=float)
+    return mean + normal_positive_part(low - mean, std) - normal_positive_part(mean - high, std)
+
+
+def compute_damage_batch(wind_speeds, type_codes, mask=None, out=None, wind_scale=None, valid_only=False, expected=False):
+    """
+    Compute failure probabilities and damage states for all components, events and samples at once.
+
+    Parameters:
+    - wind_speeds: Array of shape (max_events, n_samples) with the maximum wind speed of each event, as returned by
+      poisson_process_batch.
+    - type_codes: Array with the type code of each component (see get_type_codes).
+    - mask: Boolean array of valid events with the same shape as wind_speeds; defaults to the non-NaN wind speeds.
+    - out: Optional (fail_probs, damage_states) arrays to write the results into (see get_event_buffers).
+    - wind_scale: Optional array with the ratio of the wind speed at each component to the event wind speed. The
+      fragility curves are evaluated once per distinct ratio.
+    - valid_only: Whether to draw the random numbers for the valid events only (see draw_event_values).
+    - expected: Whether to return the expected failure probabilities over their scatter instead of drawing them. No
+      random numbers are drawn then, and the damage states are all 0.
+
+    Returns:
+    - fail_probs: Array of shape (n_components, max_events, n_samples) with the sampled failure probabilities.
+    - damage_states: Integer array of the same shape, 1 where the component is damaged.
+    Padded event slots have zero failure probability and no damage.
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=float)
+    if mask is None:
+        mask = ~np.isnan(wind_speeds)
+
+    shape = (len(type_codes),) + wind_speeds.shape
+    if out is None:
+        fail_probs, damage_states = np.empty(shape), np.empty(shape, dtype=np.int8)
+    else:
+        fail_probs, damage_states = out
+
+    # The events are the columns of the flattened arrays: all of them, or only the valid ones
+    columns = np.flatnonzero(mask) if valid_only else np.arange(mask.size)
+    event_speeds = wind_speeds.reshape(-1)[columns]
+    if wind_scale is None:
+        probs = np.take(fragility_means(event_speeds), type_codes, axis=0)
+    else:
+        scales, scale_index = np.unique(wind_scale, return_inverse=True)
+        probs = np.stack([fragility_means(event_speeds * scale) for scale in scales])[scale_index, type_codes]
+
+    # Standard deviation of 10% of the mean, as in compute_damage
+    if expected:
+        probs = expected_clipped_normal(probs, 0.1 * probs, 0, 1)
+    else:
+        probs *= 1 + 0.1 * np.random.standard_normal(probs.shape)
+        np.clip(probs, 0, 1, out=probs)
+    probs[:, ~mask.reshape(-1)[columns]] = 0
+
+    if valid_only:
+        fail_probs.fill(0)
+        damage_states.fill(0)
+    fail_probs.reshape(len(type_codes), -1)[:, columns] = probs
+    damage_states.reshape(len(type_codes), -1)[:, columns] = 0 if expected else np.random.uniform(size=probs.shape) < probs
+
+    return fail_probs, damage_states
+
+
+CATALOG_ARRAYS = ['year', 'windSpeed', 'z', 'fail_noise', 'fail_probs']
+
+
+def catalog_fail_probs(wind_speeds, noise, mask):
+    """
+    Compute the failure probabilities of every component type from their standard normal deviates, as in
+    compute_damage_batch.
+
+    Parameters:
+    - wind_speeds: Array of shape (max_events, n_samples) with the maximum wind speed of each event.
+    - noise: Array of shape (len(COMPONENT_TYPES), max_events, n_samples) with standard normal deviates.
+    - mask: Boolean array of valid events with the same shape as wind_speeds.
+
+    Returns:
+    - An array of the same shape as noise with the failure probabilities, zero for padded slots.
+    """
+    fail_probs = fragility_means(wind_speeds)
+    fail_probs *= 1 + 0.1 * noise
+    np.clip(fail_probs, 0, 1, out=fail_probs)
+    fail_probs[:, ~mask] = 0
+    return fail_probs
+
+
+def build_event_catalog(path, min_year, max_year, rate, mu, sigma, n_histories, mu_change_ratio=1.0, rate_change_ratio=1.0,
+                        seed=1234, chunk_size=100000):
+    """
+    Simulate a catalog of hurricane histories with the failure probabilities of every component type, and store it
+    as memory-mapped .npy files in a directory.
+
+    The histories follow the process of poisson_process_batch with the catalog's own change ratios; they are drawn
+    from a generator seeded with seed, so the catalog does not depend on the global random state. The standard normal
+    deviates of the log wind speeds ('z') and of the failure probabilities ('fail_noise') are kept for the quantile
+    mapping of catalog_events. The metadata is written last, so an interrupted build is rebuilt by load_event_catalog.
+
+    Parameters:
+    - path: Directory of the catalog.
+    - min_year, max_year, rate, mu, sigma: Parameters of the nominal hurricane process, as passed to
+      poisson_process_batch.
+    - n_histories: Number of simulated histories.
+    - mu_change_ratio, rate_change_ratio: Change ratios of the catalog process, e.g. above 1 to cover the severe
+      tails of the external samples better.
+    - seed: Seed of the catalog.
+    - chunk_size: Number of histories simulated at once.
+
+    Returns:
+    - The catalog, as returned by open_event_catalog.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'catalog.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    rng = np.random.default_rng(seed)
+    catalog_mu, catalog_sigma = adjust_lognormal_params(mu, sigma, mu_change_ratio)
+    span = max(max_year - min_year, 0)
+
+    counts = rng.poisson(rate * rate_change_ratio * span, size=n_histories)
+    max_events = int(counts.max()) if n_histories > 0 else 0
+    np.save(os.path.join(path, 'count.npy'), counts)
+
+    event_shape, component_shape = (max_events, n_histories), (len(COMPONENT_TYPES), max_events, n_histories)
+    arrays = {name: np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=np.float64,
+                                              shape=component_shape if name.startswith('fail') else event_shape)
+              for name in CATALOG_ARRAYS}
+
+    for start in range(0, n_histories, chunk_size):
+        chunk = slice(start, min(start + chunk_size, n_histories))
+        mask = event_mask(counts[chunk], max_events)
+
+        # Sorted uniform event years, as in poisson_process_batch
+        years = rng.uniform(0, span, size=mask.shape)
+        years[~mask] = np.inf
+        years.sort(axis=0)
+        years += min_year
+        years[~mask] = np.nan
+
+        z = np.where(mask, rng.standard_normal(mask.shape), np.nan)
+        wind_speeds = np.exp(catalog_mu + catalog_sigma * z)
+        noise = rng.standard_normal((len(COMPONENT_TYPES),) + mask.shape)
+
+        arrays['year'][:, chunk] = years
+        arrays['windSpeed'][:, chunk] = wind_speeds
+        arrays['z'][:, chunk] = z
+        arrays['fail_noise'][:, :, chunk] = noise
+        arrays['fail_probs'][:, :, chunk] = catalog_fail_probs(wind_speeds, noise, mask)
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+
+    meta = {'min_year': min_year, 'max_year': max_year, 'rate': float(rate), 'mu': float(mu), 'sigma': float(sigma),
+            'n_histories': n_histories, 'mu_change_ratio': float(mu_change_ratio),
+            'rate_change_ratio': float(rate_change_ratio), 'seed': seed}
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    return open_event_catalog(path)
+
+
+def open_event_catalog(path):
+    """
+    Open a catalog written by build_event_catalog, with its arrays memory-mapped read-only.
+
+    Parameters:
+    - path: Directory of the catalog.
+
+    Returns:
+    - A dictionary with the 'meta' data of the catalog and its 'count', 'year', 'windSpeed', 'z', 'fail_noise' and
+      'fail_probs' arrays, with the histories along the last axis.
+    """
+    with open(os.path.join(path, 'catalog.json')) as f:
+        catalog = {'meta': json.load(f)}
+    for name in ['count'] + CATALOG_ARRAYS:
+        catalog[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+    return catalog
+
+
+def load_event_catalog(path, min_year, max_year, rate, mu, sigma, n_histories, mu_change_ratio=1.0,
+                       rate_change_ratio=1.0, seed=1234):
+    """
+    Open the catalog in a directory, building it first if it is missing or was built for other parameters.
+
+    Parameters:
+    - path, min_year, max_year, rate, mu, sigma, n_histories, mu_change_ratio, rate_change_ratio, seed: See
+      build_event_catalog.
+
+    Returns:
+    - The catalog, as returned by open_event_catalog.
+    """
+    meta = {'min_year': min_year, 'max_year': max_year, 'rate': float(rate), 'mu': float(mu), 'sigma': float(sigma),
+            'n_histories': n_histories, 'mu_change_ratio': float(mu_change_ratio),
+            'rate_change_ratio': float(rate_change_ratio), 'seed': seed}
+    meta_path = os.path.join(path, 'catalog.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                return open_event_catalog(path)
+
+    print(f'Building the hurricane event catalog in {path}')
+    return build_event_catalog(path, min_year, max_year, rate, mu, sigma, n_histories, mu_change_ratio,
+                               rate_change_ratio, seed)
+
+
+def catalog_events(catalog, mu_change_ratio, rate_change_ratio, n_samples, sample_no=0, method='likelihood_ratio'):
+    """
+    Take a batch of hurricane histories from a catalog and adapt them to the change ratios of an external sample.
+
+    External sample sample_no takes the n_samples histories from sample_no * n_samples onwards, so its hazard does not
+    depend on the random state and is shared by the runs and scenarios using the catalog, and no two external samples
+    share a history. The event counts are reweighted from the catalog rate to the sample rate by their likelihood
+    ratio. The wind speeds are either kept and reweighted in the same way ('likelihood_ratio'), which reuses the
+    failure probabilities of the catalog, or mapped to the sample distribution through their quantiles ('quantile'),
+    which recomputes the failure probabilities from their stored deviates.
+
+    Parameters:
+    - catalog: Catalog from open_event_catalog.
+    - mu_change_ratio, rate_change_ratio: Change ratios of the external sample, as passed to poisson_process_batch.
+    - n_samples: Number of histories (inner iterations).
+    - sample_no: Index of the external sample.
+    - method: 'likelihood_ratio' or 'quantile'.
+
+    Returns:
+    - Dictionary in the format of poisson_process_batch, with the likelihood ratio of each history as 'weight', and
+      'fail_probs', the failure probabilities of every component type, of shape
+      (len(COMPONENT_TYPES), max_events, n_samples).
+    """
+    if method not in ('likelihood_ratio', 'quantile'):
+        raise ValueError(f"Unknown catalog method '{method}'")
+    if (sample_no + 1) * n_samples > len(catalog['count']):
+        raise ValueError(f'External sample {sample_no} needs histories up to {(sample_no + 1) * n_samples}, but the catalog holds '
+                         f"{len(catalog['count'])}; build it with at least external_loops * internal_loops histories so that "
+                         'the external samples do not reuse each other\'s histories')
+
+    meta = catalog['meta']
+    histories = sample_no * n_samples + np.arange(n_samples)
+    counts = np.asarray(catalog['count'][histories])
+    max_events = int(counts.max()) if n_samples > 0 else 0
+    mask = event_mask(counts, max_events)
+
+    # Likelihood ratio of the Poisson event counts
+    span = max(meta['max_year'] - meta['min_year'], 0)
+    catalog_count = meta['rate'] * meta['rate_change_ratio'] * span
+    sample_count = meta['rate'] * rate_change_ratio * span
+    log_weights = np.zeros(n_samples)
+    if catalog_count > 0:
+        log_weights += counts * np.log(sample_count / catalog_count) - (sample_count - catalog_count)
+
+    catalog_mu, catalog_sigma = adjust_lognormal_params(meta['mu'], meta['sigma'], meta['mu_change_ratio'])
+    mu, sigma = adjust_lognormal_params(meta['mu'], meta['sigma'], mu_change_ratio)
+    if method == 'likelihood_ratio':
+        wind_speeds = catalog['windSpeed'][:max_events, histories]
+        fail_probs = catalog['fail_probs'][:, :max_events, histories]
+
+        # Likelihood ratio of the normal log wind speeds, multiplied over the events of each history
+        with np.errstate(invalid='ignore'):
+            log_wind = np.log(wind_speeds)
+            log_ratios = stats.norm.logpdf(log_wind, mu, sigma) - stats.norm.logpdf(log_wind, catalog_mu, catalog_sigma)
+        log_weights += np.sum(np.where(mask, log_ratios, 0), axis=0)
+    else:
+        wind_speeds = np.exp(mu + sigma * catalog['z'][:max_events, histories])
+        fail_probs = catalog_fail_probs(wind_speeds, catalog['fail_noise'][:, :max_events, histories], mask)
+
+    return {'year': catalog['year'][:max_events, histories], 'windSpeed': wind_speeds, 'count': counts,
+            'weight': np.exp(log_weights), 'fail_probs': fail_probs}
+
+
 
 def compute_restoration_period(components, comp_fail_prob, occ_no, all_repair_periods, actual_repair_periods, max_wind_speed,
                                 wind_farm_no, solar_farm_no, substation_no, twr_no):
@@ -288,6 +1021,185 @@ def compute_restoration_period(components, comp_fail_prob, occ_no, all_repair_pe
     return all_repair_periods, actual_repair_periods
 
 
+# Failure-probability band boundaries of the HAZUS-style repair tables, and the (mean, std) repair days of each band
+REPAIR_PROB_BOUNDARIES = np.array([0.05, 0.11, 0.55, 1])
+SUBSTATION_REPAIR_PERIODS = np.array([(1, 0.5), (3, 1.5), (7, 3.5), (30, 15)])
+GENERATOR_REPAIR_PERIODS = np.array([(5, 0.1), (3.6, 3.6), (22, 21), (65, 30)])
+
+# Wind-speed band boundaries (m/s) and the range of the number of repair teams available in each band
+REPAIR_TEAM_SPEED_BOUNDARIES = np.array([32, 43, 58])
+REPAIR_TEAM_RANGES = np.array([(50, 100), (100, 150), (150, 300), (300, 350)])
+
+
+def expected_pole_count(line_lengths, low=50, high=100):
+    """
+    Computes the expected number of poles, floor(line_length / distance), of lines with a pole distance uniform on
+    [low, high] m.
+
+    The floor is the number of j >= 1 with distance <= line_length / j, so its mean is the sum of their probabilities,
+    which are 1 up to j = line_length / high and sum to differences of harmonic numbers (digamma) beyond.
+
+    Parameters:
+    - line_lengths: Array of line lengths (m).
+    - low, high: Range of the pole distance (m).
+
+    Returns:
+    - An array of the same shape with the expected number of poles.
+    """
+    line_lengths = np.asarray(line_lengths, dtype=float)
+    all_poles, max_poles = np.floor(line_lengths / high), np.floor(line_lengths / low)
+    return all_poles + (line_lengths * (digamma(max_poles + 1) - digamma(all_poles + 1)) - low * (max_poles - all_poles)) / (high - low)
+
+
+def determine_repair_teams_batch(wind_speeds):
+    """
+    Draw the number of repair teams for an array of occurrences based on their wind speeds.
+
+    Parameters:
+    - wind_speeds: Array of maximum wind speeds (m/s) of any shape.
+
+    Returns:
+    - An array of the same shape with the number of repair teams for each occurrence.
+    """
+    band = np.searchsorted(REPAIR_TEAM_SPEED_BOUNDARIES, wind_speeds, side='left')
+    low, high = REPAIR_TEAM_RANGES[band, 0], REPAIR_TEAM_RANGES[band, 1]
+    return low + (high - low) * np.random.uniform(size=np.shape(wind_speeds))
+
+
+def compute_restoration_period_batch(type_codes, line_lengths, fail_probs, wind_speeds, wind_farm_no, solar_farm_no,
+                                     substation_no, twr_no, mask=None, out=None, pole_distances=None, unit_shares=None,
+                                     valid_only=False, expected=False):
+    """
+    Compute the repair periods of all components and the actual restoration period of every occurrence in a batch.
+
+    The repair models are those of compute_restoration_period. The HAZUS-style tables are looked up with
+    np.searchsorted, and the random draws of each component type are made in one call.
+
+    Parameters:
+    - type_codes: Array with the type code of each component (see get_type_codes).
+    - line_lengths: Array with the line length of each component; missing values are treated as 0.
+    - fail_probs: Array of shape (n_components, max_events, n_samples) from compute_damage_batch.
+    - wind_speeds: Array of shape (max_events, n_samples) with the maximum wind speed of each occurrence.
+    - wind_farm_no, solar_farm_no, substation_no, twr_no: Number of wind farms, solar farms, substations and towers.
+    - mask: Boolean array of valid events with the same shape as wind_speeds; defaults to the non-NaN wind speeds.
+    - out: Optional (repair_periods, actual_repair_periods) arrays to write the results into (see get_event_buffers).
+    - pole_distances: Optional array with the pole spacing of each distribution line; missing values are drawn
+      from U(50, 100) m.
+    - unit_shares: Optional array with the share of the towers, substations or farms of its type that each component
+      stands for (see build_network_arrays); defaults to all of them.
+    - valid_only: Whether to draw the random numbers for the valid events only (see draw_event_values).
+    - expected: Whether to return the expected repair periods over the repair time scatter, pole distances and number
+      of repair teams instead of drawing them. The restoration period is then the exact mean of the capped total
+      repair period over the number of teams.
+
+    Returns:
+    - repair_periods: Array of the same shape as fail_probs with the repair period of each component.
+    - actual_repair_periods: Array of shape (max_events, n_samples) with the restoration period of each occurrence,
+      capped at one year (365 days) and zero for padded slots.
+    """
+    wind_speeds = np.asarray(wind_speeds, dtype=float)
+    if mask is None:
+        mask = ~np.isnan(wind_speeds)
+    type_codes = np.asarray(type_codes)
+    line_lengths = np.nan_to_num(np.asarray(line_lengths, dtype=float))
+
+    if out is None:
+        repair_periods, actual_repair_periods = np.empty(fail_probs.shape), np.empty(wind_speeds.shape)
+    else:
+        repair_periods, actual_repair_periods = out
+    repair_periods.fill(0)
+
+    # The events are the columns of the flattened arrays: all of them, or only the valid ones
+    columns = np.flatnonzero(mask) if valid_only else np.arange(mask.size)
+    flat_fail_probs = fail_probs.reshape(len(fail_probs), -1)
+    flat_repair_periods = repair_periods.reshape(len(repair_periods), -1)
+
+    def scatter(mean, std, low, high=np.inf):
+        # Clipped normal repair time factor, drawn or at its mean
+        return expected_clipped_normal(mean, std, low, high) if expected else np.clip(mean + std * noise, low, high)
+
+    for code, component_type in enumerate(COMPONENT_TYPES):
+        rows = np.flatnonzero(type_codes == code)
+        if len(rows) == 0:
+            continue
+
+        fail_prob = flat_fail_probs[np.ix_(rows, columns)]
+        noise = None if expected else np.random.standard_normal(fail_prob.shape)
+        line_length = line_lengths[rows, None]
+
+        if component_type == 'Distribution Line':
+            if expected:
+                no_poles = expected_pole_count(line_length)
+            else:
+                no_poles = np.floor(line_length / np.random.uniform(50, 100, size=fail_prob.shape))
+            if pole_distances is not None:
+                no_poles = np.where(np.isnan(pole_distances[rows, None]), no_poles, np.floor(line_length / pole_distances[rows, None]))
+            total_repair_period = (line_length / 1000) + no_poles * 0.125
+            period = total_repair_period * scatter(1, 0.2, 0) * fail_prob
+
+        elif component_type == 'Tower':
+            period = scatter(2, 1, 1, 4) * twr_no * fail_prob
+
+        elif component_type == 'Transmission Line':
+            total_repair_period = (line_length / 1000) * 2
+            period = total_repair_period * scatter(1, 0.2, 0) * fail_prob
+
+        else:
+            if component_type == 'Substation':
+                table, unit_no = SUBSTATION_REPAIR_PERIODS, substation_no
+            else:
+                table, unit_no = GENERATOR_REPAIR_PERIODS, (wind_farm_no if component_type == 'Wind Generator' else solar_farm_no)
+            band = np.minimum(np.searchsorted(REPAIR_PROB_BOUNDARIES, fail_prob, side='left'), len(table) - 1)
+            mean, std = table[band, 0], table[band, 1]
+            period = scatter(mean, std, mean / 3) * unit_no
+
+        if unit_shares is not None and component_type not in ('Distribution Line', 'Transmission Line'):
+            period = period * unit_shares[rows, None]
+
+        # Only components with a non-zero failure probability need repair
+        flat_repair_periods[np.ix_(rows, columns)] = np.where(fail_prob > 0, period, 0)
+
+    # Total repair period of each occurrence shared among the repair teams, constrained to a maximum of one year
+    if expected:
+        # Mean over the uniform number of teams, split at the number of teams below which the cap applies
+        band = np.searchsorted(REPAIR_TEAM_SPEED_BOUNDARIES, wind_speeds, side='left')
+        low, high = REPAIR_TEAM_RANGES[band, 0], REPAIR_TEAM_RANGES[band, 1]
+        np.sum(repair_periods, axis=0, out=actual_repair_periods)
+        capped_teams = np.clip(actual_repair_periods / 365, low, high)
+        actual_repair_periods[...] = (365 * (capped_teams - low) + actual_repair_periods * np.log(high / capped_teams)) / (high - low)
+    else:
+        no_teams = determine_repair_teams_batch(wind_speeds)
+        np.sum(repair_periods, axis=0, out=actual_repair_periods)
+        actual_repair_periods /= no_teams
+        np.minimum(actual_repair_periods, 365, out=actual_repair_periods)
+    actual_repair_periods[~mask] = 0
+
+    return repair_periods, actual_repair_periods
+
+
+def feeder_outage_share(fail_probs, feeders, out=None):
+    """
+    Compute the share of the feeders that an occurrence takes down, from the failure probabilities of their components.
+
+    A feeder is down if any of its components fails; the components are taken as independent, so the probability
+    that a feeder stays up is the product of their survival probabilities, summed in log space through the sparse
+    component-to-feeder matrix.
+
+    Parameters:
+    - fail_probs: Array of shape (n_components, max_events, n_samples) from compute_damage_batch.
+    - feeders: Sparse matrix of shape (n_feeders, n_components), 1 where a component belongs to a feeder (see
+      build_network_arrays).
+    - out: Optional array of shape (max_events, n_samples) to write the result into.
+
+    Returns:
+    - An array of shape (max_events, n_samples) with the mean outage probability of the feeders.
+    """
+    with np.errstate(divide='ignore'):
+        log_survival = feeders @ np.log1p(-fail_probs.reshape(len(fail_probs), -1))
+    survival = np.mean(np.exp(log_survival), axis=0).reshape(fail_probs.shape[1:])
+    return np.subtract(1, survival, out=out)
+
+
 
 def compute_dmg_costs(components, failure_probs, occurrences, min_year, inflation_rate=1):
     """
@@ -296,7 +1208,7 @@ def compute_dmg_costs(components, failure_probs, occurrences, min_year, inflatio
     Parameters:
     - components: A DataFrame containing component information, including replacement costs.
     - failure_probs: A DataFrame containing the failure probabilities of components for each occurrence.
-    - occurrences: A DataFrame containing information about each occurrence, including the year.
+    - occurrences: A DataFrame or dictionary of arrays containing information about each occurrence, including the year.
     - min_year: The minimum year from the occurrences to calculate inflation adjustments from.
     - inflation_rate: The annual inflation rate, defaulted to 1 (no inflation).
 
@@ -304,12 +1216,14 @@ def compute_dmg_costs(components, failure_probs, occurrences, min_year, inflatio
     - A 2D NumPy array containing the adjusted replacement costs for each component and occurrence.
     """
 
-    if len(occurrences) > 0:
-        rand_replacement_cost = np.zeros((len(components), len(occurrences)))
+    occ_years = np.asarray(occurrences['year']) if len(occurrences) > 0 else np.zeros(0)
+
+    if len(occ_years) > 0:
+        rand_replacement_cost = np.zeros((len(components), len(occ_years)))
 
         # Generate random replacement costs based on a normal distribution around the listed replacement cost.
         for i in range(len(components)):
-            for j in range(len(occurrences)):
+            for j in range(len(occ_years)):
                 rand_replacement_cost[i, j] = np.random.normal(
                     loc=components['Replacement Cost'][i], scale=0.1 * components['Replacement Cost'][i])
 
@@ -318,8 +1232,7 @@ def compute_dmg_costs(components, failure_probs, occurrences, min_year, inflatio
 
         # Adjust for inflation if the inflation rate is not 1 (no inflation).
         if inflation_rate != 1:
-            for j, occurrence in occurrences.iterrows():
-                year = occurrence['year']
+            for j, year in enumerate(occ_years):
                 # Calculate the inflation coefficient based on the year of occurrence and the minimum year.
                 coefficient = inflation_rate ** (year - min_year)
                 # Apply the inflation adjustment to the replacement costs for the occurrence.
@@ -331,13 +1244,998 @@ def compute_dmg_costs(components, failure_probs, occurrences, min_year, inflatio
     return replacement_costs
 
 
+def compute_dmg_costs_batch(replacement_costs, fail_probs, years, min_year, inflation_rate=1, mask=None, out=None, noise=None):
+    """
+    Computes the damage costs of all components, occurrences and samples of a batch in a single call.
+
+    Parameters:
+    - replacement_costs: Array with the listed replacement cost of each component.
+    - fail_probs: Array of shape (n_components, max_events, n_samples) from compute_damage_batch.
+    - years: Array of shape (max_events, n_samples) with the year of each occurrence.
+    - min_year: The minimum year from the occurrences to calculate inflation adjustments from.
+    - inflation_rate: The annual inflation rate, defaulted to 1 (no inflation).
+    - mask: Boolean array of valid events with the same shape as years; defaults to the non-NaN years.
+    - out: Optional array to write the results into (see get_event_buffers).
+    - noise: Standard normal draws of the replacement cost noise, of the same shape as fail_probs; drawn if None.
+
+    Returns:
+    - An array of the same shape as fail_probs with the adjusted replacement costs, zero for padded slots.
+    """
+    years = np.asarray(years, dtype=float)
+    if mask is None:
+        mask = ~np.isnan(years)
+    replacement_costs = np.asarray(replacement_costs, dtype=float)[:, None, None]
+    if noise is None:
+        noise = np.random.standard_normal(fail_probs.shape)
+
+    # Random replacement costs normally distributed around the listed replacement cost, weighted by failure probability
+    costs = np.multiply(replacement_costs, 1 + 0.1 * noise, out=out)
+    costs *= fail_probs
+
+    # Adjust for inflation based on the year of each occurrence
+    if inflation_rate != 1:
+        costs *= inflation_rate ** np.where(mask, years - min_year, 0)
+
+    costs[:, ~mask] = 0
+
+    return costs
+
+
+def build_damage_ledger(events, fail_probs, cost_noise, unop_days, total_repair_periods, acts, added_cost_ratio, caps,
+                        demand, population, per_capita, min_year, max_year):
+    """
+    Collects the physical outcomes of the internal iterations of an external sample, which do not depend on its
+    economic inputs, so that recost_ledger can cost them for any set of economic inputs.
+
+    Parameters:
+    - events: Occurrences of the internal iterations from poisson_process_batch or poisson_quadrature_events.
+    - fail_probs: Failure probabilities of shape (n_components, max_events, n_iterations) from compute_damage_batch.
+    - cost_noise: Standard normal draws of the replacement cost noise, of the same shape as fail_probs.
+    - unop_days: Days without transmission or distribution of every internal iteration.
+    - total_repair_periods: Total restoration period of every internal iteration.
+    - acts: Activities of the 2050 system adjusted for the weather of every internal iteration (arrays or scalars).
+    - added_cost_ratio: Cost ratio of the dispatchable generation exceeding its maximum activity, per iteration.
+    - caps: Capacities of the 2050 system.
+    - demand: Demand in 2050 (PJ).
+    - population, per_capita: Population and per capita consumption in 2050.
+    - min_year: First simulated year.
+    - max_year: End year of the simulation.
+
+    Returns:
+    - A dictionary of arrays over the internal iterations, with copies of the event and failure arrays.
+    """
+    return {
+        'count': events['count'],
+        'weight': events['weight'],
+        'year': events['year'],
+        'wind_speed': events['windSpeed'],
+        'fail_probs': np.array(fail_probs),
+        'cost_noise': cost_noise,
+        'unop_days': unop_days,
+        'total_repair_periods': total_repair_periods,
+        'acts': dict(acts),
+        'added_cost_ratio': added_cost_ratio,
+        'caps': dict(caps),
+        'demand': demand,
+        'population': population,
+        'per_capita': per_capita,
+        'min_year': min_year,
+        'max_year': max_year,
+    }
+
+
+def recost_ledger(ledger, economics, op_cost_kernel, out=None):
+    """
+    Costs the internal iterations of a damage ledger for a set of economic inputs, as vector arithmetic over the
+    iterations. Sweeping the economic inputs of an external sample only needs this call, not a rerun of the
+    hazard, damage and restoration simulation.
+
+    Parameters:
+    - ledger: Physical outcomes of the internal iterations from build_damage_ledger or load_ledger.
+    - economics: Dictionary with the 'corruption_factor', the 2050 'elc_price_change', the 'replacement_costs' of
+      the components and the 'op_cost_args', the fixed and variable costs of the scenario (see compute_op_costs).
+    - op_cost_kernel: Operational cost kernel of the scenario from build_op_cost_kernel.
+    - out: Optional array for the damage costs of every occurrence (see get_event_buffers).
+
+    Returns:
+    - A dictionary of arrays over the internal iterations: 'total_cost', 'dmg_cost', 'op_cost', 'outage_cost' and
+      'op_cost_undamaged', the lost load and its value for each sector ('lost_load_res', 'lost_load_com',
+      'lost_load_ind', 'voll_res', 'voll_com', 'voll_ind'), the 'repair_costs' of each component before the
+      corruption factor, of shape (n_components, n_iterations), and the 'tech_op_costs' of the op-ratio columns of
+      the scenario and their 'op_ratios' to the undamaged operational cost, of shape (n_outputs, n_iterations).
+    """
+    corruption_factor = economics['corruption_factor']
+    occurred = ledger['count'] > 0
+
+    op_cost_undamaged, tech_op_costs, op_ratios = compute_op_costs(op_cost_kernel, ledger['caps'], ledger['acts'],
+                                                                   economics['op_cost_args'], ledger['added_cost_ratio'])
+
+    # Share of the year without power, which can last no longer than the rest of the simulation after the first
+    # occurrence; iterations without hurricanes (all of them when the batch has no event slots) are fully operational
+    first_year = ledger['year'][0] if ledger['year'].shape[0] else np.full(len(ledger['count']), np.nan)
+    with np.errstate(invalid='ignore'):
+        unop_ratio = np.where(occurred, np.minimum(ledger['unop_days'] * corruption_factor, (ledger['max_year'] - first_year) * 365) / 365, 0)
+    op_ratio = 1 - unop_ratio
+
+    # /2 is because we assumed a linear recovery of system, and the lost load is the area under the triangular recovery function, which is half the rectangular one
+    lost_load = unop_ratio * ledger['population'] * ledger['per_capita'] / 2
+    lost_load_res = 0.735 * lost_load  # Adjusting for solar rooftop
+    lost_load_com = 0.45 * lost_load
+    lost_load_ind = 0.11 * lost_load
+
+    price_res = economics['elc_price_change'] * 15.64  # cents from https://www.eia.gov/state/print.php?sid=RQ
+    price_ind = economics['elc_price_change'] * 12.5
+    price_com = economics['elc_price_change'] * 8.5
+
+    # Value of Lost Load (VoLL) of each sector, from PREDICTION OF DOMESTIC, INDUSTRIAL AND COMMERCIAL, INTERRUPTION
+    # COSTS BY RELATIONAL APPROACH (1997)
+    voll_res = np.where(occurred, (-1.0058 + 0.58 * price_res) * lost_load_res, 0)
+    voll_com = np.where(occurred, (-4.585 + 0.991 * price_com) * lost_load_com, 0)
+    voll_ind = np.where(occurred, (-1.859 + 0.49 * price_ind) * lost_load_ind, 0)
+    outage_cost = np.where(occurred, (voll_res + voll_com + voll_ind) / 1.81, 0)
+
+    # Operational cost taking into account the undamaged operational cost and the share of the year without power
+    op_cost = op_cost_undamaged * (op_ratio + unop_ratio / 2)
+
+    # Undiscounted damage costs of the components, summed over the occurrences of every iteration
+    dmg_costs = compute_dmg_costs_batch(economics['replacement_costs'], ledger['fail_probs'], ledger['year'],
+                                        ledger['min_year'], out=out, noise=ledger['cost_noise'])
+    repair_costs = np.sum(dmg_costs, axis=1)
+    total_repair_cost = np.sum(repair_costs, axis=0)
+    repair_costs = np.where(total_repair_cost != 0, repair_costs, 0)
+    dmg_cost = total_repair_cost * corruption_factor
+
+    return {
+        'total_cost': dmg_cost + op_cost + outage_cost,
+        'dmg_cost': dmg_cost,
+        'op_cost': op_cost,
+        'outage_cost': outage_cost,
+        'op_cost_undamaged': op_cost_undamaged,
+        'lost_load_res': lost_load_res,
+        'lost_load_com': lost_load_com,
+        'lost_load_ind': lost_load_ind,
+        'voll_res': voll_res,
+        'voll_com': voll_com,
+        'voll_ind': voll_ind,
+        'repair_costs': repair_costs,
+        'tech_op_costs': tech_op_costs,
+        'op_ratios': op_ratios,
+    }
+
+
+def save_ledger(path, ledger, economics=None):
+    """
+    Saves a damage ledger, and optionally the economic inputs it was costed with, to a compressed .npz file.
+
+    Parameters:
+    - path: Path of the .npz file.
+    - ledger: Ledger from build_damage_ledger.
+    - economics: Economic inputs in the format of recost_ledger.
+    """
+    arrays = {}
+    for group, values in (('ledger', ledger), ('economics', economics or {})):
+        for key, value in values.items():
+            if isinstance(value, dict):
+                arrays.update({f'{group}/{key}/{name}': item for name, item in value.items()})
+            else:
+                arrays[f'{group}/{key}'] = value
+    np.savez_compressed(path, **arrays)
+
+
+def load_ledger(path):
+    """
+    Loads a damage ledger saved by save_ledger.
+
+    Parameters:
+    - path: Path of the .npz file.
+
+    Returns:
+    - The ledger and the economic inputs (empty if none were saved).
+    """
+    groups = {'ledger': {}, 'economics': {}}
+    with np.load(path) as data:
+        for name in data.files:
+            group, *keys = name.split('/')
+            target = groups[group]
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            value = data[name]
+            target[keys[-1]] = value.item() if value.ndim == 0 else value
+
+    economics = groups['economics']
+    if 'op_cost_args' in economics:
+        economics['op_cost_args'] = tuple(economics['op_cost_args'])
+    return groups['ledger'], economics
+
+
+def timeline_values(projection, years):
+    """
+    Interpolates a projection linearly at every year of a timeline.
+
+    Parameters:
+    - projection: Dict-like projection keyed by year strings (e.g. a ProjectionView), or a constant.
+    - years: Years of the timeline.
+
+    Returns:
+    - An array over the years, held constant before the first and after the last projected year.
+    """
+    if not isinstance(projection, Mapping):
+        return np.full(len(years), projection, dtype=float)
+    return np.interp(years, [int(year) for year in projection], [projection[year] for year in projection])
+
+
+def period_arrays(values, periods=None):
+    """
+    Aligns values read for every model period (see read_output_bau with year=None) on a common period axis.
+
+    Parameters:
+    - values: Dictionary of pandas Series (or dictionaries) indexed by model period, or of scalars for technologies
+      not in the output.
+    - periods: Model periods; defaults to all the periods of the values.
+
+    Returns:
+    - The periods and a dictionary of arrays over them, with scalars repeated over the periods.
+    """
+    values = {key: pd.Series(value) if isinstance(value, Mapping) else value for key, value in values.items()}
+    if periods is None:
+        periods = np.array(sorted({period for value in values.values() if isinstance(value, pd.Series) for period in value.index}))
+    arrays = {key: value.reindex(periods, fill_value=0).to_numpy(dtype=float) if isinstance(value, pd.Series)
+              else np.full(len(periods), value, dtype=float) for key, value in values.items()}
+    return periods, arrays
+
+
+def period_index(years, periods):
+    """
+    Maps the years of a timeline onto the model periods covering them: the last period starting at or before each
+    year, or the first period for the years before it.
+
+    Parameters:
+    - years: Years of the timeline.
+    - periods: Start years of the model periods, in increasing order.
+
+    Returns:
+    - An integer array with the index of the period of every year.
+    """
+    return np.clip(np.searchsorted(periods, years, side='right') - 1, 0, len(periods) - 1)
+
+
+def timeline_coefficients(years, base_year, inflation_rate=1.0, discount_rate=1.0):
+    """
+    Computes the coefficients that bring the costs of every year of a timeline to their present value in base_year,
+    with costs escalating by inflation_rate and discounted by discount_rate per year (as in discount_dmg_costs).
+
+    Parameters:
+    - years: Years of the timeline.
+    - base_year: The base year for inflation and discounting.
+    - inflation_rate: The annual inflation factor, defaulted to 1.0 (no inflation).
+    - discount_rate: The annual discount factor, defaulted to 1.0 (no discount).
+
+    Returns:
+    - An array of coefficients over the years.
+    """
+    elapsed = np.asarray(years, dtype=float) - base_year
+    return inflation_rate ** elapsed / discount_rate ** elapsed
+
+
+def timeline_by_year(values, year_index, n_years):
+    """
+    Sums values of the occurrences of every sample into the years they occurred in.
+
+    Parameters:
+    - values: Array of shape (max_events, n_samples) with a value per occurrence.
+    - year_index: Year index of every occurrence from poisson_timeline_events (-1 in padded slots).
+    - n_years: Number of years of the timeline.
+
+    Returns:
+    - An array of shape (n_samples, n_years).
+    """
+    valid = year_index >= 0
+    n_samples = year_index.shape[1]
+    cells = (np.arange(n_samples) * n_years + year_index)[valid]
+    return np.bincount(cells, weights=values[valid], minlength=n_samples * n_years).reshape(n_samples, n_years)
+
+
+def build_timeline_ledger(events, fail_probs, cost_noise, outage_days, caps, acts, periods, years, demand, population, per_capita):
+    """
+    Collects the physical outcomes of the internal iterations of an external sample over a multi-year horizon, in the
+    format of build_damage_ledger, so that recost_timeline can cost them year by year.
+
+    Parameters:
+    - events: Occurrences of the internal iterations from poisson_timeline_events.
+    - fail_probs: Failure probabilities of shape (n_components, max_events, n_iterations) from compute_damage_batch.
+    - cost_noise: Standard normal draws of the replacement cost noise, of the same shape as fail_probs.
+    - outage_days: Days without transmission or distribution caused by every occurrence, of shape (max_events, n_iterations).
+    - caps, acts: Capacities and activities of every model period, as arrays over the periods (see period_arrays).
+    - periods: Start years of the model periods.
+    - years: Years of the horizon, as simulated by poisson_timeline_events.
+    - demand: Demand (PJ) of every year of the horizon.
+    - population, per_capita: Population and per capita consumption of every year of the horizon.
+
+    Returns:
+    - A dictionary of arrays, with the 'year_counts' and 'year_index' of the events and the 'period_index' of every year.
+    """
+    return {
+        'count': events['count'],
+        'weight': events['weight'],
+        'year': events['year'],
+        'year_counts': events['year_counts'],
+        'year_index': events['year_index'],
+        'wind_speed': events['windSpeed'],
+        'fail_probs': np.array(fail_probs),
+        'cost_noise': cost_noise,
+        'outage_days': outage_days,
+        'caps': dict(caps),
+        'acts': dict(acts),
+        'periods': np.asarray(periods),
+        'years': np.asarray(years),
+        'period_index': period_index(years, periods),
+        'demand': demand,
+        'population': population,
+        'per_capita': per_capita,
+    }
+
+
+def recost_timeline(ledger, economics, op_cost_kernel, out=None):
+    """
+    Costs the internal iterations of a timeline ledger year by year for a set of economic inputs. Each year is costed
+    with the capacities and activities of the model period covering it, its share of time without power and the
+    occurrences it holds, and brought to present value by the year coefficients, so the whole horizon is costed as
+    vector arithmetic over the (n_iterations, n_years) matrices.
+
+    The activities are those of the model, without the weather adjustment of recost_ledger, so no added cost of the
+    dispatch beyond the maximum activity applies.
+
+    Parameters:
+    - ledger: Physical outcomes of the internal iterations from build_timeline_ledger.
+    - economics: Dictionary in the format of recost_ledger, with the 'elc_price_change' and the 'op_cost_args' (arrays
+      over the years, see compute_op_costs) of every year, the 'replacement_costs' of the components in every model
+      period, of shape (n_components, n_periods), and the 'coefficients' of every year from timeline_coefficients.
+    - op_cost_kernel: Operational cost kernel of the scenario from build_op_cost_kernel.
+    - out: Optional array for the damage costs of every occurrence (see get_event_buffers).
+
+    Returns:
+    - A dictionary in the format of recost_ledger with the present values of the costs over the horizon, the total lost
+      loads of the horizon and the present value of its 'demand', plus the 'yearly' (n_iterations, n_years) matrices
+      of the present values of the 'dmg_cost', 'op_cost' and 'outage_cost' and of the 'unop_ratio'.
+    """
+    corruption_factor = economics['corruption_factor']
+    coefficients = economics['coefficients']
+    year_index, year_periods = ledger['year_index'], ledger['period_index']
+    n_years = len(year_periods)
+    n_iterations = len(ledger['count'])
+    valid = year_index >= 0
+    event_years = np.maximum(year_index, 0)
+
+    # Undamaged operational costs of every year, with the capacities and activities of the model period covering it and
+    # the unit costs of the year
+    year_caps = {tech: values[year_periods] for tech, values in ledger['caps'].items()}
+    year_acts = {tech: values[year_periods] for tech, values in ledger['acts'].items()}
+    op_cost_undamaged, tech_op_costs, _ = compute_op_costs(op_cost_kernel, year_caps, year_acts, economics['op_cost_args'])
+    op_cost_total, tech_op_totals = np.sum(op_cost_undamaged * coefficients), tech_op_costs @ coefficients
+
+    # Share of every year without power, which can last no longer than the year and than the rest of the horizon after
+    # the first occurrence of the year, as in recost_ledger
+    outage_days = timeline_by_year(ledger['outage_days'], year_index, n_years)
+    end_year = ledger['years'][-1] + 1
+    first_years = np.full((n_iterations, n_years), end_year, dtype=float)
+    np.minimum.at(first_years, (np.nonzero(valid)[1], year_index[valid]), ledger['year'][valid])
+    unop_ratio = np.minimum(np.minimum(outage_days * corruption_factor, 365), (end_year - first_years) * 365) / 365
+
+    # /2 is because we assumed a linear recovery of system, and the lost load is the area under the triangular recovery function, which is half the rectangular one
+    lost_load = unop_ratio * ledger['population'] * ledger['per_capita'] / 2
+    lost_load_res = 0.735 * lost_load  # Adjusting for solar rooftop
+    lost_load_com = 0.45 * lost_load
+    lost_load_ind = 0.11 * lost_load
+
+    price_res = economics['elc_price_change'] * 15.64  # cents from https://www.eia.gov/state/print.php?sid=RQ
+    price_ind = economics['elc_price_change'] * 12.5
+    price_com = economics['elc_price_change'] * 8.5
+
+    # Value of Lost Load (VoLL) of each sector, as in recost_ledger, at present value
+    voll_res = (-1.0058 + 0.58 * price_res) * lost_load_res * coefficients
+    voll_com = (-4.585 + 0.991 * price_com) * lost_load_com * coefficients
+    voll_ind = (-1.859 + 0.49 * price_ind) * lost_load_ind * coefficients
+    outage_cost = (voll_res + voll_com + voll_ind) / 1.81
+
+    op_cost = op_cost_undamaged * (1 - unop_ratio / 2) * coefficients
+
+    # Damage costs of the components with the replacement costs of the period of every occurrence, at present value
+    dmg_costs = np.take(economics['replacement_costs'], year_periods[event_years], axis=1, out=out)
+    dmg_costs *= 1 + 0.1 * ledger['cost_noise']
+    dmg_costs *= ledger['fail_probs']
+    dmg_costs *= coefficients[event_years]
+    dmg_costs[:, ~valid] = 0
+    repair_costs = np.sum(dmg_costs, axis=1)
+    dmg_cost_yearly = timeline_by_year(np.sum(dmg_costs, axis=0), year_index, n_years) * corruption_factor
+    dmg_cost = np.sum(repair_costs, axis=0) * corruption_factor
+
+    return {
+        'total_cost': dmg_cost + np.sum(op_cost + outage_cost, axis=1),
+        'dmg_cost': dmg_cost,
+        'op_cost': np.sum(op_cost, axis=1),
+        'outage_cost': np.sum(outage_cost, axis=1),
+        'op_cost_undamaged': np.full(n_iterations, op_cost_total),
+        'lost_load_res': np.sum(lost_load_res, axis=1),
+        'lost_load_com': np.sum(lost_load_com, axis=1),
+        'lost_load_ind': np.sum(lost_load_ind, axis=1),
+        'voll_res': np.sum(voll_res, axis=1),
+        'voll_com': np.sum(voll_com, axis=1),
+        'voll_ind': np.sum(voll_ind, axis=1),
+        'repair_costs': repair_costs,
+        'tech_op_costs': tech_op_totals,
+        'op_ratios': np.repeat(tech_op_totals[:, None] * 10**6 / op_cost_total, n_iterations, axis=1),
+        'demand': np.sum(ledger['demand'] * coefficients),
+        'yearly': {'dmg_cost': dmg_cost_yearly, 'op_cost': op_cost, 'outage_cost': outage_cost, 'unop_ratio': unop_ratio},
+    }
+
+
+def damage_control(wind_speeds, type_codes, replacement_costs):
+    """
+    Compute the expected damage cost of each sample given the wind speeds of its events, for use as a control variate.
+
+    This is the damage cost of compute_dmg_costs_batch without its random parts: every component fails with the mean
+    failure probability of its fragility curve (capped at 1) and is replaced at its listed cost.
+
+    Parameters:
+    - wind_speeds: Array of shape (max_events, n_samples) with the maximum wind speed of each event, NaN for padded slots.
+    - type_codes: Array with the type code of each component (see get_type_codes).
+    - replacement_costs: Array with the listed replacement cost of each component.
+
+    Returns:
+    - An array of shape (n_samples,) with the expected damage cost of each sample.
+    """
+    fail_probs = np.minimum(np.nan_to_num(fragility_means(wind_speeds)), 1)[np.asarray(type_codes)]
+    return np.tensordot(np.asarray(replacement_costs, dtype=float), fail_probs, axes=1).sum(axis=0)
+
+
+def expected_damage_control(min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio, type_codes,
+                            replacement_costs, n_nodes=2001):
+    """
+    Compute the exact mean of damage_control over the hurricane process of poisson_process_batch.
+
+    The expected number of events is the adjusted rate times the simulated span, and the expected damage of a single
+    event is integrated over the log-normal wind speed with the trapezoidal rule on a fine grid spanning 8 standard
+    deviations of the log wind speed on either side; a fine grid handles the kinks where the failure probabilities are
+    capped at 1.
+
+    Parameters:
+    - min_year, max_year, rate, mu, sigma, mu_change_ratio, rate_change_ratio: Parameters of the hurricane process, as
+      passed to poisson_process_batch.
+    - type_codes: Array with the type code of each component (see get_type_codes).
+    - replacement_costs: Array with the listed replacement cost of each component.
+    - n_nodes: Number of grid points.
+
+    Returns:
+    - The expected damage cost per sample.
+    """
+    rate *= rate_change_ratio
+    mu, sigma = adjust_lognormal_params(mu, sigma, mu_change_ratio)
+    span = max(max_year - min_year, 0)
+
+    z = np.linspace(-8, 8, n_nodes)
+    event_damage = damage_control(np.exp(mu + sigma * z)[None, :], type_codes, replacement_costs)
+
+    return rate * span * trapezoid(event_damage * stats.norm.pdf(z), z)
+
+
+def internal_means(values, weights=None):
+    """
+    Estimates the means of the outputs of the internal iterations of an external sample, with their standard errors.
+
+    The weighted means are the plain means of weights * values, which are unbiased for importance sampling likelihood
+    ratios and stratum weights, unlike the self-normalized average sum(weights * values) / sum(weights). Outputs that
+    are the same in every iteration, such as the demand, are returned as they are.
+
+    Parameters:
+    - values: Array of shape (n_samples, n_outputs).
+    - weights: Optional weights of the samples, averaging to 1 in expectation.
+
+    Returns:
+    - means: Array of shape (n_outputs,) with the estimated means.
+    - std_errors: Array of shape (n_outputs,) with their standard errors, the standard deviation of weights * values
+      over sqrt(n_samples) (0 for the outputs that are the same in every iteration, NaN with a single sample). The
+      stratification of stratified batches is ignored, which overstates their errors.
+    """
+    values = np.asarray(values, dtype=float)
+    weighted = values if weights is None else values * np.asarray(weights, dtype=float)[:, None]
+    means = weighted.mean(axis=0)
+    std_errors = weighted.std(axis=0, ddof=1) / np.sqrt(len(values)) if len(values) > 1 else np.full(values.shape[1], np.nan)
+
+    constant = np.all(values == values[0], axis=0)
+    means[constant] = values[0, constant]
+    std_errors[constant] = 0
+    return means, std_errors
+
+
+def control_variate_means(values, control, control_mean, weights=None):
+    """
+    Estimate the means of the outputs with a control variate of known mean.
+
+    Each output is corrected by its regression coefficient on the control, beta * (mean(control) - control_mean), which
+    removes the share of its variance explained by the control.
+
+    Parameters:
+    - values: Array of shape (n_samples, n_outputs).
+    - control: Array of shape (n_samples,) with the control variate of each sample.
+    - control_mean: Exact mean of the control variate.
+    - weights: Optional weights of the samples (e.g. importance sampling likelihood ratios); the outputs and the
+      control are then replaced by weights * values and weights * control, whose plain means are unbiased (see
+      internal_means).
+
+    Returns:
+    - means: Array of shape (n_outputs,) with the corrected means.
+    - variance_ratios: Array of shape (n_outputs,) with the variance of the corrected estimator relative to the plain
+      mean, 1 - rho**2 with rho the correlation between the output and the control.
+    """
+    values = np.asarray(values, dtype=float)
+    control = np.asarray(control, dtype=float)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        values = values * weights[:, None]
+        control = control * weights
+
+    values_mean = values.mean(axis=0)
+    sample_control_mean = control.mean()
+    values_dev = values - values_mean
+    control_dev = control - sample_control_mean
+
+    control_var = np.mean(control_dev**2)
+    if control_var == 0:
+        return values_mean, np.ones(values.shape[1])
+
+    cov = control_dev @ values_dev / len(values)
+    values_var = np.mean(values_dev**2, axis=0)
+    rho_sq = np.divide(cov**2, values_var * control_var, out=np.zeros(values.shape[1]), where=values_var > 0)
+
+    return values_mean - cov / control_var * (sample_control_mean - control_mean), 1 - rho_sq
+
+
+def run_internal_chunks(simulate, events, chunk_size, metrics, rel_tol, min_iterations):
+    """
+    Simulates the internal iterations of an event batch chunk by chunk, and stops simulating new ones as soon as the
+    chosen metrics have converged after a chunk.
+
+    Parameters:
+    - simulate: Function of a chunk of the batch (see slice_events) and its number, returning an array with one row of
+                results per iteration of the chunk.
+    - events: Batch in the format of poisson_process_batch.
+    - chunk_size: Number of iterations simulated at a time.
+    - metrics, rel_tol, min_iterations: Convergence criterion, see has_converged.
+
+    Returns:
+    - The results of the simulated iterations, in order; all of them if the metrics never converge.
+    """
+    stats = init_running_stats()
+    n_iterations = len(events['count'])
+    chunks = []
+    for chunk_no, start in enumerate(range(0, n_iterations, chunk_size)):
+        stop = min(start + chunk_size, n_iterations)
+        chunks.append(simulate(slice_events(events, start, stop), chunk_no))
+        merge_running_stats(stats, chunks[-1] * events['weight'][start:stop, None])  # Their means are those of internal_means
+        if has_converged(stats, metrics, rel_tol, min_iterations):
+            break
+
+    return np.concatenate(chunks)
+
+
+def get_event_buffers(storage, n_components, max_events, n_samples):
+    """
+    Provide preallocated arrays for the batched damage, restoration and cost kernels.
+
+    The arrays are views into flat storage that is kept in the given dictionary and only reallocated when a batch
+    needs more room than any previous one, so repeated calls with similar event counts reuse the same memory.
+
+    Parameters:
+    - storage: Dictionary holding the flat storage between calls; pass an empty dictionary on the first call.
+    - n_components: Number of grid components.
+    - max_events: Number of padded event slots of the batch.
+    - n_samples: Number of samples (inner iterations) in the batch.
+
+    Returns:
+    - Dictionary of arrays: 'fail_probs', 'damage_states', 'repair_periods' and 'dmg_costs' of shape
+      (n_components, max_events, n_samples), and 'actual_repair_periods' and 'unop_occ' of shape (max_events, n_samples).
+    """
+    component_shape = (n_components, max_events, n_samples)
+    event_shape = (max_events, n_samples)
+    layout = {
+        'fail_probs': (component_shape, np.float64),
+        'damage_states': (component_shape, np.int8),
+        'repair_periods': (component_shape, np.float64),
+        'dmg_costs': (component_shape, np.float64),
+        'actual_repair_periods': (event_shape, np.float64),
+        'unop_occ': (event_shape, np.float64),
+    }
+
+    buffers = {}
+    for name, (shape, dtype) in layout.items():
+        size = int(np.prod(shape))
+        if name not in storage or storage[name].size < size:
+            # Grow by at least half of the current capacity to avoid reallocating for every slightly larger batch
+            capacity = max(size, int(1.5 * storage[name].size) if name in storage else 0)
+            storage[name] = np.empty(capacity, dtype=dtype)
+        buffers[name] = storage[name][:size].reshape(shape)
+
+    return buffers
+
+
+def seed_sample_stream(sample_no, seed=1234):
+    """
+    Seeds the global NumPy random state with the stream of an external sample, i.e. child sample_no of
+    np.random.SeedSequence(seed).spawn().
+    """
+    np.random.seed(np.random.SeedSequence(seed, spawn_key=(sample_no,)).generate_state(4))
+
+
+def seed_hazard_stream(sample_no, seed=1234):
+    """
+    Seeds the global NumPy random state with the hazard stream of an external sample. The stream is separate from
+    the sample stream, so the hurricane, damage, repair and weather draws made after this call do not depend on how
+    many draws a scenario made for its projections; scenarios run with the same seed share them.
+    """
+    np.random.seed(np.random.SeedSequence(seed, spawn_key=(sample_no, 0)).generate_state(4))
+
+
+def _run_seeded_sample(run_sample, sample_no, sample_kwargs=None, seed=1234):
+    """Seeds the global NumPy random state with the stream of an external sample and runs the sample."""
+    seed_sample_stream(sample_no, seed)
+    return run_sample(sample_no, **(sample_kwargs or {}))
+
+
+def run_external_loops(run_sample, external_loops, seed=1234, n_workers=1, start=0, sample_kwargs=None):
+    """
+    Runs the external Monte Carlo samples, optionally sharded across a pool of worker processes.
+
+    Every sample gets its own random stream spawned from a single SeedSequence, so the results do not depend on
+    the number of workers or on the order in which the samples complete.
+
+    Parameters:
+    - run_sample: Module-level function taking the sample number and returning the results of that sample.
+    - external_loops: Number of external samples.
+    - seed: Root seed of the sample random streams.
+    - n_workers: Number of worker processes; 1 runs the samples serially in the current process.
+    - start: Index of the first sample to run, used to resume an interrupted run. The earlier samples are skipped
+      without changing the random streams of the remaining ones.
+    - sample_kwargs: Optional sequence with a dictionary of keyword arguments of run_sample for every sample, e.g.
+      its precomputed projections from batch_projection_quantiles.
+
+    Returns:
+    - A generator yielding the results of the samples from start onwards, in order.
+    """
+    if sample_kwargs is None:
+        sample_kwargs = [None] * external_loops
+
+    if n_workers == 1:
+        for k in range(start, external_loops):
+            yield _run_seeded_sample(run_sample, k, sample_kwargs[k], seed=seed)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            yield from executor.map(partial(_run_seeded_sample, run_sample, seed=seed), range(start, external_loops),
+                                    sample_kwargs[start:external_loops])
+
+
+def compare_internal_methods(run_sample, sample_nos, methods=('mc', 'quadrature'), seed=1234):
+    """
+    Runs the same external samples with two methods for the internal expectation, to validate one against the other.
+
+    Each sample is run with the same random stream for both methods, so the external inputs are identical.
+
+    Parameters:
+    - run_sample: Module-level function taking the sample number and the internal method, and returning the inputs
+      and outputs of that sample first.
+    - sample_nos: Sample numbers to run.
+    - methods: The reference and the tested internal methods.
+    - seed: Root seed of the sample random streams.
+
+    Returns:
+    - reference, tested: Arrays of shape (len(sample_nos), n_outputs) with the outputs of both methods.
+    - rel_diff: Relative difference of the tested outputs from the reference ones, 0 where both are 0.
+    """
+    outputs = []
+    for method in methods:
+        method_outputs = []
+        for k in sample_nos:
+            seed_sample_stream(k, seed)
+            method_outputs.append(run_sample(k, method)[1])
+        outputs.append(np.array(method_outputs))
+
+    reference, tested = outputs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel_diff = np.where(tested == reference, 0, (tested - reference) / np.abs(reference))
+
+    return reference, tested, rel_diff
+
+
+def open_result_sink(path, completed=0):
+    """
+    Opens an append-only binary file of result rows, keeping only the first completed rows of an existing file.
+
+    The file holds an int64 header with the number of columns followed by the rows as float64 values. Rows written
+    after the last checkpoint, including a partially written row, are discarded so that the file matches it.
+
+    Parameters:
+    - path: Path of the binary result file.
+    - completed: Number of rows to keep from an existing file; 0 starts a new file.
+
+    Returns:
+    - A dictionary with the open file ('file') and the number of columns ('n_columns', None until the first row).
+    """
+    if completed > 0 and os.path.exists(path):
+        f = open(path, 'r+b')
+        n_columns = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+        f.truncate(8 + completed * n_columns * 8)
+        f.seek(0, os.SEEK_END)
+    else:
+        f = open(path, 'wb')
+        n_columns = None
+    
+    return {'file': f, 'n_columns': n_columns}
+
+
+def append_result_row(sink, row):
+    """
+    Appends one row to a result file opened with open_result_sink. The row is buffered until flush_result_sink.
+
+    Parameters:
+    - sink: Result file from open_result_sink.
+    - row: Sequence of values; every row of a file must have the same length.
+    """
+    row = np.asarray(row, dtype=np.float64).ravel()
+    if sink['n_columns'] is None:
+        sink['n_columns'] = len(row)
+        sink['file'].write(np.int64(len(row)).tobytes())
+    elif len(row) != sink['n_columns']:
+        raise ValueError(f"Expected a row of {sink['n_columns']} values, got {len(row)}")
+    sink['file'].write(row.tobytes())
+
+
+def flush_result_sink(sink):
+    """Writes the buffered rows of a result file to disk."""
+    sink['file'].flush()
+    os.fsync(sink['file'].fileno())
+
+
+def read_result_rows(path):
+    """
+    Reads a result file written with append_result_row.
+
+    Parameters:
+    - path: Path of the binary result file.
+
+    Returns:
+    - A 2D array with one row per saved sample, ignoring any partially written trailing row.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return np.zeros((0, 0))
+    
+    n_columns = int(np.frombuffer(data[:8], dtype=np.int64)[0])
+    n_rows = (len(data) - 8) // (n_columns * 8)
+    return np.frombuffer(data[8:8 + n_rows * n_columns * 8], dtype=np.float64).reshape(n_rows, n_columns)
+
+
+def open_internal_store(path, external_loops, internal_loops, n_metrics, resume=False):
+    """
+    Opens a memory-mapped .npy array of shape (external_loops, internal_loops, n_metrics) for the internal results.
+
+    Results are stored as float32, indexed by (external sample, internal iteration); iterations that were not run
+    (e.g. after early stopping) are left as NaN.
+
+    Parameters:
+    - path: Path of the .npy file.
+    - external_loops: Number of external samples.
+    - internal_loops: Maximum number of internal iterations per external sample, which has to cover the number of
+      nodes when the quadrature method is used.
+    - n_metrics: Number of outputs of each internal iteration.
+    - resume: If True, an existing store is reopened instead of being overwritten.
+
+    Returns:
+    - The memory-mapped array.
+    """
+    if resume and os.path.exists(path):
+        return np.lib.format.open_memmap(path, mode='r+')
+    
+    store = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(external_loops, internal_loops, n_metrics))
+    for k in range(external_loops):
+        store[k] = np.nan
+    return store
+
+
+def write_internal_results(store, sample_no, results):
+    """
+    Writes the internal results of one external sample to a store from open_internal_store.
+
+    Parameters:
+    - store: Memory-mapped array from open_internal_store.
+    - sample_no: Index of the external sample.
+    - results: 2D array with one row of outputs per internal iteration.
+    """
+    results = np.asarray(results, dtype=np.float32)
+    if results.shape[0] > store.shape[1] or results.shape[1:] != store.shape[2:]:
+        raise ValueError(f'The internal results of sample {sample_no} have shape {results.shape}, but the store holds at most '
+                         f'{store.shape[1:]} per sample; open the store with at least as many internal iterations as the '
+                         'internal method produces (e.g. the number of quadrature nodes)')
+    store[sample_no, :len(results)] = results
+    store[sample_no, len(results):] = np.nan
+
+
+def internal_quantiles(path, q, metrics=None, weights_column=None):
+    """
+    Computes the quantiles of the internal results of every external sample, reading one sample at a time.
+
+    Parameters:
+    - path: Path of the store written with open_internal_store.
+    - q: Quantile or sequence of quantiles in [0, 1].
+    - metrics: Optional indices of the outputs to use; defaults to all of them.
+    - weights_column: Optional index of the column holding the weight of each internal iteration (the drivers store
+      the importance sampling likelihood ratio in the last column); the quantiles are then weighted.
+
+    Returns:
+    - An array of shape (external samples,) + np.shape(q) + (metrics,) with the quantiles, NaN for samples that
+      were not run.
+    """
+    store = np.load(path, mmap_mode='r')
+    metrics = slice(None) if metrics is None else metrics
+    n_metrics = store[0][0, metrics].size
+    
+    quantiles = np.full((store.shape[0],) + np.shape(q) + (n_metrics,), np.nan)
+    for k in range(store.shape[0]):
+        sample = np.asarray(store[k], dtype=float)
+        sample = sample[~np.isnan(sample).all(axis=1)]
+        if len(sample) > 0:
+            weights = sample[:, weights_column] if weights_column is not None else None
+            quantiles[k] = weighted_quantile(sample[:, metrics], q, weights)
+    
+    return quantiles
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Atomically saves a checkpoint dictionary as JSON, so an interrupted write leaves the previous checkpoint intact.
+
+    Parameters:
+    - path: Path of the checkpoint file.
+    - checkpoint: JSON-serializable dictionary, e.g. the index of the next sample and the root seed.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Loads a checkpoint saved with save_checkpoint, returning None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def init_running_stats():
+    """
+    Creates the accumulator used by update_running_stats and merge_running_stats. The mean and m2 entries take the shape of the first
+    observation added.
+
+    Returns:
+    - A dictionary with the number of observations ('count'), the sums of the weights and of their squares
+      ('weight_sum', 'weight_sq_sum'), the running weighted mean ('mean') and the running weighted sum of squared
+      deviations from the mean ('m2').
+    """
+    return {'count': 0, 'weight_sum': 0.0, 'weight_sq_sum': 0.0, 'mean': 0.0, 'm2': 0.0}
+
+
+def update_running_stats(stats, values, weight=1.0):
+    """
+    Adds one observation of the metrics to the running statistics, using the weighted form of Welford's algorithm.
+
+    Parameters:
+    - stats: Accumulator from init_running_stats, updated in place.
+    - values: Sequence with one value per metric.
+    - weight: Weight of the observation, e.g. its importance sampling likelihood ratio.
+    """
+    values = np.asarray(values, dtype=float)
+    stats['count'] += 1
+    if weight <= 0:
+        return
+    
+    stats['weight_sum'] += weight
+    stats['weight_sq_sum'] += weight**2
+    delta = values - stats['mean']
+    stats['mean'] = stats['mean'] + delta * weight / stats['weight_sum']
+    stats['m2'] = stats['m2'] + weight * delta * (values - stats['mean'])
+
+
+def merge_running_stats(stats, values, weights=None):
+    """
+    Adds a batch of observations of the metrics to the running statistics at once, by merging the weighted mean and
+    sum of squared deviations of the batch with those of the accumulator (the parallel form of Welford's algorithm).
+
+    Parameters:
+    - stats: Accumulator from init_running_stats, updated in place.
+    - values: Array with one row of metrics per observation.
+    - weights: Optional weights of the observations; observations with a weight of 0 are counted but add nothing.
+    """
+    values = np.asarray(values, dtype=float)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)
+    stats['count'] += len(values)
+    batch_weight = np.sum(weights)
+    if batch_weight <= 0:
+        return
+
+    batch_mean = weights @ values / batch_weight
+    batch_m2 = weights @ (values - batch_mean)**2
+    weight_sum = stats['weight_sum'] + batch_weight
+    delta = batch_mean - stats['mean']
+    stats['mean'] = stats['mean'] + delta * batch_weight / weight_sum
+    stats['m2'] = stats['m2'] + batch_m2 + delta**2 * stats['weight_sum'] * batch_weight / weight_sum
+    stats['weight_sum'] = weight_sum
+    stats['weight_sq_sum'] += np.sum(weights**2)
+
+
+def has_converged(stats, metrics, rel_tol, min_iterations):
+    """
+    Checks whether the standard error of the mean of the chosen metrics is within a relative tolerance.
+
+    Parameters:
+    - stats: Accumulator from init_running_stats.
+    - metrics: Indices of the metrics that must converge.
+    - rel_tol: Tolerance on the standard error relative to the absolute value of the mean.
+    - min_iterations: Minimum number of observations before convergence can be declared.
+
+    Returns:
+    - True if at least min_iterations observations were added and every chosen metric is within the tolerance.
+    """
+    if stats['count'] < min_iterations or stats['weight_sum'] == 0:
+        return False
+    
+    # Effective sample size of the weighted observations (the number of observations when all weights are equal)
+    n_eff = stats['weight_sum']**2 / stats['weight_sq_sum']
+    if n_eff <= 1:
+        return False
+    
+    variance = stats['m2'][metrics] / stats['weight_sum'] * n_eff / (n_eff - 1)
+    std_error = np.sqrt(variance / n_eff)
+    return bool(np.all(std_error <= rel_tol * np.abs(stats['mean'][metrics])))
+
+
+def weighted_quantile(values, q, weights=None):
+    """
+    Computes quantiles along the first axis from the weighted empirical distribution of the values.
+
+    Parameters:
+    - values: Array with one row per observation.
+    - q: Quantile or sequence of quantiles in [0, 1].
+    - weights: Optional weights of the observations, e.g. importance sampling likelihood ratios.
+
+    Returns:
+    - An array of shape np.shape(q) + values.shape[1:] with the quantiles.
+    """
+    values = np.asarray(values, dtype=float)
+    if weights is None:
+        return np.quantile(values, q, axis=0)
+    
+    weights = np.asarray(weights, dtype=float)
+    flat_values = values.reshape(len(values), -1)
+    quantiles = np.empty(np.shape(q) + (flat_values.shape[1],))
+    for i in range(flat_values.shape[1]):
+        # Smallest value whose cumulative weight reaches each quantile
+        order = np.argsort(flat_values[:, i])
+        cum_weights = np.cumsum(weights[order])
+        idx = np.searchsorted(cum_weights, np.asarray(q) * cum_weights[-1], side='left')
+        quantiles[..., i] = flat_values[order, i][np.minimum(idx, len(values) - 1)]
+    
+    return quantiles.reshape(np.shape(q) + values.shape[1:])
+
+
 def discount_dmg_costs(replacement_costs, occurrences, base_year, discount_rate=1.0):
     """
     Applies discounting to the replacement costs based on the year of occurrence, accounting for the time value of money.
 
     Parameters:
     - replacement_costs: A 2D NumPy array containing the adjusted replacement costs for each component and occurrence.
-    - occurrences: A DataFrame containing information about each occurrence, including the year.
+    - occurrences: A DataFrame or dictionary of arrays containing information about each occurrence, including the year.
     - base_year: The base year for discounting calculations.
     - discount_rate: The annual discount rate, defaulted to 1.0 (no discount).
 
@@ -349,8 +2247,9 @@ def discount_dmg_costs(replacement_costs, occurrences, base_year, discount_rate=
     replacement_costs = np.array(replacement_costs)
 
     # Apply discounting to each column (occurrence) in the replacement costs array.
-    for j in range(len(occurrences)):
-        year = occurrences['year'][j]
+    occ_years = np.asarray(occurrences['year'])
+    for j in range(len(occ_years)):
+        year = occ_years[j]
         # Calculate the discount coefficient based on the difference between the occurrence year and the base year.
         coefficient = discount_rate ** (year - base_year)
         # Discount the replacement costs for the occurrence.
@@ -367,7 +2266,7 @@ def compute_discounted_operational_costs(occurrences, repair_done_times, min_yea
     Computes the discounted operational costs considering the periods when components are operational post-repair.
 
     Parameters:
-    - occurrences: A DataFrame containing information about each occurrence, including the year.
+    - occurrences: A DataFrame or dictionary of arrays containing information about each occurrence, including the year.
     - repair_done_times: A NumPy array indicating the year by which repairs are completed for each occurrence.
     - min_year: The minimum year from the occurrences for calculation.
     - max_year: The maximum year considered for operational costs calculation.
@@ -380,9 +2279,11 @@ def compute_discounted_operational_costs(occurrences, repair_done_times, min_yea
     - total_undamaged_periods: The total number of undamaged (operational) periods across all occurrences.
     """
 
-    if len(occurrences) != 0:
+    occ_years = np.asarray(occurrences['year']) if len(occurrences) > 0 else np.zeros(0)
+
+    if len(occ_years) != 0:
         # Calculate the end times for operational periods, assuming each occurrence marks the start of a new period.
-        end_times = np.array(occurrences['year'][1:])
+        end_times = np.array(occ_years[1:])
         end_times = np.append(end_times, max_year)
         
         # Determine the undamaged (operational) periods by subtracting the repair done times from the end times.
@@ -395,7 +2296,7 @@ def compute_discounted_operational_costs(occurrences, repair_done_times, min_yea
     undisc_costs = undamaged_periods * np.random.normal(loc=np.sum(op_costs), scale=0.1 * np.sum(op_costs))
 
     # Determine the representative year for each undamaged period for discounting purposes.
-    if len(occurrences) != 0:
+    if len(occ_years) != 0:
         undamaged_periods_reps = repair_done_times + undamaged_periods * 0.5
     else:
         undamaged_periods_reps = 0.5 * (min_year + max_year)
@@ -478,314 +2379,590 @@ def weather_condition(min_year, max_year):
     return weather_conditions
 
 
+# Historical mean number of days per year for the sunny, partly cloudy and five windy bands (7-12, 12-17, 17-24, 24-31, 31-38 mph)
+WEATHER_DAY_MEANS = np.array([101.2, 214.9, 110.7, 197.3, 30.1, 0.7, 0.1])
+
+
+def weather_condition_batch(min_year, max_year, n_samples, deviates=None):
+    """
+    Generates simulated weather conditions for many samples at once, following the same distributions as weather_condition.
+
+    Parameters:
+    - min_year: The starting year for the simulation.
+    - max_year: The ending year for the simulation.
+    - n_samples: Number of independent weather samples.
+    - deviates: Optional array of shape (n_samples, 7) with given standard normal deviates of the ratios, e.g. the
+      weather nodes of poisson_quadrature_events, used for every year instead of drawing them.
 
+    Returns:
+    - An array of shape (n_samples, years, 7) with the yearly ratios for the sunny, partly cloudy and windy conditions,
+      in the same order as weather_condition.
+    """
+    
+    n_years = len(np.arange(min_year, max_year))
+    
+    # Yearly ratios from normal draws around the historical means, clipped to [0, 1]
+    if deviates is None:
+        ratios = np.random.normal(loc=WEATHER_DAY_MEANS, scale=0.2 * WEATHER_DAY_MEANS, size=(n_samples, n_years, len(WEATHER_DAY_MEANS)))
+    else:
+        ratios = np.repeat((WEATHER_DAY_MEANS * (1 + 0.2 * np.asarray(deviates)))[:, None], n_years, axis=1)
+    np.clip(ratios, None, 365, out=ratios)
+    ratios /= 365
+    np.clip(ratios, 0, None, out=ratios)
+    
+    # Rescale the sunny and partly cloudy ratios where their sum reaches 1
+    sky_total = ratios[..., :2].sum(axis=-1)
+    ratios[..., :2] *= np.where(sky_total >= 1, 0.9 / np.maximum(sky_total, 1), 1)[..., None]
+    
+    # Rescale the windy ratios where their sum reaches 1
+    windy_total = ratios[..., 2:].sum(axis=-1)
+    ratios[..., 2:] *= np.where(windy_total >= 1, 0.95 / np.maximum(windy_total, 1), 1)[..., None]
+    
+    return ratios
+
+
+@lru_cache(maxsize=None)
 def weather_condition_mean(min_year, max_year):
     """
     Generates mean weather conditions based on historical climate data for a given range of years.
 
-    Parameters:
-    - min_year: The starting year for the simulation.
-    - max_year: The ending year for the simulation.
+    Parameters:
+    - min_year: The starting year for the simulation.
+    - max_year: The ending year for the simulation.
+
+    Returns:
+    - A tuple containing the mean yearly ratios for different weather conditions. The result is cached, since it
+      does not depend on any random draw.
+
+    Source for historical climate data:
+    https://www.meteoblue.com/en/weather/historyclimate/climatemodelled/puerto-rico_puerto-rico_4566967
+    """
+    
+    year_span = np.arange(min_year, max_year)
+    
+    # Initialize lists to hold yearly weather condition ratios
+    sunny_ratio, partly_cloudy_ratio = [], []
+    windy_ratio_7_12mph, windy_ratio_12_17mph, windy_ratio_17_24mph, windy_ratio_24_31mph, windy_ratio_31_38mph = [], [], [], [], []
+
+    # Mean values for each weather condition based on historical data
+    sunny_ratio_mean = 101.2
+    partly_cloudy_ratio_mean = 214.9
+    windy_ratio_7_12mph_mean = 110.7
+    windy_ratio_12_17mph_mean = 197.3
+    windy_ratio_17_24mph_mean = 30.1
+    windy_ratio_24_31mph_mean = 0.7
+    windy_ratio_31_38mph_mean = 0.1
+    
+    for y in year_span:
+        # Directly use mean values for each weather condition since scale is set to 0
+        sunny_ratio.append(max(min(sunny_ratio_mean, 365) / 365, 0))
+        partly_cloudy_ratio.append(max(min(partly_cloudy_ratio_mean, 365) / 365, 0))
+        windy_ratio_7_12mph.append(max(min(windy_ratio_7_12mph_mean, 365) / 365, 0))
+        windy_ratio_12_17mph.append(max(min(windy_ratio_12_17mph_mean, 365) / 365, 0))
+        windy_ratio_17_24mph.append(max(min(windy_ratio_17_24mph_mean, 365) / 365, 0))
+        windy_ratio_24_31mph.append(max(min(windy_ratio_24_31mph_mean, 365) / 365, 0))
+        windy_ratio_31_38mph.append(max(min(windy_ratio_31_38mph_mean, 365) / 365, 0))
+        
+        # Adjust ratios if their sum exceeds 1
+        if sunny_ratio[-1] + partly_cloudy_ratio[-1] >= 1:
+            coef = 0.9 / (sunny_ratio[-1] + partly_cloudy_ratio[-1])
+            sunny_ratio[-1] *= coef
+            partly_cloudy_ratio[-1] *= coef
+            
+        total_windy = sum([windy_ratio_7_12mph[-1], windy_ratio_12_17mph[-1], windy_ratio_17_24mph[-1], windy_ratio_24_31mph[-1], windy_ratio_31_38mph[-1]])
+        if total_windy >= 1:
+            coef = 0.95 / total_windy
+            windy_ratio_7_12mph[-1] *= coef
+            windy_ratio_12_17mph[-1] *= coef
+            windy_ratio_17_24mph[-1] *= coef
+            windy_ratio_24_31mph[-1] *= coef
+            windy_ratio_31_38mph[-1] *= coef
+    
+    # Aggregate all mean weather condition ratios into a single immutable tuple, so the cached value cannot be altered
+    weather_conditions = (
+        tuple(sunny_ratio), tuple(partly_cloudy_ratio), tuple(windy_ratio_7_12mph), tuple(windy_ratio_12_17mph),
+        tuple(windy_ratio_17_24mph), tuple(windy_ratio_24_31mph), tuple(windy_ratio_31_38mph)
+    )
+    
+    return weather_conditions
+
+
+# Percentiles matched by the skew normal fits of the projections
+SKEWNORM_FIT_PERCENTILES = np.array([0.05, 0.50, 0.95])
+
+
+@lru_cache(maxsize=None)
+def _skewnorm_bowley_table(n_shapes=2001):
+    """Tabulates the standard skew normal percentiles and their Bowley skewness against the shape parameter."""
+    shapes = np.linspace(-100, 100, n_shapes)
+    quantiles = skewnorm.ppf(SKEWNORM_FIT_PERCENTILES[:, None], shapes)
+    bowley = (quantiles[2] + quantiles[0] - 2 * quantiles[1]) / (quantiles[2] - quantiles[0])
+    return shapes, bowley
+
+
+def skewnorm_quantile_guess(p5, p50, p95, bounds):
+    """
+    Solves for the skew normal parameters matching three percentiles, through the Bowley skewness of the percentiles.
+    The shape is interpolated from a table, so the result is a starting point for a local search.
+
+    Parameters:
+    - p5, p50, p95: Target 5th, 50th and 95th percentiles.
+    - bounds: Bounds of the location, scale and shape, the guess is clipped to.
+
+    Returns:
+    - The (location, scale, shape) guess.
+    """
+    shapes, bowley = _skewnorm_bowley_table()
+    alpha = np.interp((p95 + p5 - 2 * p50) / (p95 - p5), bowley, shapes)
+    quantiles = skewnorm.ppf(SKEWNORM_FIT_PERCENTILES, alpha)
+    omega = (p95 - p5) / (quantiles[2] - quantiles[0])
+    xi = p50 - omega * quantiles[1]
+    lower, upper = np.transpose(bounds)
+    return np.clip([xi, omega, alpha], lower, upper)
+
+
+def skewnorm_fit_residual(params, p5, p50, p95):
+    """Root mean square error of the fitted 5th, 50th and 95th percentiles, relative to the 5-95 percentile range."""
+    xi, omega, alpha = params
+    errors = skewnorm.ppf(SKEWNORM_FIT_PERCENTILES, alpha, xi, omega) - np.array([p5, p50, p95])
+    return np.sqrt(np.mean(errors**2)) / (p95 - p5)
+
+
+def fit_skewnorm(p5, p50, p95, lower_bound=0, upper_bound=5000, x0=None, max_residual=1e-3, seed=None):
+    """
+    Fits a skew normal distribution to three percentiles. Local searches start from the percentile-matching guess
+    and, if given, from a warm start; the global differential evolution search only runs when neither matches the
+    percentiles within max_residual.
+
+    Parameters:
+    - p5, p50, p95: Target 5th, 50th and 95th percentiles.
+    - lower_bound, upper_bound: Bounds of the location.
+    - x0: Warm start, e.g. the parameters fitted for the previous year.
+    - max_residual: Largest relative error (see skewnorm_fit_residual) accepted from the local searches.
+    - seed: Seed of the global search.
+
+    Returns:
+    - The fitted (location, scale, shape).
+    """
+    targets = np.array([p5, p50, p95])
+
+    def objective(params):
+        xi, omega, alpha = params
+        return np.sum((skewnorm.ppf(SKEWNORM_FIT_PERCENTILES, alpha, xi, omega) - targets)**2)
+    
+    # Bounds for parameters, assuming you have some reasonable range in mind
+    bounds = [(lower_bound, upper_bound), (0.01, 1000), (-100, 100)]
+
+    starts = [skewnorm_quantile_guess(p5, p50, p95, bounds)]
+    if x0 is not None:
+        starts.append(np.clip(x0, *np.transpose(bounds)))
+    result = min((minimize(objective, start, method='Nelder-Mead', bounds=bounds) for start in starts),
+                 key=lambda local_result: local_result.fun)
+
+    if skewnorm_fit_residual(result.x, p5, p50, p95) > max_residual:
+        global_result = differential_evolution(objective, bounds, seed=seed)
+        if global_result.fun < result.fun:
+            result = global_result
+    
+    return result.x
+
+def skewnorm_inv_cdf(probability, xi, omega, alpha):
+    
+    return skewnorm.ppf(probability, alpha, xi, omega)
+
+
+@lru_cache(maxsize=None)
+def skewnorm_ppf_table(xi, omega, alpha, tol=1e-6, z_max=8.0, max_points=4097):
+    """
+    Tabulates the skew normal inverse CDF against standard normal scores, for linear interpolation.
+
+    The uniform grid of scores is refined by doubling until linear interpolation is within tol * omega of the exact
+    inverse CDF at every midpoint with |z| <= 6 (percentiles between 1e-9 and 1 - 1e-9), or until it has max_points
+    points. Further out, SciPy's inverse CDF is itself only accurate to about 1e-4 * omega for strongly skewed rows.
+    The upper half is evaluated from the survival function for precision, and the values are made non-decreasing.
+
+    Parameters:
+    - xi, omega, alpha: Location, scale and shape of the skew normal distribution.
+    - tol: Interpolation tolerance relative to the scale.
+    - z_max: Largest standard normal score of the grid; scores beyond it take the end values.
+    - max_points: Largest number of grid points.
+
+    Returns:
+    - z, values: Read-only arrays with the grid of scores and the inverse CDF at each of them. The result is cached
+      for every parameter row.
+    """
+    def exact(z):
+        values = np.empty(len(z))
+        lower = z < 0
+        values[lower] = skewnorm.ppf(ndtr(z[lower]), alpha, xi, omega)
+        values[~lower] = skewnorm.isf(ndtr(-z[~lower]), alpha, xi, omega)
+        return values
+
+    z = np.linspace(-z_max, z_max, 129)
+    values = exact(z)
+    while len(z) < max_points:
+        mid_z = (z[1:] + z[:-1]) / 2
+        mid_values = exact(mid_z)
+        inner = np.abs(mid_z) <= 6
+        if np.max(np.abs((values[1:] + values[:-1]) / 2 - mid_values)[inner]) <= tol * omega:
+            break
+
+        # Doubling keeps the existing points, so only the midpoints are new
+        z = np.insert(z, np.arange(1, len(z)), mid_z)
+        values = np.insert(values, np.arange(1, len(values)), mid_values)
+
+    values = np.maximum.accumulate(values)
+    z.flags.writeable = False
+    values.flags.writeable = False
+
+    return z, values
+
+
+def skewnorm_ppf_batch(percentiles, params, tables=False, tol=1e-6):
+    """
+    Evaluates the skew normal inverse CDF for many percentiles and parameter rows in a single call.
+
+    Parameters:
+    - percentiles: Array of percentiles, e.g. of shape (n_samples, n_variables), or a single percentile.
+    - params: Array of (location, scale, shape) rows whose leading axes line up with the last axes of the
+      percentiles, e.g. of shape (n_variables, n_years, 3) for the stacked *Params.npy rows of each variable.
+    - tables: Whether to interpolate in the cached tables of skewnorm_ppf_table instead of evaluating the exact inverse
+      CDF, which is faster when there are many percentiles per parameter row.
+    - tol: Interpolation tolerance of the tables, relative to the scale.
+
+    Returns:
+    - Array of shape percentiles.shape + (n_years,), e.g. (n_samples, n_variables, n_years).
+    """
+    percentiles = np.asarray(percentiles, dtype=float)[..., None]
+    params = np.asarray(params, dtype=float)
+    if not tables:
+        return skewnorm.ppf(percentiles, params[..., 2], params[..., 0], params[..., 1])
+
+    z = ndtri(percentiles)
+    values = np.empty(np.broadcast_shapes(z.shape, params.shape[:-1]))
+    z = np.broadcast_to(z, values.shape)
+    for row in np.ndindex(params.shape[:-1]):
+        index = (Ellipsis,) + row
+        values[index] = np.interp(z[index], *skewnorm_ppf_table(*params[row], tol=tol))
+
+    return values
+
+
+def batch_projection_quantiles(percentiles, params, tables=True):
+    """
+    Evaluates the projections of several variables for all external samples in one skewnorm_ppf_batch call.
+
+    Parameters:
+    - percentiles: Dictionary with an array of the percentiles of every external sample, by variable.
+    - params: Dictionary with the (location, scale, shape) rows of the projection years of each variable, as sliced by
+      its projection function; the number of years may differ between variables.
+    - tables: Whether to interpolate in the cached tables of skewnorm_ppf_table (see skewnorm_ppf_batch).
+
+    Returns:
+    - A list with a dictionary per external sample, holding the projection values of the years of every variable, to
+      be passed as the precomputed quantiles of the projection functions.
+    """
+    names = list(params)
+    n_years = max(len(params[name]) for name in names)
+
+    # Shorter parameter sets are padded with their last row, and the padded values are dropped again
+    stacked = np.stack([np.pad(np.asarray(params[name], dtype=float), ((0, n_years - len(params[name])), (0, 0)), mode='edge')
+                        for name in names])
+    quantiles = skewnorm_ppf_batch(np.column_stack([percentiles[name] for name in names]), stacked, tables=tables)
+
+    return [{name: sample_quantiles[i, :len(params[name])] for i, name in enumerate(names)} for sample_quantiles in quantiles]
+
+
+# Columns of the low, median and high projections, padding of the low and high values, offset of the median and
+# bounds of the location, for each data_type of fit_skewed_norm_dist
+SKEWNORM_FIT_SPECS = {
+    'population': ('95% Lower Bound', 'Median', '95% Upper Bound', 0.1, 0.1, (2500, 3500)),
+    'perCapita': ('Low', 'Median', 'High', 0.01, 0, (0.9, 2)),
+    'ngPrice': ('min', 'median', 'max', 0.1, 0, (0, 10)),
+    'urnPrice': ('Low', 'Median', 'High', 0.1, 0, (0, 2)),
+    'hydInv': ('Inv Min', 'Inv Median', 'Inv Max', 1, 0, (2200, 2600)),
+    'hydFix': ('Fix Min', 'Fix Median', 'Fix Max', 0.1, 0, (55, 65)),
+    'solInv': ('Inv Min', 'Inv Median', 'Inv Max', 1, 0, (400, 1200)),
+    'solFix': ('Fix Min', 'Fix Median', 'Fix Max', 0.1, 0, (10, 25)),
+    'solCF': ('CF Min', 'CF Median', 'CF Max', 0.01, 0, (0.2, 0.5)),
+    'windInv': ('Inv Min', 'Inv Median', 'Inv Max', 1, 0, (500, 1500)),
+    'windFix': ('Fix Min', 'Fix Median', 'Fix Max', 0.1, 0, (25, 50)),
+    'windCF': ('CF Min', 'CF Median', 'CF Max', 0.01, 0, (0.9, 1.2)),
+    'battInv': ('Inv Min', 'Inv Median', 'Inv Max', 1, 0, (900, 3500)),
+    'battFix': ('Fix Min', 'Fix Median', 'Fix Max', 0.1, 0, (20, 85)),
+    'coalPrice': ('Low', 'Median', 'High', 0.1, 0, (3, 4)),
+    'oilPrice': ('Low', 'Median', 'High', 0.1, 0, (10, 16)),
+    'dslPrice': ('Low', 'Median', 'High', 0.1, 0, (17, 22)),
+    'coalInv': ('Low', 'Median', 'High', 1, 0, (2200, 3500)),
+    'coalFix': ('Low', 'Median', 'High', 0.1, 0, (60, 75)),
+    'coalVar': ('Low', 'Median', 'High', 0.01, 0, (1.5, 2.5)),
+    'priceChange': ('Min', 'Median', 'Max', 0.01, 0, (0.8, 1.2)),
+}
+
+
+def fit_skewed_norm_dist(data, data_type, warm_start=True, seed=None):
+    """
+    Fits a skew normal distribution to the low, median and high projections of every year.
+
+    Parameters:
+    - data: DataFrame with one row per year and the columns given in SKEWNORM_FIT_SPECS.
+    - data_type: Key of SKEWNORM_FIT_SPECS.
+    - warm_start: Whether to start the local searches of each year from the parameters of the previous year.
+    - seed: Seed of the global searches.
+
+    Returns:
+    - An array of shape (n_years, 3) with the (location, scale, shape) of each year, or -1 for an unknown data_type.
+    """
+    if data_type not in SKEWNORM_FIT_SPECS:
+        print('wrong input')
+        return -1
+
+    low, median, high, pad, median_offset, (lower_bound, upper_bound) = SKEWNORM_FIT_SPECS[data_type]
+    params = []
+    residual = 0
+    for i in range(len(data)):
+        p95 = data[high].iloc[i] + pad
+        p5 = data[low].iloc[i] - pad
+        p50 = data[median].iloc[i] - median_offset
+
+        # Where the percentiles cannot be matched, a year need not fit better than the previous one
+        x0 = params[-1] if warm_start and params else None
+        fit = fit_skewnorm(p5, p50, p95, lower_bound, upper_bound, x0=x0, max_residual=max(1e-3, 2 * residual), seed=seed)
+        residual = skewnorm_fit_residual(fit, p5, p50, p95)
+
+        params.append(fit)
+    
+    return np.array(params)
+
+
+def skewnorm_fit_key(csv_path, data_type):
+    """Hash of the content of a projection CSV and of the fitting specification of its data_type."""
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(repr((data_type, SKEWNORM_FIT_SPECS[data_type])).encode())
+    return digest.hexdigest()
+
+
+def _fit_skewnorm_csv(csv_path, data_type, seed=None):
+    """Fits the skew normal distributions of a projection CSV, skipping its blank rows."""
+    data = pd.read_csv(csv_path, index_col=0).dropna(how='all')
+    return fit_skewed_norm_dist(data, data_type, seed=seed)
+
+
+def load_skewnorm_params(fits, params_dir='.', refresh=True, n_workers=1, seed=1234,
+                         cache_file='skewnormParamsCache.json'):
+    """
+    Loads the skew normal parameters of the projections from their .npy files, refitting those whose projections
+    changed since they were fitted.
+
+    A JSON cache index keys every .npy file by the hash of its CSV content and data_type (skewnorm_fit_key). Files
+    not in the index yet are taken as fitted to the current CSV and added to it. Missing or stale files are refitted
+    in parallel, one variable per process, each year warm-started from the previous one.
+
+    Parameters:
+    - fits: Dictionary mapping each parameter file name (e.g. 'populationParams') to the projection CSV file and
+      its data_type in fit_skewed_norm_dist.
+    - params_dir: Directory of the CSV, .npy and cache index files.
+    - refresh: Whether to check the cache and refit stale parameters; worker processes only load the files.
+    - n_workers: Number of processes fitting the stale variables.
+    - seed: Seed of the global searches, so that refits are reproducible.
+    - cache_file: Name of the cache index file.
+
+    Returns:
+    - A dictionary mapping the parameter file names to the parameter arrays.
+    """
+    if refresh:
+        cache_path = os.path.join(params_dir, cache_file)
+        cache = {}
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cache = json.load(f)
+
+        keys, stale = {}, []
+        for name, (csv_file, data_type) in fits.items():
+            if data_type not in SKEWNORM_FIT_SPECS:
+                raise ValueError(f"Unknown data_type '{data_type}' for {name}")
+            keys[name] = skewnorm_fit_key(os.path.join(params_dir, csv_file), data_type)
+            if not os.path.exists(os.path.join(params_dir, name + '.npy')) or cache.get(name, keys[name]) != keys[name]:
+                stale.append(name)
+
+        csv_paths = [os.path.join(params_dir, fits[name][0]) for name in stale]
+        data_types = [fits[name][1] for name in stale]
+        if n_workers == 1 or len(stale) <= 1:
+            results = map(partial(_fit_skewnorm_csv, seed=seed), csv_paths, data_types)
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(stale))) as executor:
+                results = list(executor.map(partial(_fit_skewnorm_csv, seed=seed), csv_paths, data_types))
+        for name, params in zip(stale, results):
+            print(f'Refitted {name} from {fits[name][0]}')
+            np.save(os.path.join(params_dir, name), params)
+
+        if any(cache.get(name) != key for name, key in keys.items()):
+            cache.update(keys)
+            with open(cache_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+
+    return {name: np.load(os.path.join(params_dir, name + '.npy')) for name in fits}
+
+
+def outer_sample_design(n_samples, n_inputs, method='random', seed=1234):
+    """
+    Generates the percentiles of the uncertain inputs for all external samples at once.
+
+    Parameters:
+    - n_samples: Number of external samples.
+    - n_inputs: Number of uncertain inputs.
+    - method: 'sobol' (scrambled Sobol sequence), 'halton' (scrambled Halton sequence), 'lhs' (Latin hypercube),
+      'uniform' (independent pseudo-random percentiles) or 'random' (no design, each projection draws its own
+      percentile).
+    - seed: Seed of the scrambling or of the Latin hypercube permutations.
+
+    Returns:
+    - An array of shape (n_samples, n_inputs) with percentiles in (0, 1), or None for the 'random' method.
+    """
+    if method == 'random':
+        return None
+    elif method == 'sobol':
+        sampler = qmc.Sobol(n_inputs, scramble=True, seed=seed)
+    elif method == 'halton':
+        sampler = qmc.Halton(n_inputs, scramble=True, seed=seed)
+    elif method == 'lhs':
+        sampler = qmc.LatinHypercube(n_inputs, seed=seed)
+    elif method == 'uniform':
+        return np.random.default_rng(seed).uniform(size=(n_samples, n_inputs))
+    else:
+        raise ValueError(f"Unknown sampling design '{method}'")
+    
+    # Keep the percentiles away from 0 and 1, where the inverse CDFs are infinite
+    eps = 1e-10
+    return np.clip(sampler.random(n_samples), eps, 1 - eps)
+
+
+def sample_lognormal(mean, sigma, percentile=None):
+    """Draws a lognormal value, or returns its quantile at the given percentile (e.g. from outer_sample_design)."""
+    if percentile is None:
+        return np.random.lognormal(mean, sigma)
+    return np.exp(mean + sigma * scipy.stats.norm.ppf(percentile))
+
+
+def sample_uniform(low, high, percentile=None):
+    """Draws a uniform value in [low, high), or returns its quantile at the given percentile (e.g. from outer_sample_design)."""
+    if percentile is None:
+        return np.random.uniform(low, high)
+    return low + (high - low) * percentile
+
+
+# Fixed period axis shared by all projections (every 5 years from 2020 to 2050)
+PROJECTION_PERIODS = np.arange(2020, 2051, 5)
+
+
+def init_projections(variables, n_samples=None):
+    """
+    Creates an array-backed container for projections on the fixed period axis (PROJECTION_PERIODS).
+
+    Parameters:
+    - variables: Names of the projected variables (e.g. 'inv', 'fix', 'cf').
+    - n_samples: Number of external samples for batched projections; adds a leading sample axis if given.
+
+    Returns:
+    - A dictionary with 'values' (NaN-filled array of shape ([n_samples,] n_variables, n_periods)),
+      'variables' (name -> index on the variable axis) and 'periods' (the projection years).
+    """
+    shape = (len(variables), len(PROJECTION_PERIODS))
+    if n_samples is not None:
+        shape = (n_samples,) + shape
+    return {'values': np.full(shape, np.nan),
+            'variables': {name: i for i, name in enumerate(variables)},
+            'periods': PROJECTION_PERIODS}
+
+
+def period_slice(min_year, max_year, interval):
+    """
+    Maps a range of projection years onto the period axis as a slice, so that indexing with it returns a view.
+
+    Parameters:
+    - min_year: The starting year.
+    - max_year: The ending year.
+    - interval: The interval between years (a multiple of the 5-year period step).
+
+    Returns:
+    - A slice into the period axis.
+    """
+    step = PROJECTION_PERIODS[1] - PROJECTION_PERIODS[0]
+    if (min_year - PROJECTION_PERIODS[0]) % step or interval % step \
+            or min_year < PROJECTION_PERIODS[0] or max_year > PROJECTION_PERIODS[-1]:
+        raise ValueError(f'Years {min_year}-{max_year} every {interval} are not on the projection period axis')
+    start = (min_year - PROJECTION_PERIODS[0]) // step
+    stop = (max_year - PROJECTION_PERIODS[0]) // step + 1
+    return slice(start, stop, interval // step)
+
+
+def period_values(projections, year):
+    """
+    Returns all variables (and samples) of a projection container at one year, without copying.
+
+    Parameters:
+    - projections: Container from init_projections.
+    - year: Projection year (int or string, e.g. 2050 or '2050').
+
+    Returns:
+    - A view of shape ([n_samples,] n_variables).
+    """
+    return projections['values'][..., period_slice(int(year), int(year), 5).start]
+
+
+class ProjectionView(MutableMapping):
+    """
+    Dict-like view of one projected variable, keyed by year strings ('2025', ..., '2050') as the projection
+    dictionaries were, and backed by a slice of the projection array. Assigning a year writes into the array; the
+    years are fixed, so they cannot be deleted.
+    """
+
+    def __init__(self, values, years):
+        self.values = values
+        self.years = [str(year) for year in years]
+        self._index = {year: i for i, year in enumerate(self.years)}
+
+    def __getitem__(self, year):
+        return self.values[self._index[year]]
 
-    Returns:
-    - A list containing the mean yearly ratios for different weather conditions.
+    def __setitem__(self, year, value):
+        self.values[self._index[year]] = value
 
-    Source for historical climate data:
-    https://www.meteoblue.com/en/weather/historyclimate/climatemodelled/puerto-rico_puerto-rico_4566967
-    """
-    
-    year_span = np.arange(min_year, max_year)
-    
-    # Initialize lists to hold yearly weather condition ratios
-    sunny_ratio, partly_cloudy_ratio = [], []
-    windy_ratio_7_12mph, windy_ratio_12_17mph, windy_ratio_17_24mph, windy_ratio_24_31mph, windy_ratio_31_38mph = [], [], [], [], []
+    def __delitem__(self, year):
+        raise TypeError('The years of a projection view are fixed and cannot be deleted')
 
-    # Mean values for each weather condition based on historical data
-    sunny_ratio_mean = 101.2
-    partly_cloudy_ratio_mean = 214.9
-    windy_ratio_7_12mph_mean = 110.7
-    windy_ratio_12_17mph_mean = 197.3
-    windy_ratio_17_24mph_mean = 30.1
-    windy_ratio_24_31mph_mean = 0.7
-    windy_ratio_31_38mph_mean = 0.1
-    
-    for y in year_span:
-        # Directly use mean values for each weather condition since scale is set to 0
-        sunny_ratio.append(max(min(sunny_ratio_mean, 365) / 365, 0))
-        partly_cloudy_ratio.append(max(min(partly_cloudy_ratio_mean, 365) / 365, 0))
-        windy_ratio_7_12mph.append(max(min(windy_ratio_7_12mph_mean, 365) / 365, 0))
-        windy_ratio_12_17mph.append(max(min(windy_ratio_12_17mph_mean, 365) / 365, 0))
-        windy_ratio_17_24mph.append(max(min(windy_ratio_17_24mph_mean, 365) / 365, 0))
-        windy_ratio_24_31mph.append(max(min(windy_ratio_24_31mph_mean, 365) / 365, 0))
-        windy_ratio_31_38mph.append(max(min(windy_ratio_31_38mph_mean, 365) / 365, 0))
-        
-        # Adjust ratios if their sum exceeds 1
-        if sunny_ratio[-1] + partly_cloudy_ratio[-1] >= 1:
-            coef = 0.9 / (sunny_ratio[-1] + partly_cloudy_ratio[-1])
-            sunny_ratio[-1] *= coef
-            partly_cloudy_ratio[-1] *= coef
-            
-        total_windy = sum([windy_ratio_7_12mph[-1], windy_ratio_12_17mph[-1], windy_ratio_17_24mph[-1], windy_ratio_24_31mph[-1], windy_ratio_31_38mph[-1]])
-        if total_windy >= 1:
-            coef = 0.95 / total_windy
-            windy_ratio_7_12mph[-1] *= coef
-            windy_ratio_12_17mph[-1] *= coef
-            windy_ratio_17_24mph[-1] *= coef
-            windy_ratio_24_31mph[-1] *= coef
-            windy_ratio_31_38mph[-1] *= coef
-    
-    # Aggregate all mean weather condition ratios into a single list
-    weather_conditions = [
-        sunny_ratio, partly_cloudy_ratio, windy_ratio_7_12mph, windy_ratio_12_17mph,
-        windy_ratio_17_24mph, windy_ratio_24_31mph, windy_ratio_31_38mph
-    ]
-    
-    return weather_conditions
+    def __iter__(self):
+        return iter(self.years)
 
+    def __len__(self):
+        return len(self.years)
 
-def fit_skewnorm(p5, p50, p95, lower_bound=0, upper_bound=5000):
-    
-    def objective(params):
-        xi, omega, alpha = params
-        return (skewnorm.ppf(0.05, alpha, xi, omega) - p5)**2 + \
-               (skewnorm.ppf(0.50, alpha, xi, omega) - p50)**2 + \
-               (skewnorm.ppf(0.95, alpha, xi, omega) - p95)**2
-    
-    # Bounds for parameters, assuming you have some reasonable range in mind
-    bounds = [(lower_bound, upper_bound), (0.01, 1000), (-100, 100)]
-    
-    result = differential_evolution(objective, bounds)
-    
-    return result.x
+    def __repr__(self):
+        return f'ProjectionView({dict(self)})'
 
-def skewnorm_inv_cdf(probability, xi, omega, alpha):
-    
-    return skewnorm.ppf(probability, alpha, xi, omega)
 
+def projection_views(projections, min_year, max_year, interval, sample=None):
+    """
+    Creates dict-like views of every variable in a projection container over the given years.
 
-def fit_skewed_norm_dist(data, data_type):
-    
-    params = []
-    if data_type == 'population':
-        for i in range(len(data)):
-            p95 = data['95% Upper Bound'].iloc[i] + 0.1
-            p5 = data['95% Lower Bound'].iloc[i] - 0.1
-            p50 = data['Median'].iloc[i] - 0.1
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 2500, 3500)
+    Parameters:
+    - projections: Container from init_projections.
+    - min_year: The starting year.
+    - max_year: The ending year.
+    - interval: The interval between years.
+    - sample: Index of the external sample for batched containers.
 
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'perCapita':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 0.01
-            p5 = data['Low'].iloc[i] - 0.01
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 0.9, 2)
-            
-            params.append([xi_est, omega_est, alpha_est])
-    
-    elif data_type == 'ngPrice':
-        for i in range(len(data)):
-            p95 = data['max'].iloc[i] + 0.1
-            p5 = data['min'].iloc[i] - 0.1
-            p50 = data['median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 0, 10)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'urnPrice':
-        for i in range(len(data)):
-            p95 = data['90p'].iloc[i] + 0.1
-            p5 = data['10p'].iloc[i] - 0.1
-            p50 = data['Mean'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 0, 2)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'hydInv':
-        for i in range(len(data)):
-            p95 = data['Inv Max'].iloc[i] + 1
-            p5 = data['Inv Min'].iloc[i] - 1
-            p50 = data['Inv Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 2200, 2600)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'hydFix':
-        for i in range(len(data)):
-            p95 = data['Fix Max'].iloc[i] + 0.1
-            p5 = data['Fix Min'].iloc[i] - 0.1
-            p50 = data['Fix Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 55, 65)
-            
-            params.append([xi_est, omega_est, alpha_est])
-    
-    elif data_type == 'solInv':
-        for i in range(len(data)):
-            p95 = data['Inv Max'].iloc[i] + 1
-            p5 = data['Inv Min'].iloc[i] - 1
-            p50 = data['Inv Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 400, 1200)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'solFix':
-        for i in range(len(data)):
-            p95 = data['Fix Max'].iloc[i] + 0.1
-            p5 = data['Fix Min'].iloc[i] - 0.1
-            p50 = data['Fix Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 10, 25)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'solCF':
-        for i in range(len(data)):
-            p95 = data['CF Max'].iloc[i]+ 0.01
-            p5 = data['CF Min'].iloc[i] - 0.01
-            p50 = data['CF Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 0.2, 0.5)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'windInv':
-        for i in range(len(data)):
-            p95 = data['Inv Max'].iloc[i] + 1 
-            p5 = data['Inv Min'].iloc[i] - 1
-            p50 = data['Inv Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 500, 1500)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'windFix':
-        for i in range(len(data)):
-            p95 = data['Fix Max'].iloc[i] + 0.1
-            p5 = data['Fix Min'].iloc[i] - 0.1
-            p50 = data['Fix Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 25, 50)
-            
-            params.append([xi_est, omega_est, alpha_est])
-    
-    elif data_type == 'windCF':
-        for i in range(len(data)):
-            p95 = data['CF Max'].iloc[i] + 0.01
-            p5 = data['CF Min'].iloc[i] - 0.01
-            p50 = data['CF Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 0.9, 1.2)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'battInv':
-        for i in range(len(data)):
-            p95 = data['Inv Max'].iloc[i] + 1
-            p5 = data['Inv Min'].iloc[i] - 1
-            p50 = data['Inv Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 900, 3500)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'battFix':
-        for i in range(len(data)):
-            p95 = data['Fix Max'].iloc[i] + 0.1
-            p5 = data['Fix Min'].iloc[i] - 0.1
-            p50 = data['Fix Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 20, 85)
-            
-            params.append([xi_est, omega_est, alpha_est])
-    
-    elif data_type == 'coalPrice':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 0.1
-            p5 = data['Low'].iloc[i] - 0.1
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 3, 4)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'oilPrice':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 0.1
-            p5 = data['Low'].iloc[i] - 0.1
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 10, 16)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'dslPrice':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 0.1
-            p5 = data['Low'].iloc[i] - 0.1
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 17, 22)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'coalInv':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 1
-            p5 = data['Low'].iloc[i] - 1
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 2200, 3500)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-    elif data_type == 'coalFix':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 0.1
-            p5 = data['Low'].iloc[i] - 0.1
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 60, 75)
-            
-            params.append([xi_est, omega_est, alpha_est])
-        
-    elif data_type == 'coalVar':
-        for i in range(len(data)):
-            p95 = data['High'].iloc[i] + 0.01
-            p5 = data['Low'].iloc[i] - 0.01
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 1.5, 2.5)
-            
-            params.append([xi_est, omega_est, alpha_est])
-            
-            
-    elif data_type == 'priceChange':
-        for i in range(len(data)):
-            p95 = data['Max'].iloc[i] + 0.01
-            p5 = data['Min'].iloc[i] - 0.01
-            p50 = data['Median'].iloc[i]
-            
-            xi_est, omega_est, alpha_est = fit_skewnorm(p5, p50, p95, 0.8, 1.2)
-            
-            params.append([xi_est, omega_est, alpha_est])    
-    
-    else:
-        print('wrong input')
-        return -1
-    
-    
-    return np.array(params)
+    Returns:
+    - A list of ProjectionView, in the order of the container's variables.
+    """
+    values = projections['values'] if sample is None else projections['values'][sample]
+    periods = period_slice(min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    return [ProjectionView(values[i, periods], years) for i in projections['variables'].values()]
 
 
-def predict_population(min_year, max_year, interval, data, params):
+def predict_population(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Predicts population sizes based on skewed normal distribution parameters for specified years.
 
@@ -795,32 +2972,36 @@ def predict_population(min_year, max_year, interval, data, params):
     - interval: The interval between prediction years.
     - data: A dictionary containing median population data for each year.
     - params: A NumPy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile: Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - A tuple containing two dictionaries with predicted populations and median populations, and the percentile used for predictions.
     """
-    percentile = np.random.uniform(0, 1)  # Random percentile for population size prediction
-    predicted_population = {}
-    median_population = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)  # Random percentile for population size prediction
+    predicted_population, median_population = projection_views(init_projections(('predicted', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         year_str = str(year)
         median = data['Median'][year]  # Median population for the year
 
         # Predict population size using the inverse CDF of the skew normal distribution
-        predicted_pop = skewnorm_inv_cdf(percentile, *params[param_index]) * 1000
+        predicted_pop = quantiles[i] * 1000
 
         predicted_population[year_str] = predicted_pop
         median_population[year_str] = median * 1000  # Convert to absolute population size
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return predicted_population, median_population, percentile
 
 
 
-def predict_per_capita_consumption(min_year, max_year, interval, data, params):
+def predict_per_capita_consumption(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Predicts per capita energy consumption based on skewed normal distribution parameters for specified years.
 
@@ -830,6 +3011,9 @@ def predict_per_capita_consumption(min_year, max_year, interval, data, params):
     - interval: The interval between prediction years.
     - data: A DataFrame containing median energy consumption data for each year.
     - params: A NumPy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile: Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - A tuple containing two dictionaries with predicted and median per capita energy consumption, and the percentile used for predictions.
@@ -838,28 +3022,29 @@ def predict_per_capita_consumption(min_year, max_year, interval, data, params):
     https://www.eia.gov/outlooks/aeo/data/browser/#/?id=8-AEO2022&region=0-0&cases=ref2022~highmacro~lowmacro&start=2020&end=2050&f=A&linechart=~~~ref2022-d011222a.13-8-AEO2022~highmacro-d011622a.13-8-AEO2022~lowmacro-d011222a.13-8-AEO2022&ctype=linechart&chartindexed=0&sourcekey=0
     Unit: kWh
     """
-    percentile = np.random.uniform(0, 1)
-    predicted_consumption = {}
-    median_consumption = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)
+    predicted_consumption, median_consumption = projection_views(init_projections(('predicted', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         year_str = str(year)
         median = data.loc[year]['Median']
 
         # Coefficient relative to Puerto Rico 2021 electricity production (5602 kWh)
-        coef = skewnorm_inv_cdf(percentile, *params[param_index])
+        coef = quantiles[i]
 
         predicted_consumption[year_str] = 5602 * coef  # kWh
         median_consumption[year_str] = 5602 * median  # kWh
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return predicted_consumption, median_consumption, percentile
 
 
 
-def compute_gas_proj(min_year, max_year, interval, data, params):
+def compute_gas_proj(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Computes projected gas prices based on skewed normal distribution parameters for specified years.
 
@@ -869,6 +3054,9 @@ def compute_gas_proj(min_year, max_year, interval, data, params):
     - interval: The interval between projection years.
     - data: A DataFrame containing median gas price data for each year.
     - params: A NumPy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile: Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - A tuple containing two dictionaries with projected and median gas prices, and the percentile used for projections.
@@ -877,27 +3065,28 @@ def compute_gas_proj(min_year, max_year, interval, data, params):
     https://www.eia.gov/outlooks/aeo/data/browser/#/?id=3-AEO2022&region=1-5&cases=ref2022~highogs~lowogs&start=2020&end=2050&f=A&linechart=~~~ref2022-d011222a.38-3-AEO2022.1-5~highogs-d011222a.38-3-AEO2022.1-5~lowogs-d011222a.38-3-AEO2022.1-5&map=highogs-d011222a.3-3-AEO2022.1-5&sourcekey=0
     Unit: $/MMBTu converted to M$/PJ
     """
-    percentile = np.random.uniform(0, 1)
-    projected_prices = {}
-    median_prices = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)
+    projected_prices, median_prices = projection_views(init_projections(('projected', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         year_str = str(year)
         median = data.loc[year]['median']
 
-        gas_price = skewnorm_inv_cdf(percentile, *params[param_index])
+        gas_price = quantiles[i]
         gas_price *= 0.9487  # Convert $/MMBTu to M$/PJ
 
         projected_prices[year_str] = gas_price
         median_prices[year_str] = median
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return projected_prices, median_prices, percentile
 
 
-def compute_coal_proj(min_year, max_year, interval, data, params):
+def compute_coal_proj(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Computes projected coal prices based on skewed normal distribution parameters for specified years.
 
@@ -907,6 +3096,9 @@ def compute_coal_proj(min_year, max_year, interval, data, params):
     - interval (int): The interval between projection years.
     - data (pd.DataFrame): DataFrame containing median coal price data for each year.
     - params (np.array): Numpy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile (float, optional): Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple[Dict, Dict, float]: A tuple containing two dictionaries with projected and median coal prices, and the percentile used for projections.
@@ -915,27 +3107,28 @@ def compute_coal_proj(min_year, max_year, interval, data, params):
     - Data source: https://www.eia.gov/outlooks/aeo/data/browser
     - Unit: $/MMBTu converted to M$/PJ by multiplying with 0.9478
     """
-    percentile = np.random.uniform(0, 1)
-    projected_prices = {}
-    median_prices = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)
+    projected_prices, median_prices = projection_views(init_projections(('projected', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         median = data.loc[year, 'Median']
         
         # Considering normal distribution
-        coal_price = skewnorm_inv_cdf(percentile, *params[param_index])
+        coal_price = quantiles[i]
         coal_price *= 0.9478  # Convert $/MMBTu to M$/PJ
 
         projected_prices[str(year)] = coal_price
         median_prices[str(year)] = median
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return projected_prices, median_prices, percentile
 
 
-def compute_dsl_proj(min_year, max_year, interval, data, params):
+def compute_dsl_proj(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Computes projected diesel prices based on skewed normal distribution parameters for specified years.
 
@@ -945,6 +3138,9 @@ def compute_dsl_proj(min_year, max_year, interval, data, params):
     - interval (int): The interval between projection years.
     - data (pd.DataFrame): DataFrame containing median diesel price data for each year.
     - params (np.array): Numpy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile (float, optional): Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple[Dict, Dict, float]: A tuple containing two dictionaries with projected and median diesel prices, and the percentile used for projections.
@@ -953,27 +3149,28 @@ def compute_dsl_proj(min_year, max_year, interval, data, params):
     - Data source: https://www.eia.gov/outlooks/aeo/data/browser
     - Unit: $/MMBTu converted to M$/PJ by multiplying with 0.9487
     """
-    percentile = np.random.uniform(0, 1)
-    projected_prices = {}
-    median_prices = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)
+    projected_prices, median_prices = projection_views(init_projections(('projected', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         median = data.loc[year, 'Median']
         
         # Considering normal distribution
-        diesel_price = skewnorm_inv_cdf(percentile, *params[param_index])
+        diesel_price = quantiles[i]
         diesel_price *= 0.9487  # Convert $/MMBTu to M$/PJ
 
         projected_prices[str(year)] = diesel_price
         median_prices[str(year)] = median
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return projected_prices, median_prices, percentile
 
 
-def compute_oil_proj(min_year, max_year, interval, data, params):
+def compute_oil_proj(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Computes projected oil prices based on skewed normal distribution parameters for specified years.
 
@@ -983,6 +3180,9 @@ def compute_oil_proj(min_year, max_year, interval, data, params):
     - interval (int): The interval between projection years.
     - data (pd.DataFrame): DataFrame containing median oil price data for each year.
     - params (np.array): Numpy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile (float, optional): Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple[Dict, Dict, float]: A tuple containing two dictionaries with projected and median oil prices, and the percentile used for projections.
@@ -991,23 +3191,25 @@ def compute_oil_proj(min_year, max_year, interval, data, params):
     - Data source: [EIA Outlooks](https://www.eia.gov/outlooks/aeo/data/browser)
     - Unit: $/MMBTu converted to M$/PJ by multiplying with 0.9487
     """
-    percentile = np.random.uniform(0, 1)
-    projected_prices = {}
-    median_prices = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)
+    projected_prices, median_prices = projection_views(init_projections(('projected', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         median = data.loc[year, 'Median']
-        oil_price = skewnorm_inv_cdf(percentile, *params[param_index])
+        oil_price = quantiles[i]
         oil_price *= 0.9487  # Convert $/MMBTu to M$/PJ
         projected_prices[str(year)] = oil_price
         median_prices[str(year)] = median
-        param_index += 5  # Assuming parameters are spaced 5 years apart
 
     return projected_prices, median_prices, percentile
 
 
-def compute_uranium_proj(min_year, max_year, interval, data, params):
+def compute_uranium_proj(min_year, max_year, interval, data, params, percentile=None, quantiles=None):
     """
     Computes projected uranium prices based on skewed normal distribution parameters for specified years.
 
@@ -1017,6 +3219,9 @@ def compute_uranium_proj(min_year, max_year, interval, data, params):
     - interval: The interval between projection years.
     - data: A DataFrame containing median uranium price data for each year.
     - params: A NumPy array containing the parameters (location, scale, shape) for the skew normal distribution.
+    - percentile: Percentile to use (e.g. from outer_sample_design); drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - A tuple containing two dictionaries with projected and median uranium prices, and the percentile used for projections.
@@ -1025,27 +3230,28 @@ def compute_uranium_proj(min_year, max_year, interval, data, params):
     - The price conversion factor was originally set to 4.23e-3 ($/kg to M$/PJ) based on the energy content of uranium.
       This has been replaced with a generic conversion factor of 0.9487 for consistency with the gas projections.
     """
-    percentile = np.random.uniform(0, 1)
-    projected_prices = {}
-    median_prices = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile is None:
+        percentile = np.random.uniform(0, 1)
+    projected_prices, median_prices = projection_views(init_projections(('projected', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile, params[:5 * len(years):5])
+
+    for i, year in enumerate(years):
         year_str = str(year)
         median = data.loc[year]['Median']
 
-        uranium_price = skewnorm_inv_cdf(percentile, *params[param_index])
+        uranium_price = quantiles[i]
         uranium_price *= 0.9487  # Convert $/MMBTu to M$/PJ
 
         projected_prices[year_str] = uranium_price
         median_prices[year_str] = median
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return projected_prices, median_prices, percentile
 
 
-def compute_battery_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params):
+def compute_battery_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params, percentile_inv=None, percentile_fix=None, inv_quantiles=None, fix_quantiles=None):
     """
     Computes projected battery storage costs and capacity factors for specified years based on skewed normal distribution parameters.
 
@@ -1058,6 +3264,9 @@ def compute_battery_proj(min_year, max_year, interval, inv_data, fix_data, cf_da
     - cf_data: A DataFrame containing capacity factor data for each year.
     - inv_params: A NumPy array containing the parameters (location, scale, shape) for the investment cost distribution.
     - fix_params: A NumPy array containing the parameters (location, scale, shape) for the fixed cost distribution.
+    - percentile_inv, percentile_fix: Percentiles to use (e.g. from outer_sample_design); drawn at random if None.
+    - inv_quantiles, fix_quantiles: Optional projection values of the years, precomputed for the
+      percentiles (e.g. by batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple containing dictionaries of projected and median investment costs, fixed costs, and capacity factors, along with the percentiles used for investment and fixed cost projections.
@@ -1065,26 +3274,32 @@ def compute_battery_proj(min_year, max_year, interval, inv_data, fix_data, cf_da
     Source for data methodology:
     NREL
     """
-    percentile_inv = np.random.uniform(0, 1)
-    percentile_fix = np.random.uniform(0, 1)
-
-    inv_costs, fix_costs = {}, {}
-    md_inv_costs, md_fix_costs = {}, {}
-    cfs = {}
-
-    param_index = 0
-    for year in range(min_year, max_year + interval, interval):
+    if percentile_inv is None:
+        percentile_inv = np.random.uniform(0, 1)
+    if percentile_fix is None:
+        percentile_fix = np.random.uniform(0, 1)
+
+    inv_costs, md_inv_costs, fix_costs, md_fix_costs, cfs = \
+        projection_views(init_projections(('inv', 'md_inv', 'fix', 'md_fix', 'cf')), min_year, max_year, interval)
+
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows of the projection years, evaluated in one call
+    if inv_quantiles is None:
+        inv_quantiles = skewnorm_ppf_batch(percentile_inv, inv_params[:len(years)])
+    if fix_quantiles is None:
+        fix_quantiles = skewnorm_ppf_batch(percentile_fix, fix_params[:len(years)])
+    for i, year in enumerate(years):
         year_str = str(year)
 
         # Investment costs
         median_inv = inv_data.loc[year]['Inv Median']
-        inv_price = skewnorm_inv_cdf(percentile_inv, *inv_params[param_index])
+        inv_price = inv_quantiles[i]
         inv_costs[year_str] = inv_price
         md_inv_costs[year_str] = median_inv
 
         # Fixed costs
         median_fix = fix_data.loc[year]['Fix Median']
-        fix_price = skewnorm_inv_cdf(percentile_fix, *fix_params[param_index])
+        fix_price = fix_quantiles[i]
         fix_costs[year_str] = fix_price
         md_fix_costs[year_str] = median_fix
 
@@ -1092,12 +3307,10 @@ def compute_battery_proj(min_year, max_year, interval, inv_data, fix_data, cf_da
         cf = cf_data.loc[year]['CF']
         cfs[year_str] = cf
 
-        param_index += 1
-
     return inv_costs, md_inv_costs, fix_costs, md_fix_costs, cfs, percentile_inv, percentile_fix
 
 
-def compute_ecoal_proj(min_year, max_year, interval, inv_data, fix_data, var_data, inv_params, fix_params, var_params):
+def compute_ecoal_proj(min_year, max_year, interval, inv_data, fix_data, var_data, inv_params, fix_params, var_params, percentile_inv=None, percentile_fix=None, percentile_var=None, inv_quantiles=None, fix_quantiles=None, var_quantiles=None):
     """
     Computes projected costs for eCoal (electricity from coal) based on investment, fixed, and variable costs.
 
@@ -1111,6 +3324,9 @@ def compute_ecoal_proj(min_year, max_year, interval, inv_data, fix_data, var_dat
     - inv_params (np.array): Parameters for the skewed normal distribution of investment costs.
     - fix_params (np.array): Parameters for the skewed normal distribution of fixed costs.
     - var_params (np.array): Parameters for the skewed normal distribution of variable costs.
+    - percentile_inv, percentile_fix, percentile_var (float, optional): Percentiles to use (e.g. from outer_sample_design); drawn at random if None.
+    - inv_quantiles, fix_quantiles, var_quantiles: Optional projection values of the years, precomputed for the
+      percentiles (e.g. by batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - A tuple containing dictionaries for investment, fixed, and variable costs, their corresponding median costs, 
@@ -1120,46 +3336,50 @@ def compute_ecoal_proj(min_year, max_year, interval, inv_data, fix_data, var_dat
     - Assumes costs are projected using a skewed normal distribution.
     - The 'Median' column is expected in each of the data inputs (inv_data, fix_data, var_data).
     """
-    percentile_inv = np.random.uniform(0, 1)
-    percentile_fix = np.random.uniform(0, 1)
-    percentile_var = np.random.uniform(0, 1)
-
-    inv_costs = {}
-    fix_costs = {}
-    var_costs = {}
-    md_inv_costs = {}
-    md_fix_costs = {}
-    md_var_costs = {}
-    param_index = 0
-
-    for year in range(min_year, max_year + interval, interval):
+    if percentile_inv is None:
+        percentile_inv = np.random.uniform(0, 1)
+    if percentile_fix is None:
+        percentile_fix = np.random.uniform(0, 1)
+    if percentile_var is None:
+        percentile_var = np.random.uniform(0, 1)
+
+    inv_costs, md_inv_costs, fix_costs, md_fix_costs, var_costs, md_var_costs = \
+        projection_views(init_projections(('inv', 'md_inv', 'fix', 'md_fix', 'var', 'md_var')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows of the projection years, evaluated in one call
+    if inv_quantiles is None:
+        inv_quantiles = skewnorm_ppf_batch(percentile_inv, inv_params[:len(years)])
+    if fix_quantiles is None:
+        fix_quantiles = skewnorm_ppf_batch(percentile_fix, fix_params[:len(years)])
+    if var_quantiles is None:
+        var_quantiles = skewnorm_ppf_batch(percentile_var, var_params[:len(years)])
+
+    for i, year in enumerate(years):
         year_str = str(year)
 
         # Investment Costs
         median_inv = inv_data.loc[year, 'Median']
-        inv_cost = skewnorm_inv_cdf(percentile_inv, *inv_params[param_index])
+        inv_cost = inv_quantiles[i]
         inv_costs[year_str] = inv_cost
         md_inv_costs[year_str] = median_inv
 
         # Fixed Costs
         median_fix = fix_data.loc[year, 'Median']
-        fix_cost = skewnorm_inv_cdf(percentile_fix, *fix_params[param_index])
+        fix_cost = fix_quantiles[i]
         fix_costs[year_str] = fix_cost
         md_fix_costs[year_str] = median_fix
 
         # Variable Costs
         median_var = var_data.loc[year, 'Median']
-        var_cost = skewnorm_inv_cdf(percentile_var, *var_params[param_index])
+        var_cost = var_quantiles[i]
         var_costs[year_str] = var_cost
         md_var_costs[year_str] = median_var
 
-        param_index += 1
-
     return inv_costs, md_inv_costs, fix_costs, md_fix_costs, var_costs, md_var_costs, percentile_inv, percentile_fix, percentile_var
 
 
 
-def compute_solar_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params, cf_params):
+def compute_solar_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params, cf_params, percentile_inv=None, percentile_fix=None, percentile_cf=None, inv_quantiles=None, fix_quantiles=None):
     """
     Computes projected solar energy investment and fixed costs, along with capacity factors for specified years.
 
@@ -1173,6 +3393,9 @@ def compute_solar_proj(min_year, max_year, interval, inv_data, fix_data, cf_data
     - inv_params: A NumPy array containing the parameters (location, scale, shape) for the investment cost distribution.
     - fix_params: A NumPy array containing the parameters (location, scale, shape) for the fixed cost distribution.
     - cf_params: A NumPy array containing the parameters (location, scale, shape) for the capacity factor distribution.
+    - percentile_inv, percentile_fix, percentile_cf: Percentiles to use (e.g. from outer_sample_design); drawn at random if None.
+    - inv_quantiles, fix_quantiles: Optional projection values of the years, precomputed for the
+      percentiles (e.g. by batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple containing dictionaries of projected and median investment costs, fixed costs, and capacity factors, along with the percentiles used for each projection.
@@ -1180,41 +3403,48 @@ def compute_solar_proj(min_year, max_year, interval, inv_data, fix_data, cf_data
     Notes:
     - Based on NREL ATB 2022 projections.
     """
-    percentile_inv = np.random.uniform(0, 1)
-    percentile_fix = np.random.uniform(0, 1)
-    percentile_cf = np.random.uniform(0, 1)
-
-    inv_costs, fix_costs, cfs = {}, {}, {}
-    md_inv_costs, md_fix_costs, md_cfs = {}, {}, {}
-
-    param_index = 0
-    for year in range(min_year, max_year + interval, interval):
+    if percentile_inv is None:
+        percentile_inv = np.random.uniform(0, 1)
+    if percentile_fix is None:
+        percentile_fix = np.random.uniform(0, 1)
+    if percentile_cf is None:
+        percentile_cf = np.random.uniform(0, 1)
+
+    inv_costs, md_inv_costs, fix_costs, md_fix_costs, cfs, md_cfs = \
+        projection_views(init_projections(('inv', 'md_inv', 'fix', 'md_fix', 'cf', 'md_cf')), min_year, max_year, interval)
+
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows of the projection years, evaluated in one call
+    if inv_quantiles is None:
+        inv_quantiles = skewnorm_ppf_batch(percentile_inv, inv_params[:len(years)])
+    if fix_quantiles is None:
+        fix_quantiles = skewnorm_ppf_batch(percentile_fix, fix_params[:len(years)])
+    cf_quantiles = skewnorm_ppf_batch(percentile_cf, cf_params[:len(years)])
+    for i, year in enumerate(years):
         year_str = str(year)
 
         # Investment costs
         median_inv = inv_data.loc[year]['Inv Median']
-        inv_price = skewnorm_inv_cdf(percentile_inv, *inv_params[param_index])
+        inv_price = inv_quantiles[i]
         inv_costs[year_str] = inv_price
         md_inv_costs[year_str] = median_inv
 
         # Fixed costs
         median_fix = fix_data.loc[year]['Fix Median']
-        fix_price = skewnorm_inv_cdf(percentile_fix, *fix_params[param_index])
+        fix_price = fix_quantiles[i]
         fix_costs[year_str] = fix_price
         md_fix_costs[year_str] = median_fix
 
         # Capacity factors
         median_cf = cf_data.loc[year]['CF Median']
-        cf = skewnorm_inv_cdf(percentile_cf, *cf_params[param_index])
+        cf = cf_quantiles[i]
         cfs[year_str] = cf
         md_cfs[year_str] = median_cf
 
-        param_index += 1
-
     return inv_costs, md_inv_costs, fix_costs, md_fix_costs, cfs, md_cfs, percentile_inv, percentile_fix, percentile_cf
 
 
-def compute_wind_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params, cf_params):
+def compute_wind_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params, cf_params, percentile_inv=None, percentile_fix=None, percentile_cf=None, inv_quantiles=None, fix_quantiles=None):
     """
     Computes projected wind energy investment and fixed costs, along with changes in capacity factors, for specified years.
 
@@ -1228,6 +3458,9 @@ def compute_wind_proj(min_year, max_year, interval, inv_data, fix_data, cf_data,
     - inv_params: A NumPy array containing the parameters (location, scale, shape) for the investment cost distribution.
     - fix_params: A NumPy array containing the parameters (location, scale, shape) for the fixed cost distribution.
     - cf_params: A NumPy array containing the parameters (location, scale, shape) for the capacity factor change distribution.
+    - percentile_inv, percentile_fix, percentile_cf: Percentiles to use (e.g. from outer_sample_design); drawn at random if None.
+    - inv_quantiles, fix_quantiles: Optional projection values of the years, precomputed for the
+      percentiles (e.g. by batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple containing dictionaries of projected and median investment costs, fixed costs, and capacity factor changes, along with the percentiles used for each projection.
@@ -1235,41 +3468,48 @@ def compute_wind_proj(min_year, max_year, interval, inv_data, fix_data, cf_data,
     Notes:
     - Based on NREL ATB 2022 projections.
     """
-    percentile_inv = np.random.uniform(0, 1)
-    percentile_fix = np.random.uniform(0, 1)
-    percentile_cf = np.random.uniform(0, 1)
-
-    inv_costs, fix_costs, cf_changes = {}, {}, {}
-    md_inv_costs, md_fix_costs, md_cf_changes = {}, {}, {}
-
-    param_index = 0
-    for year in range(min_year, max_year + interval, interval):
+    if percentile_inv is None:
+        percentile_inv = np.random.uniform(0, 1)
+    if percentile_fix is None:
+        percentile_fix = np.random.uniform(0, 1)
+    if percentile_cf is None:
+        percentile_cf = np.random.uniform(0, 1)
+
+    inv_costs, md_inv_costs, fix_costs, md_fix_costs, cf_changes, md_cf_changes = \
+        projection_views(init_projections(('inv', 'md_inv', 'fix', 'md_fix', 'cf_change', 'md_cf_change')), min_year, max_year, interval)
+
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows of the projection years, evaluated in one call
+    if inv_quantiles is None:
+        inv_quantiles = skewnorm_ppf_batch(percentile_inv, inv_params[:len(years)])
+    if fix_quantiles is None:
+        fix_quantiles = skewnorm_ppf_batch(percentile_fix, fix_params[:len(years)])
+    cf_quantiles = skewnorm_ppf_batch(percentile_cf, cf_params[:len(years)])
+    for i, year in enumerate(years):
         year_str = str(year)
 
         # Investment costs
         median_inv = inv_data.loc[year]['Inv Median']
-        inv_price = skewnorm_inv_cdf(percentile_inv, *inv_params[param_index])
+        inv_price = inv_quantiles[i]
         inv_costs[year_str] = inv_price
         md_inv_costs[year_str] = median_inv
 
         # Fixed costs
         median_fix = fix_data.loc[year]['Fix Median']
-        fix_price = skewnorm_inv_cdf(percentile_fix, *fix_params[param_index])
+        fix_price = fix_quantiles[i]
         fix_costs[year_str] = fix_price
         md_fix_costs[year_str] = median_fix
 
         # Capacity factor changes
         median_cf_change = cf_data.loc[year]['CF Median']
-        cf_change = skewnorm_inv_cdf(percentile_cf, *cf_params[param_index])
+        cf_change = cf_quantiles[i]
         cf_changes[year_str] = cf_change
         md_cf_changes[year_str] = median_cf_change
 
-        param_index += 1
-
     return inv_costs, md_inv_costs, fix_costs, md_fix_costs, cf_changes, md_cf_changes, percentile_inv, percentile_fix, percentile_cf
 
 
-def compute_hydro_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params):
+def compute_hydro_proj(min_year, max_year, interval, inv_data, fix_data, cf_data, inv_params, fix_params, percentile_inv=None, percentile_fix=None, inv_quantiles=None, fix_quantiles=None):
     """
     Computes projected hydroelectric energy investment and fixed costs for specified years based on skewed normal distribution parameters.
     It also includes the capacity factor data directly without projection.
@@ -1283,6 +3523,9 @@ def compute_hydro_proj(min_year, max_year, interval, inv_data, fix_data, cf_data
     - cf_data: A DataFrame containing capacity factor data for each year.
     - inv_params: A NumPy array containing the parameters (location, scale, shape) for the investment cost distribution.
     - fix_params: A NumPy array containing the parameters (location, scale, shape) for the fixed cost distribution.
+    - percentile_inv, percentile_fix: Percentiles to use (e.g. from outer_sample_design); drawn at random if None.
+    - inv_quantiles, fix_quantiles: Optional projection values of the years, precomputed for the
+      percentiles (e.g. by batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple containing dictionaries of projected and median investment costs, fixed costs, and capacity factors, along with the percentiles used for investment and fixed cost projections.
@@ -1290,26 +3533,32 @@ def compute_hydro_proj(min_year, max_year, interval, inv_data, fix_data, cf_data
     Notes:
     - Based on NREL ATB 2022 projections.
     """
-    percentile_inv = np.random.uniform(0, 1)
-    percentile_fix = np.random.uniform(0, 1)
-
-    inv_costs, fix_costs = {}, {}
-    cf_values = {}
-    md_inv_costs, md_fix_costs = {}, {}
-
-    param_index = 0
-    for year in range(min_year, max_year + interval, interval):
+    if percentile_inv is None:
+        percentile_inv = np.random.uniform(0, 1)
+    if percentile_fix is None:
+        percentile_fix = np.random.uniform(0, 1)
+
+    inv_costs, md_inv_costs, fix_costs, md_fix_costs, cf_values = \
+        projection_views(init_projections(('inv', 'md_inv', 'fix', 'md_fix', 'cf')), min_year, max_year, interval)
+
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows of the projection years, evaluated in one call
+    if inv_quantiles is None:
+        inv_quantiles = skewnorm_ppf_batch(percentile_inv, inv_params[:len(years)])
+    if fix_quantiles is None:
+        fix_quantiles = skewnorm_ppf_batch(percentile_fix, fix_params[:len(years)])
+    for i, year in enumerate(years):
         year_str = str(year)
 
         # Investment costs
         median_inv = inv_data.loc[year]['Inv Median']
-        inv_price = skewnorm_inv_cdf(percentile_inv, *inv_params[param_index])
+        inv_price = inv_quantiles[i]
         inv_costs[year_str] = inv_price
         md_inv_costs[year_str] = median_inv
 
         # Fixed costs
         median_fix = fix_data.loc[year]['Fix Median']
-        fix_price = skewnorm_inv_cdf(percentile_fix, *fix_params[param_index])
+        fix_price = fix_quantiles[i]
         fix_costs[year_str] = fix_price
         md_fix_costs[year_str] = median_fix
 
@@ -1317,8 +3566,6 @@ def compute_hydro_proj(min_year, max_year, interval, inv_data, fix_data, cf_data
         cf = cf_data.loc[year]['CF']
         cf_values[year_str] = cf
 
-        param_index += 1
-
     return inv_costs, md_inv_costs, fix_costs, md_fix_costs, cf_values, percentile_inv, percentile_fix
 
 
@@ -1340,9 +3587,7 @@ def compute_nuclear_proj(min_year, max_year, interval, inv_data, fix_data, var_d
     Notes:
     - Projections are based on the NREL ATB 2022 data.
     """
-    inv_costs = {}
-    fix_costs = {}
-    var_costs = {}
+    inv_costs, fix_costs, var_costs = projection_views(init_projections(('inv', 'fix', 'var')), min_year, max_year, interval)
 
     for year in range(min_year, max_year + interval, interval):
         year_str = str(year)
@@ -1379,9 +3624,7 @@ def compute_ngcc_proj(min_year, max_year, interval, inv_data, fix_data, var_data
     Notes:
     - Projections are based on data, such as the NREL ATB 2022, or other relevant datasets.
     """
-    inv_costs = {}
-    fix_costs = {}
-    var_costs = {}
+    inv_costs, fix_costs, var_costs = projection_views(init_projections(('inv', 'fix', 'var')), min_year, max_year, interval)
 
     for year in range(min_year, max_year + interval, interval):
         year_str = str(year)
@@ -1417,9 +3660,7 @@ def compute_bio_proj(min_year, max_year, interval, inv_data, fix_data, var_data)
     Notes:
     - The costs are obtained directly from the provided data, assuming they are deterministic for the given years.
     """
-    inv_costs = {}
-    fix_costs = {}
-    var_costs = {}
+    inv_costs, fix_costs, var_costs = projection_views(init_projections(('inv', 'fix', 'var')), min_year, max_year, interval)
 
     for year in range(min_year, max_year + interval, interval):
         year_str = str(year)
@@ -1438,13 +3679,16 @@ def compute_bio_proj(min_year, max_year, interval, inv_data, fix_data, var_data)
 
 
 
-def generate_dependant_uniform(first_uniform, correlation):
+def generate_dependant_uniform(first_uniform, correlation, independent_uniform=None):
     
     # Convert the first uniform variable to a standard normal variable
     first_normal = scipy.stats.norm.ppf(first_uniform)
 
-    # Generate an independent standard normal variable
-    independent_normal = np.random.normal(0, 1)
+    # Generate an independent standard normal variable, or take it from the given independent uniform
+    if independent_uniform is None:
+        independent_normal = np.random.normal(0, 1)
+    else:
+        independent_normal = scipy.stats.norm.ppf(independent_uniform)
 
     # Apply the correlation using the formula for conditional expectation in a bivariate normal distribution
     second_normal = correlation * first_normal + np.sqrt(1 - correlation**2) * independent_normal
@@ -1455,7 +3699,7 @@ def generate_dependant_uniform(first_uniform, correlation):
     return second_uniform
 
 
-def compute_elc_price_proj(min_year, max_year, interval, price_change_data, params, per_capita_percentile):
+def compute_elc_price_proj(min_year, max_year, interval, price_change_data, params, per_capita_percentile, independent_percentile=None, quantiles=None):
     """
     Computes projected electricity prices based on skewed normal distribution parameters for specified years.
 
@@ -1466,27 +3710,31 @@ def compute_elc_price_proj(min_year, max_year, interval, price_change_data, para
     - price_change_data: A DataFrame containing median price change data for each year.
     - params: A NumPy array containing the parameters (location, scale, shape) for the price change distribution.
     - per_capita_percentile: The percentile used as a base for generating the dependent electricity price percentile.
+    - independent_percentile: Optional percentile (e.g. from outer_sample_design) for the independent part of the
+      electricity price percentile; drawn at random if None.
+    - quantiles: Optional projection values of the years, precomputed for the dependent percentile (e.g. by
+      batch_projection_quantiles); evaluated here if None.
 
     Returns:
     - Tuple containing dictionaries of projected electricity prices, median prices, and the electricity price percentile.
     """
-    percentile_elc = generate_dependant_uniform(per_capita_percentile, 0.573)
+    percentile_elc = generate_dependant_uniform(per_capita_percentile, 0.573, independent_percentile)
 
-    elc_prices = {}
-    median_prices = {}
-    param_index = 4  # Assuming starting index is 4 for some reason, could be clarified
+    elc_prices, median_prices = projection_views(init_projections(('projected', 'median')), min_year, max_year, interval)
+    years = range(min_year, max_year + interval, interval)
+    # Parameter rows spaced 5 years apart from index 4, evaluated in one call
+    if quantiles is None:
+        quantiles = skewnorm_ppf_batch(percentile_elc, params[4:4 + 5 * len(years):5])
 
-    for year in range(min_year, max_year + interval, interval):
+    for i, year in enumerate(years):
         year_str = str(year)
         median = price_change_data.loc[year]['Median']
 
         # Projected electricity price
-        elc_price = skewnorm_inv_cdf(percentile_elc, *params[param_index])
+        elc_price = quantiles[i]
         elc_prices[year_str] = elc_price
         median_prices[year_str] = median
 
-        param_index += 5  # Assuming parameters are spaced 5 years apart
-
     return elc_prices, median_prices, percentile_elc
     
    
@@ -1541,118 +3789,155 @@ def run_temoa(temoa_path, sql_path, sql_name, config_path, config_name):
 
 
 
-def compute_normal_op_costs_fd(caps, acts, sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, nuc_fix_50, hyd_fix_50, 
-                            ngcc_var_50, nuc_var_50, trans_var_50, cond_var_50, ng_var_50, urn_var_50, added_cost_ratio):
-    """
-    Computes the normal operational costs for various energy technologies based on their capacities and activities.
-
-    Parameters:
-    - caps: Dictionary containing capacities for various energy sources.
-    - acts: Dictionary containing activities for various energy sources.
-    - sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, nuc_fix_50, hyd_fix_50: Fixed costs for solar, wind, battery, NGCC, nuclear, and hydro respectively.
-    - ngcc_var_50, nuc_var_50, trans_var_50, cond_var_50, ng_var_50, urn_var_50: Variable costs for NGCC, nuclear, transmission, conduction, natural gas, and uranium respectively.
-    - added_cost_ratio: Additional cost ratio applied specifically to nuclear operations.
-
-    Returns:
-    - Total operational cost in million units, and individual operational costs for solar, wind, battery, hydro, nuclear (including uranium), NGCC (including natural gas), transmission, and conduction.
-    """
-    sol_cost = sol_fix_50 * caps['E_SOLPV']
-    wind_cost = wind_fix_50 * caps['E_WIND']
-    batt_cost = batt_fix_50 * caps['E_BATT']
-    nuc_cost = (nuc_fix_50 * caps['E_NUCLEAR'] + nuc_var_50 * acts['E_NUCLEAR']) * added_cost_ratio
-    hyd_cost = hyd_fix_50 * caps['E_HYDRO']
-    ngcc_cost = ngcc_fix_50 * caps['E_NGCC'] + ngcc_var_50 * acts['E_NGCC']
-    trans_cost = trans_var_50 * acts['E_TRANS']
-    cond_cost = cond_var_50 * acts['E_COND']
-    ng_cost = ng_var_50 * acts['S_IMPNG']
-    urn_cost = urn_var_50 * acts['S_IMPURN']
-
-    # Total operational cost
-    op_cost = sum([sol_cost, wind_cost, batt_cost, hyd_cost, nuc_cost, ngcc_cost, trans_cost, cond_cost, ng_cost, urn_cost])
-
-    # Multiply by 10^6 to convert to million units
-    return op_cost * 10**6, sol_cost, wind_cost, batt_cost, hyd_cost, nuc_cost, ngcc_cost + ng_cost, trans_cost, cond_cost
-
-    
-def compute_normal_op_costs_bau(caps, acts, sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, coal_fix_50, dsl_fix_50, oil_fix_50, nuc_fix_50, hyd_fix_50, bio_fix_50, biofuel_50,
-                                ngcc_var_50, ecoal_var_50, edsl_var_50, eoil_var_50, nuc_var_50, bio_var_50, trans_var_50, cond_var_50, ng_var_50, coal_var_50, dsl_var_50, oil_var_50, urn_var_50, added_cost_ratio):
+# Operational costs of each scenario over a shared technology axis: for every technology, the op_cost_args entries of
+# its fixed cost, applied to its capacity, and of its variable cost, applied to its activity (None for no cost), the
+# op-ratio column it is reported in (None for the fuel costs only in the total), whether the added cost ratio of the
+# dispatch beyond the maximum activity applies to it and whether it enters the total operational cost
+OP_COST_SCENARIOS = {
+    'bau': {
+        'args': ['sol_fix_50', 'wind_fix_50', 'batt_fix_50', 'ngcc_fix_50', 'ecoal_fix_50', 'edsl_fix_50', 'eoil_fix_50', 'nuc_fix_50',
+                 'hyd_fix_50', 'bio_fix_50', 'biofuel_price', 'ngcc_var_50', 'ecoal_var_50', 'edsl_var_50', 'eoil_var_50', 'nuc_var_50',
+                 'bio_var_50', 'trans_var_50', 'cond_var_50', 'ng_var_50', 'coal_var_50', 'dsl_var_50', 'oil_var_50', 'urn_var_50'],
+        'outputs': ['sol', 'wind', 'batt', 'hyd', 'bio', 'nuc', 'ngcc', 'ecoal', 'edsl', 'eoil', 'trans', 'cond'],
+        'techs': [
+            ('E_SOLPV', 'sol_fix_50', None, 'sol', False, True),
+            ('E_WIND', 'wind_fix_50', None, 'wind', False, True),
+            ('E_BATT', 'batt_fix_50', None, 'batt', False, True),
+            ('E_HYDRO', 'hyd_fix_50', None, 'hyd', False, True),
+            ('E_BIO', 'bio_fix_50', 'bio_var_50', 'bio', False, True),
+            ('S_IMPBIO', None, 'biofuel_price', 'bio', False, True),
+            ('E_NUCLEAR', 'nuc_fix_50', 'nuc_var_50', 'nuc', False, True),
+            ('E_NGCC', 'ngcc_fix_50', 'ngcc_var_50', 'ngcc', True, True),
+            ('E_COAL', 'ecoal_fix_50', 'ecoal_var_50', 'ecoal', False, True),
+            ('E_DSL', 'edsl_fix_50', 'edsl_var_50', 'edsl', False, True),
+            ('E_OIL', 'eoil_fix_50', 'eoil_var_50', 'eoil', False, True),
+            ('E_TRANS', None, 'trans_var_50', 'trans', False, True),
+            ('E_COND', None, 'cond_var_50', 'cond', False, True),
+            ('S_IMPNG', None, 'ng_var_50', None, False, True),
+            ('S_IMPCOAL', None, 'coal_var_50', None, False, True),
+            ('S_IMPDSL', None, 'dsl_var_50', None, False, True),
+            ('S_IMPOIL', None, 'oil_var_50', None, False, True),
+            ('S_IMPURN', None, 'urn_var_50', None, False, True),
+        ],
+    },
+    'fd': {
+        'args': ['sol_fix_50', 'wind_fix_50', 'batt_fix_50', 'ngcc_fix_50', 'nuc_fix_50', 'hyd_fix_50', 'ngcc_var_50', 'nuc_var_50',
+                 'trans_var_50', 'cond_var_50', 'ng_var_50', 'urn_var_50'],
+        'outputs': ['sol', 'wind', 'batt', 'hyd', 'ngcc', 'nuc', 'trans', 'cond'],
+        'techs': [
+            ('E_SOLPV', 'sol_fix_50', None, 'sol', False, True),
+            ('E_WIND', 'wind_fix_50', None, 'wind', False, True),
+            ('E_BATT', 'batt_fix_50', None, 'batt', False, True),
+            ('E_HYDRO', 'hyd_fix_50', None, 'hyd', False, True),
+            ('E_NUCLEAR', 'nuc_fix_50', 'nuc_var_50', 'nuc', True, True),
+            ('E_NGCC', 'ngcc_fix_50', 'ngcc_var_50', 'ngcc', False, True),
+            ('E_TRANS', None, 'trans_var_50', 'trans', False, True),
+            ('E_COND', None, 'cond_var_50', 'cond', False, True),
+            ('S_IMPNG', None, 'ng_var_50', 'ngcc', False, True),
+            ('S_IMPURN', None, 'urn_var_50', None, False, True),
+        ],
+    },
+    'fr': {
+        'args': ['sol_fix_50', 'wind_fix_50', 'batt_fix_50', 'ngcc_fix_50', 'nuc_fix_50', 'hyd_fix_50', 'bio_fix_50', 'ngcc_var_50',
+                 'nuc_var_50', 'bio_var_50', 'biofuel_price', 'trans_var_50', 'cond_var_50', 'ng_var_50', 'urn_var_50'],
+        'outputs': ['sol', 'wind', 'batt', 'hyd', 'bio', 'ngcc', 'nuc', 'trans', 'cond'],
+        'techs': [
+            ('E_SOLPV', 'sol_fix_50', None, 'sol', False, True),
+            ('E_WIND', 'wind_fix_50', None, 'wind', False, True),
+            ('E_BATT', 'batt_fix_50', None, 'batt', False, True),
+            ('E_HYDRO', 'hyd_fix_50', None, 'hyd', False, True),
+            ('E_BIO', 'bio_fix_50', 'bio_var_50', 'bio', True, True),
+            ('E_NGCC', 'ngcc_fix_50', 'ngcc_var_50', 'ngcc', False, True),
+            ('E_NUCLEAR', 'nuc_fix_50', 'nuc_var_50', 'nuc', False, False),
+            ('E_TRANS', None, 'trans_var_50', 'trans', False, True),
+            ('E_COND', None, 'cond_var_50', 'cond', False, True),
+            ('S_IMPNG', None, 'ng_var_50', None, False, True),
+            ('S_IMPURN', None, 'urn_var_50', None, False, True),
+            ('S_IMPBIO', None, 'biofuel_price', None, False, True),
+        ],
+    },
+}
+
+
+def build_op_cost_kernel(scenario):
     """
-    Computes the operational costs for various energy technologies based on their capacities and activities in a business-as-usual scenario.
+    Builds the technology-indexed operational cost kernel of a scenario from its entry in OP_COST_SCENARIOS, as one
+    cost term per capacity or activity of a technology with a unit cost.
 
     Parameters:
-    - caps (dict): Capacities for various energy sources.
-    - acts (dict): Activities for various energy sources.
-    - Fixed and variable costs for solar, wind, battery, NGCC, coal, diesel, oil, nuclear, hydro, and biofuel technologies.
-    - added_cost_ratio (float): Additional cost ratio applied to specific operations, influencing the total operational cost.
+    - scenario: 'bau', 'fd' or 'fr'.
 
     Returns:
-    - Total operational cost (in million units) and individual operational costs for each energy technology.
+    - A dictionary with the 'terms' ('cap' or 'act', technology), the 'cost_index' of their unit costs in op_cost_args,
+      the 'outputs' (names of the op-ratio columns), the 'output_matrix' of shape (n_outputs, n_terms) summing the
+      terms into the columns, the indices of the 'surcharged' terms and the 'in_total' mask of the terms.
     """
-    # Operational costs for renewable and non-renewable sources
-    sol_cost = sol_fix_50 * caps['E_SOLPV']
-    wind_cost = wind_fix_50 * caps['E_WIND']
-    batt_cost = batt_fix_50 * caps['E_BATT']
-    hyd_cost = hyd_fix_50 * caps['E_HYDRO']
-    bio_cost = (bio_fix_50 * caps['E_BIO'] + bio_var_50 * acts['E_BIO']) + biofuel_50 * acts['S_IMPBIO']
-
-    # Operational costs for nuclear energy, considering additional cost ratio
-    nuc_cost = (nuc_fix_50 * caps['E_NUCLEAR'] + nuc_var_50 * acts['E_NUCLEAR']) 
-    
-    # Operational costs for fossil fuel technologies
-    ngcc_cost = (ngcc_fix_50 * caps['E_NGCC'] + ngcc_var_50 * acts['E_NGCC']) * added_cost_ratio
-    ecoal_cost = coal_fix_50 * caps['E_COAL'] + ecoal_var_50 * acts['E_COAL']
-    edsl_cost = dsl_fix_50 * caps['E_DSL'] + edsl_var_50 * acts['E_DSL']
-    eoil_cost = oil_fix_50 * caps['E_OIL'] + eoil_var_50 * acts['E_OIL']
-    
-    # Operational costs for transmission and conduction
-    trans_cost = trans_var_50 * acts['E_TRANS']
-    cond_cost = cond_var_50 * acts['E_COND']
-    
-    # Costs associated with raw materials and fuels
-    ng_cost = ng_var_50 * acts['S_IMPNG']
-    coal_cost = coal_var_50 * acts['S_IMPCOAL']
-    dsl_cost = dsl_var_50 * acts['S_IMPDSL']
-    oil_cost = oil_var_50 * acts['S_IMPOIL']
-    urn_cost = urn_var_50 * acts['S_IMPURN']
-    
-    # Total operational cost in million units
-    op_cost = sum([sol_cost, wind_cost, batt_cost, hyd_cost, bio_cost, nuc_cost, ngcc_cost, ecoal_cost, edsl_cost, eoil_cost, trans_cost, cond_cost, ng_cost, coal_cost, dsl_cost, oil_cost, urn_cost]) * 10**6
-
-    return op_cost, sol_cost, wind_cost, batt_cost, hyd_cost, bio_cost, nuc_cost, ngcc_cost, ecoal_cost, edsl_cost, eoil_cost, trans_cost, cond_cost
-
-def compute_normal_op_costs_fr(caps, acts, sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, nuc_fix_50, hyd_fix_50, bio_fix_50,
-                               ngcc_var_50, nuc_var_50, bio_var_50, biofuel_50, trans_var_50, cond_var_50, ng_var_50, urn_var_50, added_cost_ratio):
+    spec = OP_COST_SCENARIOS[scenario]
+    args = {name: i for i, name in enumerate(spec['args'])}
+
+    terms, cost_index, output_rows, surcharged, in_total = [], [], [], [], []
+    for tech, fix_cost, var_cost, output, tech_surcharged, tech_in_total in spec['techs']:
+        for source, cost in (('cap', fix_cost), ('act', var_cost)):
+            if cost is not None:
+                terms.append((source, tech))
+                cost_index.append(args[cost])
+                output_rows.append(spec['outputs'].index(output) if output is not None else None)
+                surcharged.append(tech_surcharged)
+                in_total.append(tech_in_total)
+
+    output_matrix = np.zeros((len(spec['outputs']), len(terms)))
+    for i, row in enumerate(output_rows):
+        if row is not None:
+            output_matrix[row, i] = 1
+
+    return {
+        'terms': terms,
+        'cost_index': np.array(cost_index),
+        'outputs': spec['outputs'],
+        'output_matrix': output_matrix,
+        'surcharged': np.flatnonzero(surcharged),
+        'in_total': np.array(in_total, dtype=float),
+    }
+
+
+def compute_op_costs(kernel, caps, acts, op_cost_args, added_cost_ratio=1):
     """
-    Computes normal operational costs for various energy technologies based on their capacities and activities in a future scenario.
+    Computes the operational costs of a scenario from its technology-indexed kernel, as matrix operations over the
+    cost terms for a whole batch of capacities and activities (e.g. the weather-adjusted activities of every internal
+    iteration, or those of every model period).
 
     Parameters:
-    - caps: Dictionary containing capacities for various energy sources.
-    - acts: Dictionary containing activities for various energy sources.
-    - sol_fix_50, wind_fix_50, batt_fix_50, ngcc_fix_50, nuc_fix_50, hyd_fix_50, bio_fix_50: Fixed costs for solar, wind, battery, NGCC, nuclear, hydro, and bio respectively.
-    - ngcc_var_50, nuc_var_50, bio_var_50, trans_var_50, cond_var_50, ng_var_50, urn_var_50: Variable costs for NGCC, nuclear, bio, transmission, conduction, natural gas, and uranium respectively.
-    - biofuel_50: Fixed cost for biofuel.
-    - added_cost_ratio: Additional cost ratio applied specifically to certain operations.
+    - kernel: Operational cost kernel of the scenario from build_op_cost_kernel.
+    - caps: Dictionary of capacities of the technologies (scalars or arrays over the batch).
+    - acts: Dictionary of activities of the technologies (scalars or arrays over the batch).
+    - op_cost_args: Fixed and variable unit costs, in the order of the 'args' of the scenario in OP_COST_SCENARIOS,
+      as scalars or as arrays over the last axis of the batch (e.g. the unit costs of every year of a timeline).
+    - added_cost_ratio: Cost ratio of the dispatch beyond the maximum activity of the surcharged technology.
 
     Returns:
-    - Total operational cost in million units, and individual operational costs for solar, wind, battery, hydro, bio, NGCC, nuclear, transmission, and conduction.
+    - The total operational cost (in million units), the operational costs of the op-ratio columns, of shape
+      (n_outputs, ...), and their ratios to the total operational cost.
     """
-    sol_cost = sol_fix_50 * caps['E_SOLPV']
-    wind_cost = wind_fix_50 * caps['E_WIND']
-    batt_cost = batt_fix_50 * caps['E_BATT']
-    nuc_cost = nuc_fix_50 * caps['E_NUCLEAR'] + nuc_var_50 * acts['E_NUCLEAR']
-    hyd_cost = hyd_fix_50 * caps['E_HYDRO']
-    bio_cost = (bio_fix_50 * caps['E_BIO'] + bio_var_50 * acts['E_BIO']) * added_cost_ratio
-    ngcc_cost = ngcc_fix_50 * caps['E_NGCC'] + ngcc_var_50 * acts['E_NGCC']
-
-    trans_cost = trans_var_50 * acts['E_TRANS']
-    cond_cost = cond_var_50 * acts['E_COND']
-    ng_cost = ng_var_50 * acts['S_IMPNG']
-    urn_cost = urn_var_50 * acts['S_IMPURN']
-    biofuel_cost = biofuel_50 * acts['S_IMPBIO']
-
-    op_cost = sum([sol_cost, wind_cost, batt_cost, hyd_cost, bio_cost, ngcc_cost, trans_cost, cond_cost, ng_cost, urn_cost, biofuel_cost]) * 10**6
+    unit_costs = np.asarray(np.broadcast_arrays(*op_cost_args), dtype=float)[kernel['cost_index']]
+
+    # Capacities and activities of the terms, stacked over the term axis
+    values = [(caps if source == 'cap' else acts)[tech] for source, tech in kernel['terms']]
+    quantities = np.empty((len(values),) + np.broadcast(*values, added_cost_ratio).shape)
+    for i, value in enumerate(values):
+        quantities[i] = value
+    for i in kernel['surcharged']:
+        quantities[i] *= added_cost_ratio
+
+    # Total operational cost and costs of the op-ratio columns in one product of the cost weights of the terms, with
+    # the unit costs applied to the quantities first when they vary over the batch
+    weights = np.vstack([kernel['in_total'], kernel['output_matrix']])
+    if unit_costs.ndim == 1:
+        costs = (weights * unit_costs) @ quantities
+    else:
+        costs = np.tensordot(weights, unit_costs * quantities, axes=1)
+    op_cost, output_costs = costs[0] * 10**6, costs[1:]
 
-    return op_cost, sol_cost, wind_cost, batt_cost, hyd_cost, bio_cost, ngcc_cost, nuc_cost, trans_cost, cond_cost
+    return op_cost, output_costs, output_costs * 10**6 / op_cost
 
 
 def write_grid_data(caps, sol_inv_costs, wind_inv_costs, trans_inv_cost, cond_inv_cost, sub_inv_cost, twr_inv_cost):
@@ -1684,4 +3969,170 @@ def write_grid_data(caps, sol_inv_costs, wind_inv_costs, trans_inv_cost, cond_in
     # Convert the list of dictionaries to a DataFrame
     comp = pd.DataFrame(components)
 
-    return comp
\ No newline at end of file
+    return comp
+
+
+# Line lengths of the grid components in the order of COMPONENT_TYPES (0 for components without a line)
+GRID_LINE_LENGTHS = np.array([4284511, 26742880, 0, 0, 0, 0], dtype=float)
+
+
+def build_grid_arrays(caps, sol_inv_costs, wind_inv_costs, trans_inv_cost, cond_inv_cost, sub_inv_cost, twr_inv_cost):
+    """
+    Creates the grid components of write_grid_data as a dictionary of arrays, for use with the batched kernels.
+
+    Parameters:
+    - caps: Dictionary of capacities for different components.
+    - sol_inv_costs: Dictionary of investment costs for solar components.
+    - wind_inv_costs: Dictionary of investment costs for wind components.
+    - trans_inv_cost: Investment cost per unit for transmission lines.
+    - cond_inv_cost: Investment cost per unit for distribution lines.
+    - sub_inv_cost: Investment cost per unit for substations.
+    - twr_inv_cost: Investment cost per unit for towers.
+
+    Returns:
+    - A dictionary with 'type' (int8 type codes indexing COMPONENT_TYPES), 'replacement_cost' and 'line_length' arrays,
+      one entry per component in the same order as write_grid_data.
+    """
+
+    replacement_cost = np.array([
+        caps['E_TRANS'] * trans_inv_cost,
+        caps['E_COND'] * cond_inv_cost,
+        caps['E_TWR'] * twr_inv_cost,
+        caps['E_SUB'] * sub_inv_cost,
+        caps['E_SOLPV'] * sol_inv_costs['2050'] * 10**6,
+        caps['E_WIND'] * wind_inv_costs['2050'] * 10**6
+    ], dtype=float)
+
+    grid = {
+        'type': np.arange(len(COMPONENT_TYPES), dtype=np.int8),
+        'replacement_cost': replacement_cost,
+        'line_length': GRID_LINE_LENGTHS.copy()
+    }
+
+    return grid
+
+
+def build_period_grid_arrays(caps, periods, sol_inv_costs, wind_inv_costs, trans_inv_cost, cond_inv_cost, sub_inv_cost, twr_inv_cost):
+    """
+    Creates the grid components of build_grid_arrays for every model period, with the capacities of each period and
+    the solar and wind investment costs projected for its start year.
+
+    Parameters:
+    - caps: Dictionary of capacities of every model period, as arrays over the periods (see period_arrays).
+    - periods: Start years of the model periods.
+    - sol_inv_costs, wind_inv_costs, trans_inv_cost, cond_inv_cost, sub_inv_cost, twr_inv_cost: Investment costs, as
+      passed to build_grid_arrays.
+
+    Returns:
+    - A dictionary in the format of build_grid_arrays, with 'replacement_cost' of shape (n_components, n_periods).
+    """
+    # build_grid_arrays reads the solar and wind investment costs of 2050
+    return build_grid_arrays(caps, {'2050': timeline_values(sol_inv_costs, periods)}, {'2050': timeline_values(wind_inv_costs, periods)},
+                             trans_inv_cost, cond_inv_cost, sub_inv_cost, twr_inv_cost)
+
+
+# Component types of powerNetwork.csv, and the types whose failure takes down the feeder they belong to
+NETWORK_TYPES = {'transmissionLine': 'Transmission Line', 'distributionLine': 'Distribution Line', 'tower': 'Tower',
+                 'substation': 'Substation', 'solarPvPlant': 'Solar Generator', 'windPlant': 'Wind Generator'}
+OUTAGE_TYPES = ['Transmission Line', 'Distribution Line', 'Tower', 'Substation']
+
+
+def network_feeders(names):
+    """
+    Derives the feeder of every network component from its name when the network has no 'Feeder' column: names made
+    of a prefix and four digits (e.g. PDN0412) belong to the feeder of the prefix and the first two digits (PDN04),
+    and any other component (e.g. the lines DL01, DL02, ...) forms a feeder on its own.
+
+    Parameters:
+    - names: Sequence of component names.
+
+    Returns:
+    - A list with the feeder name of every component.
+    """
+    return [name[:-2] if re.fullmatch(r'[A-Za-z]+\d{4}', name) else name for name in names]
+
+
+def read_power_network(components):
+    """
+    Converts the components of powerNetwork.csv into arrays for build_network_arrays.
+
+    Parameters:
+    - components: DataFrame read from powerNetwork.csv, with the 'Name', 'Type', 'Replacement Cost', 'Line Length'
+      and 'Poles Distance' of every component, and optionally its 'Feeder' (see network_feeders) and 'Wind Scale',
+      the ratio of the wind speed at the component to the event wind speed (1 if missing).
+
+    Returns:
+    - A dictionary with the 'name', 'type' (type codes indexing COMPONENT_TYPES), 'replacement_cost',
+      'line_length', 'pole_distance', 'wind_scale' and 'feeder' (feeder index) arrays, one entry per component, and
+      the 'feeder_names'.
+    """
+    unknown = set(components['Type']) - set(NETWORK_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown network component types {sorted(unknown)}")
+
+    names = components['Name'].astype(str).tolist()
+    feeders = components['Feeder'].astype(str).tolist() if 'Feeder' in components else network_feeders(names)
+    feeder_names, feeder_index = np.unique(feeders, return_inverse=True)
+    wind_scale = components['Wind Scale'].fillna(1) if 'Wind Scale' in components else np.ones(len(components))
+
+    return {
+        'name': np.array(names),
+        'type': get_type_codes(components['Type'].map(NETWORK_TYPES)),
+        'replacement_cost': components['Replacement Cost'].to_numpy(dtype=float),
+        'line_length': components['Line Length'].to_numpy(dtype=float),
+        'pole_distance': components['Poles Distance'].to_numpy(dtype=float),
+        'wind_scale': np.asarray(wind_scale, dtype=float),
+        'feeder': feeder_index,
+        'feeder_names': feeder_names,
+    }
+
+
+def build_network_arrays(grid, network):
+    """
+    Distributes the aggregate grid components of build_grid_arrays over the components of the network, for damage
+    simulated component by component.
+
+    The replacement cost and line length of each component type are shared among the network components of that
+    type in proportion to their listed replacement costs and line lengths, and each tower, substation or farm
+    component stands for an equal share of the units of its type, so the network keeps the totals of the sampled
+    grid.
+
+    Parameters:
+    - grid: Aggregate grid from build_grid_arrays (or build_period_grid_arrays).
+    - network: Network from read_power_network.
+
+    Returns:
+    - A dictionary in the format of build_grid_arrays with one entry per network component, plus the
+      'pole_distance', 'wind_scale' and 'unit_share' arrays, the sparse 'feeders' matrix of shape
+      (n_feeders, n_components) over the components of OUTAGE_TYPES (see feeder_outage_share), and the sparse
+      'type_sums' matrix of shape (len(COMPONENT_TYPES), n_components) summing component values by type.
+    """
+    type_codes = network['type']
+    n_components = len(type_codes)
+    type_sums = sparse.csr_matrix((np.ones(n_components), (type_codes, np.arange(n_components))),
+                                  shape=(len(COMPONENT_TYPES), n_components))
+
+    type_counts = type_sums @ np.ones(n_components)
+    if np.any(type_counts == 0):
+        missing = [COMPONENT_TYPES[code] for code in np.flatnonzero(type_counts == 0)]
+        raise ValueError(f"The network has no components of type {missing}")
+
+    line_length = np.nan_to_num(network['line_length'])
+    cost_totals, length_totals = type_sums @ network['replacement_cost'], type_sums @ line_length
+    cost_shares = network['replacement_cost'] / cost_totals[type_codes]
+    length_shares = np.divide(line_length, length_totals[type_codes], out=np.zeros(n_components), where=length_totals[type_codes] > 0)
+
+    outage = np.flatnonzero(np.isin(type_codes, get_type_codes(OUTAGE_TYPES)))
+    feeder_ids, feeder_index = np.unique(network['feeder'][outage], return_inverse=True)
+    feeders = sparse.csr_matrix((np.ones(len(outage)), (feeder_index, outage)), shape=(len(feeder_ids), n_components))
+
+    return {
+        'type': type_codes,
+        'replacement_cost': (grid['replacement_cost'][type_codes].T * cost_shares).T,
+        'line_length': grid['line_length'][type_codes] * length_shares,
+        'pole_distance': network['pole_distance'],
+        'wind_scale': network['wind_scale'],
+        'unit_share': 1 / type_counts[type_codes],
+        'feeders': feeders,
+        'type_sums': type_sums,
+    }
\ No newline at end of file